@@ -0,0 +1,125 @@
+# lib/amortization.py
+# 住宅ローンの償還計算（元利均等／元金均等）を全ページで共通化する。
+# 月次ループを使わず NumPy 配列で一括計算するため、50年返済でも一瞬で終わる。
+from __future__ import annotations
+from typing import Literal, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from lib.memo import loan_key, memoize
+
+RepayMethod = Literal["元利均等", "元金均等"]
+REPAY_METHODS = ("元利均等", "元金均等")
+
+
+class Schedule(NamedTuple):
+    """月次返済表。各配列の長さは返済回数 n（1回目〜n回目）。"""
+    month: np.ndarray      # 返済回（1〜n）
+    payment: np.ndarray    # 返済額
+    interest: np.ndarray   # うち利息
+    principal: np.ndarray  # うち元金
+    balance: np.ndarray    # 返済後残高
+
+
+def _check_method(method: str) -> None:
+    if method not in REPAY_METHODS:
+        raise ValueError(f"返済方式が不正です: {method}（{' / '.join(REPAY_METHODS)}）")
+
+
+def _scalar(a):
+    """0次元配列は Python の数値に戻す（f-string の書式指定をそのまま使えるように）。"""
+    a = np.asarray(a)
+    return a[()] if a.ndim == 0 else a
+
+
+@memoize(maxsize=8192, key=loan_key)
+def monthly_payment(principal, annual_rate, years):
+    """
+    元利均等の月々返済額。annual_rate は小数（1% → 0.01）。
+    引数は配列でもよく、ブロードキャストして一括計算する（スカラー呼び出しのみメモ化）。
+    """
+    P = np.asarray(principal, dtype=float)
+    r = np.asarray(annual_rate, dtype=float) / 12.0
+    n = np.asarray(years, dtype=float) * 12.0
+    P, r, n = np.broadcast_arrays(P, r, n)
+    out = np.zeros(P.shape)
+    ok = n > 0
+    zero = ok & (r == 0)
+    pos = ok & (r != 0)
+    out[zero] = P[zero] / n[zero]
+    out[pos] = P[pos] * r[pos] / (1.0 - (1.0 + r[pos]) ** -n[pos])
+    return _scalar(out)
+
+
+def remaining_balance(principal, annual_rate, years, k_months, method: RepayMethod = "元利均等"):
+    """
+    k回返済後の残高を閉形式で返す（O(1)）。引数はすべて配列でもよく、ブロードキャストして一括計算する。
+    k は 0〜n に丸める（0 なら元本、n 以上なら 0）。
+    """
+    _check_method(method)
+    P = np.asarray(principal, dtype=float)
+    r = np.asarray(annual_rate, dtype=float) / 12.0
+    n = np.round(np.asarray(years, dtype=float) * 12.0)
+    k = np.clip(np.asarray(k_months, dtype=float), 0, np.maximum(n, 0))
+    P, r, n, k = np.broadcast_arrays(P, r, n, k)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # 元金均等、またはゼロ金利の元利均等は元金が毎月一定
+        bal = P * (1.0 - k / n)
+        if method == "元利均等":
+            growth_n = (1.0 + r) ** n
+            bal = np.where(r != 0, P * (growth_n - (1.0 + r) ** k) / (growth_n - 1.0), bal)
+    return _scalar(np.where((n <= 0) | (k >= n), 0.0, bal))
+
+
+@memoize(maxsize=256, key=loan_key)
+def amortization_schedule(
+    principal: float,
+    annual_rate: float,
+    years: int,
+    method: RepayMethod = "元利均等",
+) -> Schedule:
+    """
+    月次返済表を一括で計算する（Python の月次ループなし）。
+    残高を閉形式で全月分求め、差分から利息・元金を逆算する。
+    結果はメモ化して共有するため、配列は読み取り専用（書き換える場合は copy() する）。
+    """
+    _check_method(method)
+    n = int(round(years * 12))
+    if n <= 0:
+        empty = np.zeros(0)
+        return Schedule(np.zeros(0, dtype=int), empty, empty, empty, empty)
+
+    r = float(annual_rate) / 12.0
+    bal = remaining_balance(principal, annual_rate, years, np.arange(n + 1), method)
+
+    opening = bal[:-1]
+    balance = bal[1:]
+    interest = opening * r
+    principal_paid = opening - balance
+    payment = interest + principal_paid
+    sched = Schedule(np.arange(1, n + 1), payment, interest, principal_paid, balance)
+    for arr in sched:
+        arr.setflags(write=False)
+    return sched
+
+
+def annual_schedule(schedule: Schedule) -> pd.DataFrame:
+    """月次返済表を年単位に集計（返済額・利息・元金は合計、残債は年末値）。"""
+    n = len(schedule.month)
+    years = -(-n // 12)
+    pad = years * 12 - n
+
+    def yearly_sum(a: np.ndarray) -> np.ndarray:
+        return np.pad(a, (0, pad)).reshape(years, 12).sum(axis=1)
+
+    principal_y = yearly_sum(schedule.principal)
+    year_end = np.minimum(np.arange(1, years + 1) * 12, n) - 1
+    return pd.DataFrame({
+        "年": np.arange(1, years + 1),
+        "返済額": yearly_sum(schedule.payment),
+        "利息": yearly_sum(schedule.interest),
+        "元金": principal_y,
+        "資産累計": np.cumsum(principal_y),
+        "期末残債": schedule.balance[year_end],
+    })
@@ -0,0 +1,115 @@
+# lib/borrowing_limit.py
+# 年収 × 年齢 × 銀行（審査金利・返済比率）の借入上限テーブルと、その逆算（必要年収）。
+# テーブルは1回だけ作ってキャッシュし、年収がグリッド上（1万円単位）で他社借入なしなら表を引くだけで返す。
+from __future__ import annotations
+from functools import lru_cache
+from typing import Dict, NamedTuple, Tuple
+
+import numpy as np
+
+from lib.memo import memoize
+
+BANK_SCREENING: Dict[str, Dict[str, float]] = {
+    "SBI新生銀行": {"審査金利": 0.03,   "返済比率": 0.40},
+    "三菱UFJ銀行": {"審査金利": 0.0354, "返済比率": 0.35},
+    "PayPay銀行":  {"審査金利": 0.03,   "返済比率": 0.40},
+    "じぶん銀行":  {"審査金利": 0.0257, "返済比率": 0.35},
+    "住信SBI銀行": {"審査金利": 0.0325, "返済比率": 0.35},
+}
+
+COMPLETION_AGE = 79      # 完済年齢の上限
+MAX_EXAM_YEARS = 35      # 審査上の返済年数（最長）
+LIMIT_UNIT = 100_000     # 借入上限は10万円単位で切り捨て
+INCOME_GRID_MAN = np.arange(100, 3001)       # 100万〜3000万（1万刻み＝ページの入力単位）
+AGE_GRID = np.arange(18, COMPLETION_AGE + 1)
+
+
+class LimitTable(NamedTuple):
+    banks: Tuple[str, ...]
+    incomes: np.ndarray   # (I,) 年収（円）
+    ages: np.ndarray      # (G,)
+    factor: np.ndarray    # (B, G) 月々返済1円あたりの借入可能額（年金現価係数）
+    limits: np.ndarray    # (B, G, I) 他社借入なしの借入上限（円・10万円単位）
+
+
+def exam_years(age) -> np.ndarray:
+    return np.clip(np.minimum(MAX_EXAM_YEARS, COMPLETION_AGE - np.asarray(age)), 0, None)
+
+
+def _annuity_factor(exam_rate, years) -> np.ndarray:
+    r = np.asarray(exam_rate, dtype=float) / 12
+    n = np.asarray(years, dtype=float) * 12
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(r == 0, n, (1 - (1 + r) ** -n) / r)
+
+
+def _truncate(raw) -> np.ndarray:
+    return np.maximum(np.asarray(raw) // LIMIT_UNIT * LIMIT_UNIT, 0).astype(np.int64)
+
+
+@lru_cache(maxsize=1)
+def limit_table() -> LimitTable:
+    """全銀行 × 全年齢 × 年収グリッドの借入上限を一括計算（初回のみ）。"""
+    banks = tuple(BANK_SCREENING)
+    rates = np.array([BANK_SCREENING[b]["審査金利"] for b in banks])
+    ratios = np.array([BANK_SCREENING[b]["返済比率"] for b in banks])
+    incomes = INCOME_GRID_MAN * 10_000
+    factor = _annuity_factor(rates[:, None], exam_years(AGE_GRID)[None, :])          # (B, G)
+    monthly_cap = incomes[None, :] * ratios[:, None] / 12                            # (B, I)
+    limits = _truncate(factor[:, :, None] * monthly_cap[:, None, :])
+    for arr in (incomes, factor, limits):
+        arr.setflags(write=False)  # キャッシュ共有のため読み取り専用
+    return LimitTable(banks, incomes, AGE_GRID, factor, limits)
+
+
+def _bank_age_index(bank: str, age) -> Tuple[int, np.ndarray]:
+    t = limit_table()
+    ages = np.clip(np.asarray(age, dtype=int), t.ages[0], t.ages[-1])
+    return t.banks.index(bank), ages - t.ages[0]
+
+
+def _income_index(income_yen: np.ndarray) -> np.ndarray:
+    """年収グリッドの位置（グリッド外・端数は -1）。"""
+    t = limit_table()
+    step = t.incomes[1] - t.incomes[0]
+    pos = (income_yen - t.incomes[0]) / step
+    ok = (pos == np.floor(pos)) & (pos >= 0) & (pos < len(t.incomes))
+    return np.where(ok, pos, -1).astype(np.int64)
+
+
+@memoize(maxsize=4096)
+def borrowing_limit(bank: str, income_yen, age, other_debt_annual_yen=0):
+    """
+    借入上限（円・10万円単位切り捨て）。年収がすべてグリッド上で他社借入がなければ limits を引くだけ、
+    それ以外はテーブルの係数から計算する（どちらも O(1)）。
+    他社借入の年間返済額は、返済比率の枠から差し引く。配列を渡すと一括で返す（スカラー呼び出しのみメモ化）。
+    """
+    t = limit_table()
+    b, g = _bank_age_index(bank, age)
+    income = np.asarray(income_yen, dtype=float)
+    debt = np.asarray(other_debt_annual_yen, dtype=float)
+    i = _income_index(income)
+    if np.all(debt == 0) and np.all(i >= 0):
+        out = t.limits[b, g, np.broadcast_to(i, np.broadcast_shapes(i.shape, debt.shape))]
+        return out[()] if out.ndim == 0 else out
+    ratio = BANK_SCREENING[bank]["返済比率"]
+    monthly_cap = (income * ratio - debt) / 12
+    out = _truncate(t.factor[b, g] * monthly_cap)
+    return out[()] if out.ndim == 0 else out
+
+
+def required_income(bank: str, loan_yen, age, other_debt_annual_yen=0, step_yen: int = 100_000):
+    """
+    借入額 loan_yen を上限内に収めるための最低年収（円・step_yen 単位で切り上げ）。
+    10万円単位の切り捨てを考慮し、上限がちょうど借入額に届く年収を閉形式で逆算する。
+    借入できない年齢（審査年数0）は NaN。
+    """
+    t = limit_table()
+    b, g = _bank_age_index(bank, age)
+    ratio = BANK_SCREENING[bank]["返済比率"]
+    factor = t.factor[b, g]
+    target = np.ceil(np.asarray(loan_yen, dtype=float) / LIMIT_UNIT) * LIMIT_UNIT
+    with np.errstate(divide="ignore", invalid="ignore"):
+        income = (target / factor * 12 + np.asarray(other_debt_annual_yen, dtype=float)) / ratio
+        income = np.where(factor > 0, np.ceil(income / step_yen - 1e-9) * step_yen, np.nan)
+    return income[()] if income.ndim == 0 else income
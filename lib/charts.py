@@ -0,0 +1,40 @@
+# lib/charts.py
+# Matplotlib の日本語フォント設定と、シミュレーター共通のグラフ部品。
+from matplotlib import font_manager, rcParams
+
+JP_FONT_CANDIDATES = [
+    "IPAexGothic",           # Linux系で入っていることが多い
+    "IPAGothic",
+    "Noto Sans CJK JP",
+    "Noto Sans JP",
+    "Hiragino Sans",         # macOS
+    "Hiragino Kaku Gothic ProN",
+    "Yu Gothic",             # Windows
+    "Meiryo",
+    "MS Gothic",
+    "TakaoGothic",
+    "VL PGothic",
+    "DejaVu Sans",           # 最終手段（日本語×）
+]
+
+
+def set_matplotlib_japanese_font():
+    """
+    利用可能な日本語フォントを探して matplotlib に設定する。
+    ダメなら最後に DejaVu Sans にフォールバック（記号は出るが日本語は□になる可能性あり）。
+    """
+    found = None
+    for name in JP_FONT_CANDIDATES:
+        try:
+            font_manager.findfont(name, fallback_to_default=False)
+            found = name
+            break
+        except Exception:
+            continue
+    if found is None:
+        found = "DejaVu Sans"
+
+    # 日本語フォントを優先しつつ、複数候補を設定
+    rcParams["font.family"] = "sans-serif"
+    rcParams["font.sans-serif"] = [found] + [f for f in JP_FONT_CANDIDATES if f != found]
+    rcParams["axes.unicode_minus"] = False  # マイナスが豆腐になるのを防止
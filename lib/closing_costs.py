@@ -0,0 +1,173 @@
+# lib/closing_costs.py
+# 資金計画書（諸費用ページ）の諸費用エンジン（円・int64）。印紙税は価格帯の境界を searchsorted で引き、
+# 手付金・仲介手数料・事務手数料・登記費用と3つの借入パターンの月々返済を、価格・種別の列のまま一括計算する。
+from __future__ import annotations
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from lib import amortization
+
+PROPERTY_TYPES = ("マンション", "戸建て")
+TAX_RATE = 0.10
+BROKERAGE_RATE = 0.03          # 仲介手数料：物件価格×3%＋6万＋税
+BROKERAGE_FIXED = 60_000
+LOAN_FEE_RATE = 0.022          # 銀行事務手数料（概算：物件価格×2.2%）
+DEPOSIT_RATE = 0.05            # 手付金：物件価格の5%を50万円単位で四捨五入
+DEPOSIT_UNIT = 500_000
+BASE_YEARS = 35                # ①②の返済期間
+
+# 既定額（ページの初期値）
+REGIST_FEE = 400_000
+TAX_CLEAR = 100_000
+DISPLAY_FEE = 100_000          # 表示登記（新築戸建のみ）
+FIRE_FEE = 200_000
+TEKIGO_FEE = 55_000            # 適合証明書（フラット35のみ）
+MOVING_FEE = 150_000
+
+# 契約書の印紙税：価格がこの上限以下ならその帯（最後の帯は上限なし）
+_STAMP_UPPER = np.array([5_000_000, 10_000_000, 50_000_000, 100_000_000,
+                         500_000_000, 1_000_000_000, 5_000_000_000])
+_STAMP_TAX = np.array([5_000, 10_000, 10_000, 30_000, 60_000, 160_000, 320_000, 480_000])
+
+# 一括計算の入力列（英語の列名も受け付ける）
+COLUMN_ALIASES = {"price": "価格", "price_man": "価格万円", "property_type": "種別", "type": "種別",
+                  "new_house": "新築戸建", "flat35": "フラット35", "name": "物件名"}
+
+
+class ClosingCosts(NamedTuple):
+    """諸費用の内訳（円・int64、価格と同じ形）。"""
+    price: np.ndarray
+    deposit: np.ndarray        # 手付金（物件価格に充当、諸費用には含めない）
+    stamp: np.ndarray          # 契約書 印紙代
+    regist: np.ndarray         # 登記費用
+    tax_clear: np.ndarray      # 精算金
+    display: np.ndarray        # 表示登記
+    loan_fee: np.ndarray       # 銀行事務手数料
+    kinko_stamp: np.ndarray    # 金消契約 印紙税
+    fire: np.ndarray           # 火災保険
+    tekigo: np.ndarray         # 適合証明書
+    brokerage: np.ndarray      # 仲介手数料（税込）
+    option: np.ndarray         # リフォーム・追加工事
+    moving: np.ndarray         # 引越し
+    kaden: np.ndarray          # 家具家電
+    total_expenses: np.ndarray
+    total: np.ndarray          # 物件＋諸費用
+    need_at_contract: np.ndarray  # 契約時必要資金（手付金＋印紙代＋仲介半金）
+
+
+class LoanPatterns(NamedTuple):
+    """①自己資金0（物件＋諸費用）／②諸費用のみ自己資金（物件のみ）／③指定条件 の借入額と月々返済（円）。"""
+    full_amount: np.ndarray
+    full_monthly: np.ndarray
+    only_amount: np.ndarray
+    only_monthly: np.ndarray
+    custom_amount: np.ndarray
+    custom_monthly: np.ndarray
+
+
+def _int(a) -> np.ndarray:
+    return np.trunc(np.asarray(a, dtype=float)).astype(np.int64)
+
+
+def calc_stamp_tax(price_yen) -> np.ndarray:
+    """契約書 印紙税（価格は配列可）。"""
+    return _STAMP_TAX[np.searchsorted(_STAMP_UPPER, np.asarray(price_yen), side="left")]
+
+
+def round_deposit(price_yen) -> np.ndarray:
+    """手付金＝物件価格の5%を 50万円単位で四捨五入。"""
+    return (np.round(np.asarray(price_yen) * DEPOSIT_RATE / DEPOSIT_UNIT) * DEPOSIT_UNIT).astype(np.int64)
+
+
+def brokerage_fee(price_yen) -> np.ndarray:
+    """仲介手数料（税10%込）。"""
+    return _int((np.asarray(price_yen) * BROKERAGE_RATE + BROKERAGE_FIXED) * (1 + TAX_RATE))
+
+
+def monthly_payment(loan_amount, years, annual_rate_pct) -> np.ndarray:
+    """元利均等返済の月々返済額（円未満切り捨て）。"""
+    return _int(amortization.monthly_payment(loan_amount, np.asarray(annual_rate_pct) / 100.0, years))
+
+
+def closing_costs(price_yen, prop_type="マンション", is_new_house=None, use_flat35=False,
+                  regist_fee=REGIST_FEE, regist_rate: Optional[float] = None, tax_clear=TAX_CLEAR,
+                  display_fee=None, kinko_stamp=0, fire_fee=FIRE_FEE, tekigo_fee=None,
+                  option_fee=0, moving_fee=MOVING_FEE, kaden_fee=0, deposit=None) -> ClosingCosts:
+    """
+    諸費用の内訳を一括計算する（引数はすべて価格とブロードキャストできる形）。
+    None の項目はページと同じ既定：新築戸建＝戸建てなら新築扱い、表示登記は新築戸建のみ 10万円、
+    適合証明書はフラット35のみ 5.5万円、手付金は round_deposit。regist_rate（%）を渡すと登記費用は価格比例。
+    """
+    p = np.asarray(price_yen, dtype=np.int64)
+    house = np.asarray(prop_type) == "戸建て"
+    new = house if is_new_house is None else np.asarray(is_new_house, dtype=bool)
+    shape = np.broadcast_shapes(p.shape, house.shape, new.shape, np.shape(use_flat35))
+
+    def full(v) -> np.ndarray:
+        return np.broadcast_to(_int(v), shape)
+
+    regist = full(p * (regist_rate / 100.0)) if regist_rate is not None else full(regist_fee)
+    display = full(np.where(house & new, DISPLAY_FEE, 0) if display_fee is None else display_fee)
+    tekigo = full(np.where(use_flat35, TEKIGO_FEE, 0) if tekigo_fee is None else tekigo_fee)
+    stamp = full(calc_stamp_tax(p))
+    brokerage = full(brokerage_fee(p))
+    items = dict(stamp=stamp, regist=regist, tax_clear=full(tax_clear), display=display,
+                 loan_fee=full(p * LOAN_FEE_RATE), kinko_stamp=full(kinko_stamp), fire=full(fire_fee),
+                 tekigo=tekigo, brokerage=brokerage, option=full(option_fee), moving=full(moving_fee),
+                 kaden=full(kaden_fee))
+    total_expenses = sum(items.values())
+    dep = full(round_deposit(p) if deposit is None else deposit)
+    return ClosingCosts(price=full(p), deposit=dep, **items, total_expenses=total_expenses,
+                        total=p + total_expenses, need_at_contract=dep + stamp + _int(brokerage / 2))
+
+
+def loan_patterns(costs: ClosingCosts, base_rate_pct, base_years: int = BASE_YEARS, custom_amount=None,
+                  custom_rate_pct=None, custom_years=None) -> LoanPatterns:
+    """3つの借入パターン。③は省略時 借入額＝物件価格・金利と期間は①②と同じ。"""
+    full_amount = costs.price + costs.total_expenses
+    only_amount = costs.price
+    c_amount = only_amount if custom_amount is None else np.broadcast_to(_int(custom_amount), only_amount.shape)
+    c_rate = base_rate_pct if custom_rate_pct is None else custom_rate_pct
+    c_years = base_years if custom_years is None else custom_years
+    return LoanPatterns(full_amount, monthly_payment(full_amount, base_years, base_rate_pct),
+                        only_amount, monthly_payment(only_amount, base_years, base_rate_pct),
+                        c_amount, monthly_payment(c_amount, c_years, c_rate))
+
+
+def closing_cost_table(df: pd.DataFrame, base_rate_pct: float, base_years: int = BASE_YEARS,
+                       custom_rate_pct: Optional[float] = None, custom_years: Optional[int] = None,
+                       **cost_kwargs) -> pd.DataFrame:
+    """
+    物件一覧（列：価格（円）または価格万円、種別・新築戸建・フラット35 は任意）に、諸費用の内訳と
+    3つの借入パターンの列を足した表を返す。cost_kwargs は closing_costs の既定値（ページの入力）。
+    """
+    df = df.rename(columns=lambda c: COLUMN_ALIASES.get(str(c).strip(), str(c).strip()))
+    if "価格" in df.columns:
+        price = pd.to_numeric(df["価格"], errors="coerce").fillna(0)
+    elif "価格万円" in df.columns:
+        price = pd.to_numeric(df["価格万円"], errors="coerce").fillna(0) * 10_000
+    else:
+        raise ValueError("価格（円）または 価格万円 の列が必要です。")
+    default_type = cost_kwargs.pop("prop_type", PROPERTY_TYPES[0])
+    kinds = df["種別"].fillna(default_type).astype(str).to_numpy() if "種別" in df.columns else default_type
+    for col, arg in (("新築戸建", "is_new_house"), ("フラット35", "use_flat35")):
+        if col in df.columns:
+            cost_kwargs[arg] = df[col].fillna(False).astype(bool).to_numpy()
+    costs = closing_costs(_int(price.to_numpy()), kinds, **cost_kwargs)
+    loans = loan_patterns(costs, base_rate_pct, base_years, None, custom_rate_pct, custom_years)
+    labels = {
+        "deposit": "手付金", "stamp": "契約書印紙代", "regist": "登記費用", "tax_clear": "精算金", "display": "表示登記",
+        "loan_fee": "銀行事務手数料", "kinko_stamp": "金消契約印紙税", "fire": "火災保険", "tekigo": "適合証明書",
+        "brokerage": "仲介手数料", "option": "リフォーム費用", "moving": "引越し費用", "kaden": "家具家電代",
+        "total_expenses": "諸費用合計", "total": "総合計", "need_at_contract": "契約時必要資金",
+    }
+    out = df.copy()
+    out["価格"] = costs.price
+    for field, label in labels.items():
+        out[label] = getattr(costs, field)
+    out["①借入額（フル）"], out["①月々返済"] = loans.full_amount, loans.full_monthly
+    out["②借入額（物件のみ）"], out["②月々返済"] = loans.only_amount, loans.only_monthly
+    out["③借入額（指定）"], out["③月々返済"] = loans.custom_amount, loans.custom_monthly
+    return out
@@ -0,0 +1,259 @@
+# lib/compare_score.py
+# 物件比較（3_compare ページ）の採点エンジン。設備・管理の有無を 物件 × 項目 の真偽行列、希望ラベル（◎○△×）を
+# 項目ごとの点数ベクトルにして、ブロック点・適合度・偏差値を行列演算でまとめて求める（物件数の上限なし）。
+# ブロック点は物件ごとに「物件の中身のハッシュ × 採点条件のハッシュ」でキャッシュし、変わった物件だけ採点し直す。
+from __future__ import annotations
+import datetime
+import hashlib
+import json
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from lib.memo import memoize
+
+BLOCKS = ("price", "location", "size_layout", "spec", "management")
+PARKING_OK = ("平置き", "機械式")
+NEED_PENALTY = 0.6          # ◎（必須）が1つでも欠けたときの減衰
+
+# ラベル → (ある場合の点, ない場合の点)。未知のラベルは 0.5
+LABEL_SCORES: Dict[str, Tuple[float, float]] = {
+    "◎": (1.0, 0.0),   # 必須
+    "○": (1.0, 0.0),   # 推奨
+    "△": (0.6, 0.6),   # どちらでも
+    "×": (0.4, 0.7),   # 無い方がよい
+}
+
+# 戸建ての段階評価 → 点（bool は True=1.0 / False=0.0）
+_GRADE_SCORES = {
+    **dict.fromkeys(["高い", "良い", "十分", "適切", "合致", "良好", "可"], 1.0),
+    **dict.fromkeys(["普通", "不明"], 0.6),
+    **dict.fromkeys(["低い", "不足", "不適切", "不一致", "不良", "不可"], 0.3),
+}
+_ROAD_LABELS = {"良好": "良い", "不良": "低い", "普通": "普通", "不明": "不明"}
+
+
+class LabelVector(NamedTuple):
+    """希望ラベルを項目の並びに展開したもの。"""
+    features: List[str]
+    if_present: np.ndarray
+    if_absent: np.ndarray
+    need: np.ndarray          # ◎ の項目
+
+
+class Scores(NamedTuple):
+    """物件ごとの採点。blocks は (物件, BLOCKS)。"""
+    blocks: np.ndarray
+    fit: np.ndarray
+    fit_abs: np.ndarray       # 適合度（0-100）
+    fit_rel: np.ndarray       # 偏差値（現住=50）
+
+
+# ---------- スカラーの正規化・重み ----------
+def norm_more(x, lo: float, hi: float) -> np.ndarray:
+    if hi <= lo:
+        return np.full(np.shape(x), 0.5)
+    return (np.clip(np.asarray(x, dtype=float), lo, hi) - lo) / (hi - lo)
+
+
+def norm_less(x, lo: float, hi: float) -> np.ndarray:
+    if hi <= lo:
+        return np.full(np.shape(x), 0.5)
+    return 1.0 - norm_more(x, lo, hi)
+
+
+def imp_to_weight(imp) -> float:
+    """重要度 1=最優先 → 5点、5=最低 → 1点。"""
+    imp = int(imp or 5)
+    return float(6 - min(max(imp, 1), 5))
+
+
+def weight_vector(importance: Dict[str, int]) -> np.ndarray:
+    """重要度（各ブロック 1〜5、未設定は 3）→ 合計 1 の重み（BLOCKS の順）。"""
+    raw = np.array([imp_to_weight(importance.get(k, 3)) for k in BLOCKS])
+    return raw / (raw.sum() or 1.0)
+
+
+def to_weights(importance: Dict[str, int]) -> Dict[str, float]:
+    return dict(zip(BLOCKS, weight_vector(importance).tolist()))
+
+
+def to_hensachi_abs(fit) -> np.ndarray:
+    return 50.0 + 50.0 * np.clip(fit, 0.0, 1.0)
+
+
+def to_hensachi_rel(fit_cand, fit_current) -> np.ndarray:
+    return 50.0 + 50.0 * (np.asarray(fit_cand) - fit_current)
+
+
+def tsubo_price(price_man, area_m2) -> np.ndarray:
+    """坪単価（万/坪）= 価格(万円) / ㎡ × 3.30578（面積 0 以下は 0）。"""
+    a = np.asarray(area_m2, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(a > 0, np.asarray(price_man, dtype=float) / a * 3.30578, 0.0)
+
+
+def build_age(year_built: int) -> int:
+    if year_built <= 0:
+        return -1
+    return max(0, datetime.date.today().year - year_built)
+
+
+# ---------- 設備・管理のラベル採点 ----------
+def label_vector(labels: Dict[str, str]) -> LabelVector:
+    feats = list(labels)
+    pairs = np.array([LABEL_SCORES.get(labels[f], (0.5, 0.5)) for f in feats]).reshape(-1, 2)
+    return LabelVector(feats, pairs[:, 0], pairs[:, 1], np.array([labels[f] == "◎" for f in feats], dtype=bool))
+
+
+def spec_category_of(categories: Dict[str, Sequence[str]]) -> Dict[str, str]:
+    """設備名 → カテゴリ（同名の設備が複数カテゴリにあれば後のカテゴリ）。"""
+    return {feat: cat for cat, items in categories.items() for feat in items}
+
+
+def spec_presence(props: Sequence[Dict[str, Any]], features: Sequence[str], category_of: Dict[str, str]) -> np.ndarray:
+    """(物件, 項目) の有無。マスターにない項目は無し。"""
+    cats = [category_of.get(f) for f in features]
+    return np.array([[c is not None and bool(p.get("spec", {}).get(c, {}).get(f, False))
+                      for f, c in zip(features, cats)] for p in props], dtype=bool).reshape(len(props), len(features))
+
+
+def mgmt_presence(props: Sequence[Dict[str, Any]], features: Sequence[str], master_features: Sequence[str]) -> np.ndarray:
+    known = set(master_features)
+    return np.array([[f in known and bool(p.get("mgmt", {}).get(f, False)) for f in features] for p in props],
+                    dtype=bool).reshape(len(props), len(features))
+
+
+def label_block(presence: np.ndarray, lv: LabelVector) -> np.ndarray:
+    """ラベル点の平均（物件ごと）。◎ が1つでも欠けていれば NEED_PENALTY 倍、ラベルがなければ 0.5。"""
+    n = presence.shape[0]
+    if not lv.features:
+        return np.full(n, 0.5)
+    p = presence.astype(float)
+    base = (p @ (lv.if_present - lv.if_absent) + lv.if_absent.sum()) / len(lv.features)
+    unmet = (1.0 - p) @ lv.need.astype(float) > 0
+    return np.where(unmet, base * NEED_PENALTY, base)
+
+
+# ---------- 戸建て ----------
+def grade_score(v) -> float:
+    if isinstance(v, bool):
+        return 1.0 if v else 0.0
+    return _GRADE_SCORES.get(v, 0.6)
+
+
+def house_spec_scores(props: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """戸建ての「建物（構造・性能）」：5項目の段階評価の平均 ＋ 長期優良・ZEH・省エネ 各0.05（上限1）。"""
+    g = np.array([[grade_score(p.get("quake", "普通")), grade_score(p.get("insulation", "普通")),
+                   grade_score(p.get("deterioration", "普通")),
+                   grade_score(p.get("exterior_wall", p.get("envelope", "普通"))),
+                   grade_score(p.get("roof_state", p.get("envelope", "普通")))] for p in props]).reshape(-1, 5)
+    bonus = np.array([0.05 * sum(bool(p.get(k, False)) for k in ("long_term", "zeh", "energy_saving"))
+                      for p in props])
+    return np.minimum(1.0, g.mean(axis=1) + bonus)
+
+
+def house_site_scores(props: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """戸建ての「管理・共用」相当（接道・ゴミ捨て場・電柱・駐車・擁壁）の平均。"""
+    g = np.array([[grade_score(_ROAD_LABELS.get(str(p.get("road", "不明")), "不明")),
+                   grade_score(p.get("garbage_spot", "普通")), grade_score(p.get("utility_pole", "普通")),
+                   grade_score(p.get("car_parking_ease", "普通")), grade_score(p.get("site_retaining", "普通"))]
+                  for p in props]).reshape(-1, 5)
+    return g.mean(axis=1)
+
+
+# ---------- まとめて採点 ----------
+def _column(props, key, default) -> np.ndarray:
+    return np.array([p.get(key, default) for p in props], dtype=float)
+
+
+def score_blocks(props: Sequence[Dict[str, Any]], prefs: Dict[str, Any], master: Dict[str, Any]) -> np.ndarray:
+    """物件の並びのブロック点 (物件, BLOCKS)。重要度（重み）には依らない。"""
+    n = len(props)
+    mansion = np.array([p.get("type", "マンション") == "マンション" for p in props], dtype=bool)
+
+    budget = prefs.get("budget_man")
+    price = norm_less(_column(props, "price_man", 0.0), 0, float(budget) * 1.4) if budget else np.full(n, 0.5)
+
+    location = 0.6 * norm_less(_column(props, "dist_station", 10), 0, 20) + 0.4 * norm_less(_column(props, "access_work", 30), 0, 90)
+    redev = np.array([bool(p.get("redevelopment_bonus", False)) for p in props], dtype=bool)
+    location = np.where(redev, np.minimum(1.0, location * 1.2), location)
+
+    size = norm_more(_column(props, "area_m2", 0.0), 40, 90)
+
+    spec = np.zeros(n)
+    mgmt = np.zeros(n)
+    m_props = [p for p, m in zip(props, mansion) if m]
+    h_props = [p for p, m in zip(props, mansion) if not m]
+    if m_props:
+        lv_spec = label_vector(prefs.get("labels_spec", {}))
+        lv_mgmt = label_vector(prefs.get("labels_mgmt", {}))
+        spec[mansion] = label_block(spec_presence(m_props, lv_spec.features, spec_category_of(master["spec_categories"])), lv_spec)
+        m_block = label_block(mgmt_presence(m_props, lv_mgmt.features, master["mgmt_shared_etc"]), lv_mgmt)
+        if prefs.get("parking_must", False):
+            parking_ok = np.array([p.get("parking_type", "なし/不明") in PARKING_OK for p in m_props], dtype=bool)
+            m_block = np.where(parking_ok, m_block, m_block * NEED_PENALTY)
+        mgmt[mansion] = m_block
+    if h_props:
+        spec[~mansion] = house_spec_scores(h_props)
+        mgmt[~mansion] = house_site_scores(h_props)
+
+    return np.stack([price, location, size, spec, mgmt], axis=-1).reshape(n, len(BLOCKS))
+
+
+def _scores(blocks: np.ndarray, prefs: Dict[str, Any], cur_fit: float) -> Scores:
+    fit = blocks @ weight_vector(prefs.get("importance", {}))
+    return Scores(blocks, fit, to_hensachi_abs(fit), to_hensachi_rel(fit, cur_fit))
+
+
+def score_properties(props: Sequence[Dict[str, Any]], prefs: Dict[str, Any], master: Dict[str, Any],
+                     cur_fit: float) -> Scores:
+    """物件の並びを一括採点する（ブロック点 → 重み付き適合度 → 適合度・偏差値）。"""
+    return _scores(score_blocks(props, prefs, master), prefs, cur_fit)
+
+
+# ---------- 物件ごとのキャッシュ ----------
+def dict_key(d: Dict[str, Any]) -> str:
+    """物件などの dict の中身のハッシュ（キー順に依らない。JSON にできない値は文字列として扱う）。"""
+    s = json.dumps(d, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(s.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def scoring_key(prefs: Dict[str, Any], master: Dict[str, Any]) -> str:
+    """ブロック点に効く採点条件（予算・駐車場必須・ラベル・マスターの項目）のハッシュ。重要度は含めない。"""
+    return dict_key({"budget_man": prefs.get("budget_man"), "parking_must": bool(prefs.get("parking_must", False)),
+                     "labels_spec": prefs.get("labels_spec", {}), "labels_mgmt": prefs.get("labels_mgmt", {}),
+                     "spec_categories": master["spec_categories"], "mgmt_shared_etc": master["mgmt_shared_etc"]})
+
+
+def _blocks_key(p: Dict[str, Any], prefs: Dict[str, Any], master: Dict[str, Any], skey: str) -> tuple:
+    return (dict_key(p), skey)
+
+
+@memoize(maxsize=4096, key=_blocks_key)
+def property_blocks(p: Dict[str, Any], prefs: Dict[str, Any], master: Dict[str, Any], skey: str) -> np.ndarray:
+    """1物件のブロック点（BLOCKS の順、読み取り専用）。skey は scoring_key(prefs, master)。"""
+    blocks = score_blocks([p], prefs, master)[0]
+    blocks.setflags(write=False)
+    return blocks
+
+
+def cached_scores(props: Sequence[Dict[str, Any]], prefs: Dict[str, Any], master: Dict[str, Any],
+                  cur_fit: float) -> Scores:
+    """score_properties と同じ結果を、物件ごとにキャッシュしたブロック点から組み立てる（採点し直すのは中身が変わった物件だけ）。"""
+    skey = scoring_key(prefs, master)
+    blocks = np.array([property_blocks(p, prefs, master, skey) for p in props]).reshape(len(props), len(BLOCKS))
+    return _scores(blocks, prefs, cur_fit)
+
+
+def _home_key(cur: Dict[str, Any], prefs: Dict[str, Any]) -> tuple:
+    return (dict_key(cur), dict_key(prefs.get("importance", {})))
+
+
+@memoize(maxsize=256, key=_home_key)
+def current_home_fit(cur: Dict[str, Any], prefs: Dict[str, Any]) -> float:
+    """現住の適合度（価格・設備・管理は 0.5 固定）。"""
+    location = (0.6 * norm_less(int(cur.get("walk_min", 20)), 0, 20)
+                + 0.4 * norm_less(min(int(cur.get("commute_h", 60)), int(cur.get("commute_w", 40))), 0, 90))
+    blocks = np.array([0.5, location, norm_more(float(cur.get("area_m2", 55.0)), 40, 90), 0.5, 0.5])
+    return float(blocks @ weight_vector(prefs.get("importance", {})))
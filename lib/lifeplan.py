@@ -0,0 +1,359 @@
+# lib/lifeplan.py
+# 50年ライフプラン（収入・年金・支出・資産運用・現預金）の計算エンジン。Streamlit に依存しない。
+# 系列はすべて NumPy 配列（末尾の軸＝年）で一括計算する。入力に配列を渡すと先頭の軸がシナリオ軸になり、
+# 複数の顧客・条件をまとめて計算できる（金額の単位は万円、iDeCo月額のみ円）。
+from __future__ import annotations
+from typing import Callable, Dict, NamedTuple, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from lib.loan_deduction import loan_deduction
+from lib.portfolio import PORT_DEFAULTS, PORT_NAMES, PORT_RATES
+from lib.rent_vs_buy import remaining_balance_ratio
+from lib.table_view import row_table
+
+PENSION_AGE = 65   # 年金受給開始・iDeCo受取の年齢
+N_CHILDREN = 4
+
+
+class LifePlanResult(NamedTuple):
+    """年次の系列。形状は (シナリオ..., 年)。資産は (シナリオ..., 資産, 年)。"""
+    calendar: np.ndarray          # 西暦
+    ages_main: np.ndarray
+    ages_spouse: np.ndarray
+    child_ages: np.ndarray        # (..., 4, 年) 未誕生は NaN
+    incomes_main: np.ndarray
+    incomes_spouse: np.ndarray
+    retire_main_paid: np.ndarray
+    retire_spouse_paid: np.ndarray
+    stock_incomes: np.ndarray
+    other_incomes: np.ndarray
+    total_income: np.ndarray
+    nenkin_main: np.ndarray
+    nenkin_spouse: np.ndarray
+    ideco_main: np.ndarray        # 65歳時の iDeCo 一時金
+    ideco_spouse: np.ndarray
+    total_pension: np.ndarray
+    total_income_all: np.ndarray
+    koujo: np.ndarray             # 住宅ローン控除（所得税・住民税の還付・減額分）
+    annual_expense: np.ndarray
+    surplus: np.ndarray
+    asset_invest_sums: np.ndarray
+    asset_balances: np.ndarray    # (..., 資産, 年) 並びは PORT_NAMES
+    ideco_balances: np.ndarray
+    cash_balances: np.ndarray
+    total_asset: np.ndarray
+
+
+def _col(v) -> np.ndarray:
+    """スカラー／シナリオ配列を (シナリオ..., 1) にして年の軸とブロードキャストできる形にする。"""
+    return np.asarray(v, dtype=float)[..., None]
+
+
+def nenkin_simple(avg_income, record_year, missing_year):
+    """年金の簡易計算（報酬比例 ＋ 基礎年金）。万円/年。"""
+    wage_pension = np.asarray(avg_income, dtype=float) * 5.481 / 1000 * record_year
+    fix_pension = 80 * ((40 - np.asarray(missing_year, dtype=float)) / 40)
+    return wage_pension + fix_pension
+
+
+def ideco_lump_sum(month_yen, years, annual_rate):
+    """iDeCo の受取額（月額・年数・利回りから月複利の将来価値、万円に丸め）。"""
+    m = np.asarray(month_yen, dtype=float)
+    n = np.asarray(years, dtype=float) * 12
+    r = np.asarray(annual_rate, dtype=float) / 12
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fv = np.where(r == 0, m * n, m * ((1 + r) ** n - 1) / np.where(r == 0, 1, r))
+    return np.round(fv / 10000)
+
+
+def accumulate(initial, annual_add, growth) -> np.ndarray:
+    """
+    残高 b[t] = b[t-1] × growth[t] + annual_add を年のループなしで求める（b[-1] = initial）。
+    growth は (..., 年)。G = 累積成長率として b = G × (initial + add × Σ 1/G)。
+    毎年の利回りが変わる（乱数の）場合もそのまま使える。
+    """
+    g = np.cumprod(np.asarray(growth, dtype=float), axis=-1)
+    return g * (_col(initial) + _col(annual_add) * np.cumsum(1.0 / g, axis=-1))
+
+
+def accumulate_rounded(initial, annual_add, growth) -> np.ndarray:
+    """
+    accumulate と同じ漸化式を、元の画面と同じく毎年 万円に丸めながら進める（b[t] = round(b[t-1] × growth[t] + annual_add)）。
+    丸めが翌年に持ち越されるので閉形式にはできず、年の軸だけループする（シナリオ・資産の軸は一括）。
+    """
+    g = np.asarray(growth, dtype=float)
+    shape = np.broadcast_shapes(g.shape, _col(initial).shape, _col(annual_add).shape)
+    g = np.broadcast_to(g, shape)
+    add = np.broadcast_to(np.asarray(annual_add, dtype=float), shape[:-1])
+    b = np.broadcast_to(np.asarray(initial, dtype=float), shape[:-1])
+    out = np.empty(shape)
+    for k in range(shape[-1]):
+        b = np.round(b * g[..., k] + add)
+        out[..., k] = b
+    return out
+
+
+class LifePlan(NamedTuple):
+    """ライフプランの入力（初期値はページの既定値）。配列を渡すとシナリオの一括計算になる。"""
+    age_main: float = 40
+    age_spouse: float = 38
+    child_ages: Tuple[float, ...] = (0, 0, 0, 0)    # 現在の年齢（0 なら予定を見る）
+    child_plans: Tuple[float, ...] = (0, 0, 0, 0)   # 何年後に誕生するか（0 なら予定なし）
+    # 収入
+    income_main: float = 1000
+    income_up_main: float = 0.01
+    retire_age_main: float = 65
+    retire_main: float = 2000
+    income_spouse: float = 500
+    income_up_spouse: float = 0.01
+    retire_age_spouse: float = 60
+    retire_spouse: float = 1000
+    stock_income: float = 0
+    other_income: float = 0
+    # 支出（月額・万円）と年額
+    living: float = 20
+    house: float = 20
+    car: float = 0
+    edu: float = 0
+    ins: float = 2
+    other: float = 2
+    extra: float = 0
+    event: float = 0
+    # 住宅ローン控除（借入額 0 なら控除なし。限度額・期間は lib.loan_deduction.deduction_terms で決める）
+    loan_amount: float = 0
+    loan_rate: float = 0.005
+    loan_term: float = 35
+    koujo_limit: float = 0
+    koujo_years: float = 0
+    # 年金・iDeCo
+    nenkin_net_main: float = 0
+    nenkin_record_year: float = 40
+    nenkin_missing_year: float = 0
+    avg_income_nenkin: float = 800
+    ideco_month: float = 23000
+    ideco_year: float = 40
+    ideco_rate: float = 0.03
+    nenkin_net_spouse: float = 0
+    nenkin_record_year_s: float = 20
+    nenkin_missing_year_s: float = 5
+    avg_income_nenkin_s: float = 800
+    ideco_month_s: float = 13000
+    ideco_year_s: float = 20
+    ideco_rate_s: float = 0.03
+    # 資産運用（PORT_NAMES の順・積立は万円/月、利回りは小数）
+    port_amounts: Sequence[float] = tuple(PORT_DEFAULTS)
+    port_rates: Sequence[float] = tuple(r / 100 for r in PORT_RATES)
+    # 初期資産（万円）
+    savings: float = 500
+    foreign: float = 0
+    securities: float = 0
+    insurance_product: float = 0
+    crypto: float = 0
+    offshore: float = 0
+    fx: float = 0
+    deposit: float = 0
+    gold: float = 0
+
+    def initial_assets(self) -> np.ndarray:
+        """PORT_NAMES の順の初期残高（投資信託/ETF は初期値なし）。形状は (シナリオ..., 資産)。"""
+        vals = [self.securities, self.foreign, 0, self.insurance_product, self.crypto,
+                self.offshore, self.fx, self.deposit, self.gold]
+        return np.stack(np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in vals]), axis=-1)
+
+    def run(self, years: int = 50, base_year: int = 2025) -> LifePlanResult:
+        return simulate(self, years, base_year)
+
+
+def _const(v, t) -> np.ndarray:
+    """毎年一定額の系列（万円に丸め）。"""
+    return np.round(_col(v)) + np.zeros_like(t)
+
+
+def _nenkin(net, avg_income, record_year, missing_year, ages) -> np.ndarray:
+    """年金（ネット年額の入力があればそれを優先）。65歳以降に受給。"""
+    value = np.where(_col(net) > 0, _col(net), _col(nenkin_simple(avg_income, record_year, missing_year)))
+    return np.where(ages >= PENSION_AGE, np.round(value), 0.0)
+
+
+def _at_year(t, index, value) -> np.ndarray:
+    """index の年だけ value、ほかは 0 の系列（範囲外・すでに過ぎた年なら計上しない）。"""
+    return np.where(t == _col(index), _col(value), 0.0)
+
+
+def _income(income, up, retire_age, ages, t) -> np.ndarray:
+    return np.where(ages < _col(retire_age), np.round(_col(income) * (1 + _col(up)) ** t), 0.0)
+
+
+def _child_ages(p: LifePlan, t) -> np.ndarray:
+    c_age = np.asarray(p.child_ages, dtype=float)[..., None]
+    c_plan = np.asarray(p.child_plans, dtype=float)[..., None]
+    return np.where(c_age > 0, c_age + t, np.where((c_plan > 0) & (t >= c_plan), t - c_plan, np.nan))
+
+
+def _annual_expense(p: LifePlan, t) -> np.ndarray:
+    monthly = sum(np.asarray(v, dtype=float) for v in (p.living, p.house, p.car, p.edu, p.ins, p.other))
+    return np.round(_col(monthly) * 12 + _col(p.extra) + _col(p.event)) + np.zeros_like(t)
+
+
+def _koujo(p: LifePlan, t, incomes_main) -> np.ndarray:
+    """住宅ローン控除（年末残高 × 0.7%、ご主人の年収から見積もった所得税・住民税が上限。万円に丸め）。"""
+    year_end = _col(p.loan_amount) * remaining_balance_ratio(p.loan_rate, p.loan_term, (t + 1) * 12)
+    return np.round(loan_deduction(year_end, p.koujo_limit, p.koujo_years, incomes_main).total)
+
+
+def _invest_annual(p: LifePlan) -> np.ndarray:
+    return np.asarray(p.port_amounts, dtype=float).sum(axis=-1) * 12
+
+
+def _asset_balances(p: LifePlan, t) -> np.ndarray:
+    """資産 × 年を一括（利回りは毎年一定、残高は毎年 万円に丸める）。"""
+    amounts = np.asarray(p.port_amounts, dtype=float)
+    rates = np.asarray(p.port_rates, dtype=float)
+    growth = np.broadcast_to((1 + rates)[..., None], rates.shape + t.shape)
+    return accumulate_rounded(np.round(p.initial_assets()), amounts * 12, growth)
+
+
+def _ideco_balances(p: LifePlan, t, ages_main) -> np.ndarray:
+    """iDeCo 残高（ご主人。毎年 万円に丸め、65歳の年に受取って 0 になる）。"""
+    growth = np.broadcast_to(1 + _col(p.ideco_rate), np.broadcast_shapes(ages_main.shape, _col(p.ideco_rate).shape))
+    path = accumulate_rounded(0.0, np.asarray(p.ideco_month, dtype=float) * 12 / 10000, growth)
+    return np.where(t < PENSION_AGE - ages_main[..., :1], path, 0.0)
+
+
+class Node(NamedTuple):
+    """系列1つ分の計算。inputs は参照する LifePlan のフィールド、deps は参照する他の系列。"""
+    inputs: Tuple[str, ...]
+    deps: Tuple[str, ...]
+    fn: Callable[..., np.ndarray]   # fn(plan, t, *deps)
+
+
+# 系列の依存関係（定義順＝計算順）。lib.lifeplan_graph はこれを使って変更分だけ再計算する
+NODES: Dict[str, Node] = {
+    "ages_main": Node(("age_main",), (), lambda p, t: _col(p.age_main) + t),
+    "ages_spouse": Node(("age_spouse",), (), lambda p, t: _col(p.age_spouse) + t),
+    "child_ages": Node(("child_ages", "child_plans"), (), _child_ages),
+    "incomes_main": Node(("income_main", "income_up_main", "retire_age_main"), ("ages_main",),
+                         lambda p, t, ages: _income(p.income_main, p.income_up_main, p.retire_age_main, ages, t)),
+    "incomes_spouse": Node(("income_spouse", "income_up_spouse", "retire_age_spouse"), ("ages_spouse",),
+                           lambda p, t, ages: _income(p.income_spouse, p.income_up_spouse, p.retire_age_spouse, ages, t)),
+    # 退職金は退職年齢の年に一括（すでに退職済みなら計上しない）
+    "retire_main_paid": Node(("age_main", "retire_age_main", "retire_main"), (),
+                             lambda p, t: _at_year(t, np.subtract(p.retire_age_main, p.age_main), np.round(p.retire_main))),
+    "retire_spouse_paid": Node(("age_spouse", "retire_age_spouse", "retire_spouse"), (),
+                               lambda p, t: _at_year(t, np.subtract(p.retire_age_spouse, p.age_spouse),
+                                                     np.round(p.retire_spouse))),
+    "stock_incomes": Node(("stock_income",), (), lambda p, t: _const(p.stock_income, t)),
+    "other_incomes": Node(("other_income",), (), lambda p, t: _const(p.other_income, t)),
+    "total_income": Node((), ("incomes_main", "incomes_spouse", "retire_main_paid", "retire_spouse_paid",
+                              "stock_incomes", "other_incomes"), lambda p, t, *parts: sum(parts)),
+    "nenkin_main": Node(("nenkin_net_main", "avg_income_nenkin", "nenkin_record_year", "nenkin_missing_year"),
+                        ("ages_main",),
+                        lambda p, t, ages: _nenkin(p.nenkin_net_main, p.avg_income_nenkin, p.nenkin_record_year,
+                                                   p.nenkin_missing_year, ages)),
+    "nenkin_spouse": Node(("nenkin_net_spouse", "avg_income_nenkin_s", "nenkin_record_year_s", "nenkin_missing_year_s"),
+                          ("ages_spouse",),
+                          lambda p, t, ages: _nenkin(p.nenkin_net_spouse, p.avg_income_nenkin_s, p.nenkin_record_year_s,
+                                                     p.nenkin_missing_year_s, ages)),
+    # iDeCo 一時金（65歳の年に受取）
+    "ideco_main": Node(("age_main", "ideco_month", "ideco_year", "ideco_rate"), (),
+                       lambda p, t: _at_year(t, np.subtract(PENSION_AGE, p.age_main),
+                                             ideco_lump_sum(p.ideco_month, p.ideco_year, p.ideco_rate))),
+    "ideco_spouse": Node(("age_spouse", "ideco_month_s", "ideco_year_s", "ideco_rate_s"), (),
+                         lambda p, t: _at_year(t, np.subtract(PENSION_AGE, p.age_spouse),
+                                               ideco_lump_sum(p.ideco_month_s, p.ideco_year_s, p.ideco_rate_s))),
+    "total_pension": Node((), ("nenkin_main", "nenkin_spouse", "ideco_main", "ideco_spouse"),
+                          lambda p, t, *parts: sum(parts)),
+    "total_income_all": Node((), ("total_income", "total_pension"), lambda p, t, inc, pen: inc + pen),
+    "annual_expense": Node(("living", "house", "car", "edu", "ins", "other", "extra", "event"), (), _annual_expense),
+    "koujo": Node(("loan_amount", "loan_rate", "loan_term", "koujo_limit", "koujo_years"), ("incomes_main",), _koujo),
+    "surplus": Node((), ("total_income_all", "koujo", "annual_expense"), lambda p, t, inc, koujo, exp: inc + koujo - exp),
+    "asset_invest_sums": Node(("port_amounts",), (), lambda p, t: _const(_invest_annual(p), t)),
+    "asset_balances": Node(("port_amounts", "port_rates", "securities", "foreign", "insurance_product", "crypto",
+                            "offshore", "fx", "deposit", "gold"), (), _asset_balances),
+    "ideco_balances": Node(("ideco_month", "ideco_rate"), ("ages_main",), _ideco_balances),
+    # 現預金：期初貯蓄 ＋ (年間収支 − 積立額) の累計
+    "cash_balances": Node(("savings", "port_amounts"), ("surplus",),
+                          lambda p, t, surplus: np.round(_col(p.savings))
+                          + np.cumsum(surplus - _col(_invest_annual(p)), axis=-1)),
+    "total_asset": Node((), ("cash_balances", "asset_balances", "ideco_balances"),
+                        lambda p, t, cash, assets, ideco: cash + assets.sum(axis=-2) + ideco),
+}
+
+
+_PER_ITEM = ("child_ages", "asset_balances")   # (..., 子供/資産, 年) の系列
+
+
+def make_result(series: Dict[str, np.ndarray], t: np.ndarray, base_year: int) -> LifePlanResult:
+    """系列をまとめて LifePlanResult にする。年次の系列はシナリオ軸をそろえる（読み取り専用のビュー）。"""
+    shape = np.broadcast_shapes(*(v.shape for k, v in series.items() if k not in _PER_ITEM))
+    fields = {k: v if k in _PER_ITEM else np.broadcast_to(v, shape)
+              for k, v in series.items() if k in LifePlanResult._fields}
+    return LifePlanResult(calendar=base_year + t.astype(int), **fields)
+
+
+def simulate(plan: LifePlan, years: int = 50, base_year: int = 2025) -> LifePlanResult:
+    """全系列を配列演算で計算する（年・資産のループなし）。"""
+    t = np.arange(years, dtype=float)
+    series: Dict[str, np.ndarray] = {}
+    for name, node in NODES.items():
+        series[name] = node.fn(plan, t, *(series[d] for d in node.deps))
+    return make_result(series, t, base_year)
+
+
+def lifeplan_table(plan: LifePlan, res: LifePlanResult) -> pd.DataFrame:
+    """1シナリオ分の結果をページ表示用の横長表（行＝項目、列＝西暦、値は数値・空欄は NaN）にする。"""
+    def row(label, values):
+        return (label, values)
+
+    def ints(a):
+        return np.trunc(np.asarray(a, dtype=float))
+
+    years = len(res.calendar)
+
+    def const(v):
+        return np.full(years, np.round(v))
+
+    blank = ("", None)
+    records = [
+        row("ご主人年齢", ints(res.ages_main)),
+        row("奥様年齢", ints(res.ages_spouse)),
+        *[row(f"{'①②③④'[i]}子供年齢", ints(res.child_ages[i])) for i in range(N_CHILDREN)],
+        blank,
+        row("ご主人年収（万円）", ints(res.incomes_main)),
+        row("奥様年収（万円）", ints(res.incomes_spouse)),
+        row("ご主人退職金（万円）", ints(res.retire_main_paid)),
+        row("奥様退職金（万円）", ints(res.retire_spouse_paid)),
+        row("ストック収入（万円）", ints(res.stock_incomes)),
+        row("その他収入（万円）", ints(res.other_incomes)),
+        blank,
+        row("ご主人年金（万円）", ints(res.nenkin_main)),
+        row("奥様年金（万円）", ints(res.nenkin_spouse)),
+        row("ご主人iDeCo（万円）", ints(res.ideco_main)),
+        row("奥様iDeCo（万円）", ints(res.ideco_spouse)),
+        row("収入合計（万円）", ints(res.total_income)),
+        row("年金・iDeCo合計（万円）", ints(res.total_pension)),
+        row("収入+年金合計（万円）", ints(res.total_income_all)),
+        row("住宅ローン控除（万円）", ints(res.koujo)),
+        blank,
+        row("基本生活費（月・万円）", const(plan.living * 12)),
+        row("住居費（月・万円）", const(plan.house * 12)),
+        row("車両費（月・万円）", const(plan.car * 12)),
+        row("教育費（月・万円）", const(plan.edu * 12)),
+        row("保険料（月・万円）", const(plan.ins * 12)),
+        row("その他（月・万円）", const(plan.other * 12)),
+        row("臨時支出（万円）", const(plan.extra)),
+        row("イベント支出（万円）", const(plan.event)),
+        row("支出合計（万円）", ints(res.annual_expense)),
+        blank,
+        row("年間収支（収入+年金合計+控除-支出）", ints(res.surplus)),
+        blank,
+        row("資産運用積立（年額）", ints(res.asset_invest_sums)),
+        blank,
+        row("現預金（万円）", np.round(res.cash_balances, 2)),
+        *[row(f"{k.replace('積立', '')}残高（万円）", ints(res.asset_balances[i])) for i, k in enumerate(PORT_NAMES)],
+        row("iDeCo残高（万円）", ints(res.ideco_balances)),
+        row("資産合計（万円）", np.round(res.total_asset, 2)),
+    ]
+    return row_table(records, [str(y) for y in res.calendar])
@@ -0,0 +1,116 @@
+# lib/lifeplan_goal.py
+# ライフプランの逆算（ゴールシーク）。「毎月いくらまで使えるか」「何歳で退職できるか」「住居費はいくらまでか」を、
+# 現預金が指定年齢（既定90歳）までマイナスにならない条件で求める。
+# 候補値を1回に n_points 個ずつ配列で評価する多分割二分法で、シナリオ（入力の配列）もまとめて解く。
+from __future__ import annotations
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from lib.lifeplan import LifePlan, simulate
+
+VECTOR_FIELDS = ("child_ages", "child_plans", "port_amounts", "port_rates")  # 末尾の軸が子供/資産
+THROUGH_AGE = 90
+
+
+class GoalResult(NamedTuple):
+    """逆算の結果。シナリオ配列を渡した場合は各フィールドも同じ形の配列。"""
+    value: np.ndarray          # 条件を満たす上限（下限）値。どの値でも満たせなければ NaN
+    binding_year: np.ndarray   # 現預金が最も少なくなる年（西暦）＝制約が効く年
+    binding_age: np.ndarray    # その年のご主人の年齢
+    min_cash: np.ndarray       # その年の現預金（万円）
+
+
+def _batch_shape(plan: LifePlan) -> tuple:
+    shapes = [np.shape(getattr(plan, f))[:-1] if f in VECTOR_FIELDS else np.shape(getattr(plan, f))
+              for f in plan._fields]
+    return np.broadcast_shapes(*shapes)
+
+
+def _with_candidates(plan: LifePlan, field: str, cand: np.ndarray) -> LifePlan:
+    """field を候補値（シナリオ..., 候補）に置き換え、他の入力に候補の軸を足す。"""
+    upd = {}
+    for f in plan._fields:
+        if f == field:
+            continue
+        v = np.asarray(getattr(plan, f), dtype=float)
+        if f in VECTOR_FIELDS:
+            upd[f] = v[..., None, :] if v.ndim > 1 else v
+        else:
+            upd[f] = v[..., None] if v.ndim else v
+    upd[field] = cand
+    return plan._replace(**upd)
+
+
+def _evaluate(plan: LifePlan, field: str, cand: np.ndarray, years: int, base_year: int, through_age: float):
+    """候補ごとに（現預金が期間中ずっと 0 以上か, 最小の年のインデックス, 最小の現預金）。"""
+    res = simulate(_with_candidates(plan, field, cand), years, base_year)
+    cash = np.where(res.ages_main <= through_age, res.cash_balances, np.inf)
+    idx = cash.argmin(axis=-1)
+    low = np.take_along_axis(cash, idx[..., None], axis=-1)[..., 0]
+    return low >= 0, idx, low, res
+
+
+def goal_seek(plan: LifePlan, field: str, lo, hi, maximize: bool = True, tol: float = 0.01,
+              step: Optional[float] = None, through_age: float = THROUGH_AGE,
+              n_points: int = 16, base_year: int = 2025) -> GoalResult:
+    """
+    field を lo〜hi の範囲で動かし、現預金が through_age 歳まで 0 以上になる境界値を求める。
+    maximize=True は「満たす最大値」（生活費・住居費）、False は「満たす最小値」（退職年齢）。
+    step を指定すると候補をその刻みに揃える（年齢など整数の入力）。
+    """
+    shape = _batch_shape(plan)
+    lo = np.broadcast_to(np.asarray(lo, dtype=float), shape).copy()
+    hi = np.broadcast_to(np.asarray(hi, dtype=float), shape).copy()
+    years = int(max(1, through_age - np.min(plan.age_main) + 1))
+    resolution = step if step is not None else tol
+
+    def ok_at(v):
+        return _evaluate(plan, field, v[..., None], years, base_year, through_age)[0][..., 0]
+
+    # 緩い側の端で満たせなければ解なし、厳しい側の端でも満たせばその端が答え
+    lenient, strict = (lo, hi) if maximize else (hi, lo)
+    feasible = ok_at(lenient)
+    done = ~feasible | ok_at(strict)
+    while True:
+        active = ~done & (hi - lo > resolution)
+        if not active.any():
+            break
+        cand = lo[..., None] + (hi - lo)[..., None] * np.linspace(0, 1, n_points)
+        if step is not None:
+            cand = np.clip(np.round(cand / step) * step, lo[..., None], hi[..., None])
+        ok = _evaluate(plan, field, cand, years, base_year, through_age)[0]
+        if maximize:   # 満たす候補は先頭側に並ぶ → 最後に満たす候補とその次で挟む
+            j = np.clip(ok.sum(axis=-1) - 1, 0, n_points - 2)
+        else:          # 満たす候補は末尾側に並ぶ → 最初に満たす候補とその前で挟む
+            j = np.clip(n_points - ok.sum(axis=-1) - 1, 0, n_points - 2)
+        new_lo = np.take_along_axis(cand, j[..., None], axis=-1)[..., 0]
+        new_hi = np.take_along_axis(cand, j[..., None] + 1, axis=-1)[..., 0]
+        lo = np.where(active, new_lo, lo)
+        hi = np.where(active, new_hi, hi)
+
+    value = np.where(maximize, lo, hi)
+    value = np.where(done & feasible, strict, value)
+    # 制約が効く年：答えの値で現預金が最小になる年（解なしなら緩い側の端で評価）
+    probe = np.where(feasible, value, lenient)
+    _, idx, low, res = _evaluate(plan, field, probe[..., None], years, base_year, through_age)
+    idx, low = idx[..., 0], low[..., 0]
+    ages = np.take_along_axis(res.ages_main[..., 0, :], idx[..., None], axis=-1)[..., 0]
+    value = np.where(feasible, value, np.nan)
+    out = GoalResult(value, base_year + idx, ages, low)
+    return GoalResult(*(v[()] if np.ndim(v) == 0 else v for v in out))
+
+
+def max_living(plan: LifePlan, hi: float = 300, tol: float = 0.01, **kw) -> GoalResult:
+    """基本生活費（月・万円）の上限。"""
+    return goal_seek(plan, "living", 0, hi, maximize=True, tol=tol, **kw)
+
+
+def max_house(plan: LifePlan, hi: float = 300, tol: float = 0.01, **kw) -> GoalResult:
+    """住居費（月・万円）の上限。"""
+    return goal_seek(plan, "house", 0, hi, maximize=True, tol=tol, **kw)
+
+
+def earliest_retire_age(plan: LifePlan, hi: float = THROUGH_AGE, **kw) -> GoalResult:
+    """ご主人の退職年齢の下限（1歳刻み）。現在の年齢より前には退職できないものとする。"""
+    return goal_seek(plan, "retire_age_main", plan.age_main, hi, maximize=False, step=1, **kw)
@@ -0,0 +1,76 @@
+# lib/lifeplan_graph.py
+# ライフプランの差分再計算。lib.lifeplan.NODES（系列の依存グラフ）の各ノードの出力をキャッシュし、
+# 入力が変わったノードとその下流だけを計算し直す。ノードごとの計算時間も記録する。
+from __future__ import annotations
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from lib.lifeplan import NODES, LifePlan, LifePlanResult, Node, make_result
+
+
+class NodeTiming(NamedTuple):
+    name: str
+    recomputed: bool
+    ms: float
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, (np.ndarray, list, tuple)) or isinstance(b, (np.ndarray, list, tuple)):
+        return np.shape(a) == np.shape(b) and bool(np.array_equal(a, b))
+    return a == b
+
+
+def changed_fields(old: Optional[LifePlan], new: LifePlan) -> Set[str]:
+    """前回の入力から値が変わったフィールド（前回なしなら全フィールド）。"""
+    if old is None:
+        return set(new._fields)
+    return {f for f in new._fields if not _same(getattr(old, f), getattr(new, f))}
+
+
+def affected_nodes(fields: Iterable[str], nodes: Dict[str, Node] = NODES) -> List[str]:
+    """フィールドの変更で再計算が必要になる系列（計算順）。"""
+    fields = set(fields)
+    dirty: List[str] = []
+    for name, node in nodes.items():
+        if fields.intersection(node.inputs) or any(d in dirty for d in node.deps):
+            dirty.append(name)
+    return dirty
+
+
+class LifePlanGraph:
+    """
+    ノード出力のキャッシュつきでライフプランを計算する。update() に新しい入力を渡すと、
+    変わったフィールドに依存するノードだけを再計算して LifePlanResult を返す。
+    """
+
+    def __init__(self, years: int = 50, base_year: int = 2025, nodes: Dict[str, Node] = NODES):
+        self.years = years
+        self.base_year = base_year
+        self.nodes = nodes
+        self.t = np.arange(years, dtype=float)
+        self.plan: Optional[LifePlan] = None
+        self.cache: Dict[str, np.ndarray] = {}
+        self.timings: List[NodeTiming] = []
+
+    def update(self, plan: LifePlan) -> LifePlanResult:
+        dirty = set(affected_nodes(changed_fields(self.plan, plan), self.nodes))
+        self.timings = []
+        for name, node in self.nodes.items():
+            if name in dirty or name not in self.cache:
+                start = time.perf_counter()
+                self.cache[name] = node.fn(plan, self.t, *(self.cache[d] for d in node.deps))
+                self.timings.append(NodeTiming(name, True, (time.perf_counter() - start) * 1000))
+            else:
+                self.timings.append(NodeTiming(name, False, 0.0))
+        self.plan = plan
+        return make_result(self.cache, self.t, self.base_year)
+
+    def recomputed(self) -> List[str]:
+        """直前の update() で再計算したノード。"""
+        return [t.name for t in self.timings if t.recomputed]
+
+    def timing_table(self) -> pd.DataFrame:
+        return pd.DataFrame(self.timings, columns=["系列", "再計算", "時間(ms)"])
@@ -0,0 +1,127 @@
+# lib/lifeplan_mc.py
+# ライフプランのモンテカルロ。資産ごとのボラティリティと相関行列から年次リターンを（パス × 資産 × 年）の
+# 1つの配列で生成し、資産残高・現預金・資産合計のばらつきと資金ショート確率を求める。
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from lib.lifeplan import PENSION_AGE, LifePlan, accumulate_rounded
+from lib.portfolio import IDECO_NAME, IDECO_VOL, PORT_NAMES, PORT_VOLS, default_correlation
+
+ASSET_NAMES = list(PORT_NAMES) + [IDECO_NAME]
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class LifePlanPaths(NamedTuple):
+    """パスごとの結果（万円）。asset_balances は (パス, 資産, 年)、その他は (パス, 年)。"""
+    asset_balances: np.ndarray   # 並びは ASSET_NAMES（最後が iDeCo）
+    cash_balances: np.ndarray
+    total_asset: np.ndarray
+
+
+def _cholesky(corr: np.ndarray) -> np.ndarray:
+    """相関行列のコレスキー分解。入力が半正定値でなければ固有値を下限で切って補正する。"""
+    corr = np.asarray(corr, dtype=float)
+    try:
+        return np.linalg.cholesky(corr)
+    except np.linalg.LinAlgError:
+        w, v = np.linalg.eigh(corr)
+        fixed = (v * np.maximum(w, 1e-10)) @ v.T
+        d = np.sqrt(np.diag(fixed))
+        return np.linalg.cholesky(fixed / np.outer(d, d))
+
+
+def simulate_growth(rates: Sequence[float], vols: Sequence[float], corr: np.ndarray,
+                    years: int, n_paths: int, seed=None) -> np.ndarray:
+    """
+    年次の成長率 1+リターン（パス × 資産 × 年）。対数正規で、平均・標準偏差が rates / vols（小数）に一致する。
+    vol が 0 の資産は毎年 1+rate の確定値。
+    """
+    mu = np.asarray(rates, dtype=float)
+    sd = np.asarray(vols, dtype=float)
+    s2 = np.log1p((sd / (1 + mu)) ** 2)
+    drift = np.log1p(mu) - s2 / 2
+    rng = np.random.default_rng(seed)
+    z = rng.standard_normal((n_paths, years, len(mu))) @ _cholesky(corr).T   # 相関つき正規乱数
+    return np.exp(drift + np.sqrt(s2) * z).transpose(0, 2, 1)
+
+
+def _simulate_shard(args) -> LifePlanPaths:
+    plan, vols, corr, years, n_paths, seed = args
+    det = plan.run(years)
+    rates = list(np.asarray(plan.port_rates, dtype=float)) + [float(plan.ideco_rate)]
+    growth = simulate_growth(rates, vols, corr, years, n_paths, seed)
+
+    n_port = len(PORT_NAMES)
+    port = accumulate_rounded(np.round(plan.initial_assets()), np.asarray(plan.port_amounts, dtype=float) * 12,
+                              growth[:, :n_port])
+    t = np.arange(years)
+    payout = PENSION_AGE - int(plan.age_main)        # iDeCo 受取の年（インデックス）
+    ideco = accumulate_rounded(0.0, float(plan.ideco_month) * 12 / 10000, growth[:, n_port])
+    ideco = np.where(t < payout, ideco, 0.0)
+
+    # iDeCo 一時金は運用結果に比例させる（確定計算の受取額 × 受取前年の残高比）。
+    # 残高は両方とも毎年 万円に丸めた同じ漸化式なので、ボラ 0 なら比は 1 になる
+    cash = np.broadcast_to(det.cash_balances, (n_paths, years)).copy()
+    if 1 <= payout < years and det.ideco_balances[payout - 1] > 0:
+        ratio = ideco[:, payout - 1] / det.ideco_balances[payout - 1]
+        cash[:, payout:] += (det.ideco_main[payout] * (ratio - 1))[:, None]
+
+    assets = np.concatenate([port, ideco[:, None]], axis=1)
+    total = cash + assets.sum(axis=1)
+    return LifePlanPaths(assets, cash, total)
+
+
+def simulate_lifeplan(plan: LifePlan, vols: Optional[Sequence[float]] = None, corr: Optional[np.ndarray] = None,
+                      n_paths: int = 10_000, years: int = 50, seed=None,
+                      n_workers: Optional[int] = 1) -> LifePlanPaths:
+    """
+    確定計算（LifePlan.run）の収支に、資産10種（9バケット＋iDeCo）の確率的な運用を重ねる。
+    vols は小数（省略時は PORT_VOLS / IDECO_VOL）、corr は省略時 default_correlation。
+    n_workers > 1（None は CPU 数）ならパスを分割してプロセスプールで並列計算する。
+    """
+    if vols is None:
+        vols = [v / 100 for v in PORT_VOLS] + [IDECO_VOL / 100]
+    if corr is None:
+        corr = default_correlation(ASSET_NAMES)
+    workers = n_workers or os.cpu_count() or 1
+    workers = max(1, min(workers, n_paths))
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    sizes = np.diff(np.linspace(0, n_paths, workers + 1).astype(int))
+    jobs = [(plan, vols, corr, years, int(sz), ss) for sz, ss in zip(sizes, seeds)]
+    if workers == 1:
+        return _simulate_shard(jobs[0])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shards = list(pool.map(_simulate_shard, jobs))
+    return LifePlanPaths(*(np.concatenate(parts) for parts in zip(*shards)))
+
+
+def percentile_bands(series: np.ndarray, calendar: Sequence[int],
+                     percentiles: Sequence[int] = PERCENTILES) -> pd.DataFrame:
+    """(パス, 年) の系列をパーセンタイル帯の表（行＝西暦）にする。"""
+    bands = np.percentile(series, percentiles, axis=0)
+    return pd.DataFrame(bands.T, index=pd.Index(list(calendar), name="年"),
+                        columns=[f"P{q}" for q in percentiles])
+
+
+def shortfall_by_year(paths: LifePlanPaths) -> pd.DataFrame:
+    """
+    各年までに資産合計がマイナスになったパスの割合（累積）。
+    現預金は運用リターンに依らない（パスごとに違うのは iDeCo 一時金だけ）ので、確率としては出さない。
+    """
+    total_neg = np.maximum.accumulate(paths.total_asset < 0, axis=1).mean(axis=0)
+    return pd.DataFrame({"資産合計マイナス": total_neg})
+
+
+def mc_summary(paths: LifePlanPaths) -> Dict[str, float]:
+    """最終年の資産合計のパーセンタイルと、期間中に資産合計がマイナスになる確率。"""
+    out: Dict[str, float] = {}
+    for q, v in zip(PERCENTILES, np.percentile(paths.total_asset[:, -1], PERCENTILES)):
+        out[f"最終資産 P{q}"] = float(v)
+    out["資産枯渇確率"] = float((paths.total_asset < 0).any(axis=1).mean())
+    return out
+
@@ -0,0 +1,147 @@
+# lib/lifeplan_monthly.py
+# ライフプランの月次版（50年 → 600ヶ月）。ボーナス月、誕生月に合わせた退職金・iDeCo受取・年金開始、
+# 月複利の積立を反映する。表示は rollup() で年次の LifePlanResult に戻すので、年次表と同じ形で見られる。
+from __future__ import annotations
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from lib.lifeplan import (
+    NODES, PENSION_AGE, LifePlan, LifePlanResult, accumulate, ideco_lump_sum, nenkin_simple,
+)
+from lib.monthly import MONTHS, at_month, month_grid, rollup_end, rollup_start, rollup_sum, spread
+
+
+class LifePlanMonthly(NamedTuple):
+    """月次の系列（万円）。形状は (シナリオ..., 月)、資産は (シナリオ..., 資産, 月)。"""
+    calendar: np.ndarray          # 各年の西暦（年次、rollup 用）
+    child_ages: np.ndarray        # 年次（表示用）
+    ages_main: np.ndarray
+    ages_spouse: np.ndarray
+    incomes_main: np.ndarray
+    incomes_spouse: np.ndarray
+    retire_main_paid: np.ndarray
+    retire_spouse_paid: np.ndarray
+    stock_incomes: np.ndarray
+    other_incomes: np.ndarray
+    total_income: np.ndarray
+    nenkin_main: np.ndarray
+    nenkin_spouse: np.ndarray
+    ideco_main: np.ndarray
+    ideco_spouse: np.ndarray
+    total_pension: np.ndarray
+    total_income_all: np.ndarray
+    koujo: np.ndarray             # 住宅ローン控除（各年の最終月に計上）
+    annual_expense: np.ndarray    # 名前は年次と共通（中身は月々の支出）
+    surplus: np.ndarray
+    asset_invest_sums: np.ndarray
+    asset_balances: np.ndarray
+    ideco_balances: np.ndarray
+    cash_balances: np.ndarray
+    total_asset: np.ndarray
+
+
+FLOWS = ("incomes_main", "incomes_spouse", "retire_main_paid", "retire_spouse_paid", "stock_incomes",
+         "other_incomes", "total_income", "nenkin_main", "nenkin_spouse", "ideco_main", "ideco_spouse",
+         "total_pension", "total_income_all", "koujo", "annual_expense", "surplus", "asset_invest_sums")
+STOCKS = ("asset_balances", "ideco_balances", "cash_balances", "total_asset")
+
+
+def _col(v) -> np.ndarray:
+    return np.asarray(v, dtype=float)[..., None]
+
+
+def _since_birthday(start_month: int, birth_month: Optional[int]) -> int:
+    """開始時点で誕生月から何ヶ月経っているか（誕生月の指定なしなら 0 ＝年次と同じ扱い）。"""
+    return 0 if birth_month is None else (start_month - birth_month) % MONTHS
+
+
+def _salary(income, up, retire_age, ages, year, cal_month, bonus_ratio, bonus_months) -> np.ndarray:
+    annual = np.round(_col(income) * (1 + _col(up)) ** year)
+    is_bonus = np.isin(cal_month, bonus_months)
+    monthly = annual * (1 - bonus_ratio) / MONTHS + np.where(is_bonus, annual * bonus_ratio / len(bonus_months), 0.0)
+    return np.where(ages < _col(retire_age), monthly, 0.0)
+
+
+def simulate_monthly(plan: LifePlan, years: int = 50, base_year: int = 2025, start_month: int = 1,
+                     birth_month_main: Optional[int] = None, birth_month_spouse: Optional[int] = None,
+                     bonus_ratio: float = 0.0, bonus_months: Sequence[int] = (6, 12)) -> LifePlanMonthly:
+    """
+    月次で全系列を計算する（月のループなし）。
+    - 年収のうち bonus_ratio をボーナス月（暦月）に、残りを毎月に割り振る。
+    - 誕生月を指定すると、年齢・退職・年金開始・iDeCo受取がその月で切り替わる。
+    - 運用・iDeCo は月複利で毎月積み立てる。
+    誕生月なし・ボーナスなしなら、フローの年次合計は年次計算（simulate）と一致する。
+    """
+    p = plan
+    m = month_grid(years).astype(float)
+    year = m // MONTHS
+    cal_month = (start_month - 1 + m) % MONTHS + 1
+    b_main = _since_birthday(start_month, birth_month_main)
+    b_spouse = _since_birthday(start_month, birth_month_spouse)
+    ages_main = _col(p.age_main) + (m + b_main) // MONTHS
+    ages_spouse = _col(p.age_spouse) + (m + b_spouse) // MONTHS
+
+    incomes_main = _salary(p.income_main, p.income_up_main, p.retire_age_main, ages_main, year, cal_month,
+                           bonus_ratio, bonus_months)
+    incomes_spouse = _salary(p.income_spouse, p.income_up_spouse, p.retire_age_spouse, ages_spouse, year, cal_month,
+                             bonus_ratio, bonus_months)
+    # 一時金は誕生月（その年齢になった月）に受け取る
+    retire_main_paid = at_month(m, (np.asarray(p.retire_age_main) - np.asarray(p.age_main)) * MONTHS - b_main,
+                                np.round(p.retire_main))
+    retire_spouse_paid = at_month(m, (np.asarray(p.retire_age_spouse) - np.asarray(p.age_spouse)) * MONTHS - b_spouse,
+                                  np.round(p.retire_spouse))
+    stock_incomes = np.round(_col(p.stock_income)) / MONTHS + np.zeros_like(m)
+    other_incomes = np.round(_col(p.other_income)) / MONTHS + np.zeros_like(m)
+    total_income = incomes_main + incomes_spouse + retire_main_paid + retire_spouse_paid + stock_incomes + other_incomes
+
+    nenkin_main_value = np.where(np.asarray(p.nenkin_net_main) > 0, p.nenkin_net_main,
+                                 nenkin_simple(p.avg_income_nenkin, p.nenkin_record_year, p.nenkin_missing_year))
+    nenkin_spouse_value = np.where(np.asarray(p.nenkin_net_spouse) > 0, p.nenkin_net_spouse,
+                                   nenkin_simple(p.avg_income_nenkin_s, p.nenkin_record_year_s, p.nenkin_missing_year_s))
+    nenkin_main = np.where(ages_main >= PENSION_AGE, np.round(_col(nenkin_main_value)) / MONTHS, 0.0)
+    nenkin_spouse = np.where(ages_spouse >= PENSION_AGE, np.round(_col(nenkin_spouse_value)) / MONTHS, 0.0)
+    payout_main = (PENSION_AGE - np.asarray(p.age_main, dtype=float)) * MONTHS - b_main
+    payout_spouse = (PENSION_AGE - np.asarray(p.age_spouse, dtype=float)) * MONTHS - b_spouse
+    ideco_main = at_month(m, payout_main, ideco_lump_sum(p.ideco_month, p.ideco_year, p.ideco_rate))
+    ideco_spouse = at_month(m, payout_spouse, ideco_lump_sum(p.ideco_month_s, p.ideco_year_s, p.ideco_rate_s))
+    total_pension = nenkin_main + nenkin_spouse + ideco_main + ideco_spouse
+    total_income_all = total_income + total_pension
+
+    expense = NODES["annual_expense"].fn(p, np.zeros(1))[..., 0]
+    monthly_expense = _col(expense) / MONTHS + np.zeros_like(m)
+    # 住宅ローン控除は年次と同じ額（年収は月次の年合計）を各年の最終月に受け取る
+    koujo_annual = NODES["koujo"].fn(p, np.arange(years, dtype=float), rollup_sum(incomes_main))
+    koujo = spread(koujo_annual, [0.0] * (MONTHS - 1) + [1.0])
+    surplus = total_income_all + koujo - monthly_expense
+
+    amounts = np.asarray(p.port_amounts, dtype=float)
+    rates = np.asarray(p.port_rates, dtype=float)
+    invest = _col(amounts.sum(axis=-1)) + np.zeros_like(m)
+    growth = np.broadcast_to(((1 + rates) ** (1 / MONTHS))[..., None], rates.shape + m.shape)
+    asset_balances = accumulate(np.round(p.initial_assets()), amounts, growth)
+
+    ideco_growth = np.broadcast_to((1 + _col(p.ideco_rate)) ** (1 / MONTHS),
+                                   np.broadcast_shapes(ages_main.shape, _col(p.ideco_rate).shape))
+    ideco_path = accumulate(0.0, np.asarray(p.ideco_month, dtype=float) / 10000, ideco_growth)
+    ideco_balances = np.where(m < _col(payout_main), ideco_path, 0.0)
+
+    cash_balances = np.round(_col(p.savings)) + np.cumsum(surplus - invest, axis=-1)
+    total_asset = cash_balances + asset_balances.sum(axis=-2) + ideco_balances
+
+    child_ages = NODES["child_ages"].fn(p, np.arange(years, dtype=float))
+    return LifePlanMonthly(
+        base_year + np.arange(years), child_ages, ages_main, ages_spouse,
+        incomes_main, incomes_spouse, retire_main_paid, retire_spouse_paid, stock_incomes, other_incomes,
+        total_income, nenkin_main, nenkin_spouse, ideco_main, ideco_spouse, total_pension, total_income_all,
+        koujo, monthly_expense, surplus, invest, asset_balances, ideco_balances, cash_balances, total_asset,
+    )
+
+
+def rollup(res: LifePlanMonthly) -> LifePlanResult:
+    """月次の結果を年次（フローは年合計、残高は年末、年齢は年初）にまとめ、年次表と同じ形にする。"""
+    fields = {"calendar": res.calendar, "child_ages": res.child_ages,
+              "ages_main": rollup_start(res.ages_main), "ages_spouse": rollup_start(res.ages_spouse)}
+    fields.update({k: rollup_sum(getattr(res, k)) for k in FLOWS})
+    fields.update({k: np.round(rollup_end(getattr(res, k))) for k in STOCKS})
+    return LifePlanResult(**fields)
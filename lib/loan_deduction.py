@@ -0,0 +1,131 @@
+# lib/loan_deduction.py
+# 住宅ローン控除の計算エンジン（万円）。住宅性能区分 × 子育て世帯 × 新築/中古 × 入居年 から借入限度額と控除期間を引き、
+# 年収から見積もった所得税・住民税の額を上限に、実際に戻る控除額を求める。年末残高・年収は配列のまま一括計算する。
+from __future__ import annotations
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+PERF_CLASSES = ("長期優良住宅・低炭素住宅", "ZEH水準省エネ住宅", "省エネ基準適合住宅", "その他の住宅")
+MOVE_YEARS = (2022, 2023, 2024, 2025)   # 範囲外の入居年は端の年の要件で計算する
+DEDUCTION_RATE = 0.007
+INCOME_LIMIT = 2000                     # 合計所得金額（万円）がこれを超える年は控除なし
+RESIDENT_CAP = 9.75                     # 住民税から控除できる上限（万円）
+RESIDENT_CAP_RATE = 0.05                # 同（所得税の課税総所得金額等 × 5%）
+SOCIAL_INSURANCE_RATE = 0.15            # 社会保険料（年収に対する概算）
+BASIC_DEDUCTION = 58                    # 基礎控除（所得税）
+BASIC_DEDUCTION_RESIDENT = 43           # 基礎控除（住民税）
+RESIDENT_TAX_RATE = 0.10
+
+# 借入限度額（万円）[入居年, 中古/新築, 性能区分, 一般/子育て]。新築は買取再販を含む
+_LIMITS = np.array([
+    [[[3000, 3000], [3000, 3000], [3000, 3000], [2000, 2000]],
+     [[5000, 5000], [4500, 4500], [4000, 4000], [3000, 3000]]],   # 2022
+    [[[3000, 3000], [3000, 3000], [3000, 3000], [2000, 2000]],
+     [[5000, 5000], [4500, 4500], [4000, 4000], [3000, 3000]]],   # 2023
+    [[[3000, 3000], [3000, 3000], [3000, 3000], [2000, 2000]],
+     [[4500, 5000], [3500, 4500], [3000, 4000], [0, 0]]],         # 2024
+    [[[3000, 3000], [3000, 3000], [3000, 3000], [2000, 2000]],
+     [[4500, 5000], [3500, 4500], [3000, 4000], [0, 0]]],         # 2025
+], dtype=float)
+# 控除期間（年）[入居年, 中古/新築, 性能区分]
+_PERIODS = np.array([
+    [[10, 10, 10, 10], [13, 13, 13, 13]],
+    [[10, 10, 10, 10], [13, 13, 13, 13]],
+    [[10, 10, 10, 10], [13, 13, 13, 0]],
+    [[10, 10, 10, 10], [13, 13, 13, 0]],
+], dtype=float)
+
+# 所得税の速算表（課税所得 x に対して max(税率 × x − 控除額)）
+_INCOME_TAX_RATES = np.array([0.05, 0.10, 0.20, 0.23, 0.33, 0.40, 0.45])
+_INCOME_TAX_DEDUCTIONS = np.array([0, 9.75, 42.75, 63.6, 153.6, 279.6, 479.6])
+
+
+class DeductionTerms(NamedTuple):
+    limit: np.ndarray     # 借入限度額（万円）
+    years: np.ndarray     # 控除期間（年）
+
+
+class TaxEstimate(NamedTuple):
+    """年収（給与のみ）からの概算。単位は万円。"""
+    employment_income: np.ndarray   # 給与所得（＝合計所得金額）
+    taxable_income: np.ndarray      # 所得税の課税総所得金額
+    income_tax: np.ndarray          # 所得税（復興特別所得税を除く）
+    resident_tax: np.ndarray        # 住民税の所得割
+
+
+class Deduction(NamedTuple):
+    """年ごとの控除額（balances と同じ形）。"""
+    base: np.ndarray          # min(年末残高, 限度額) × 0.7%（税額の上限なし）
+    income_tax: np.ndarray    # 所得税から引ける分
+    resident_tax: np.ndarray  # 残りのうち住民税から引ける分
+    total: np.ndarray
+
+
+def perf_index(perf) -> np.ndarray:
+    """性能区分（名前またはインデックス、配列可）を PERF_CLASSES のインデックスにする。"""
+    if isinstance(perf, str):
+        return np.asarray(PERF_CLASSES.index(perf))
+    a = np.asarray(perf)
+    if a.dtype.kind in "US":
+        return np.vectorize(PERF_CLASSES.index, otypes=[int])(a)
+    return a.astype(int)
+
+
+def deduction_terms(move_year, is_new, perf, kosodate=False) -> DeductionTerms:
+    """入居年・新築かどうか・性能区分・子育て世帯かどうか（すべて配列可）から借入限度額と控除期間。"""
+    y = np.clip(np.asarray(move_year, dtype=int), MOVE_YEARS[0], MOVE_YEARS[-1]) - MOVE_YEARS[0]
+    new = np.asarray(is_new, dtype=bool).astype(int)
+    k = perf_index(perf)
+    kid = np.asarray(kosodate, dtype=bool).astype(int)
+    return DeductionTerms(_LIMITS[y, new, k, kid], _PERIODS[y, new, k])
+
+
+def employment_deduction(annual_income) -> np.ndarray:
+    """給与所得控除（令和7年分以降）。"""
+    x = np.asarray(annual_income, dtype=float)
+    return np.select([x <= 190, x <= 360, x <= 660, x <= 850],
+                     [np.minimum(x, 65), x * 0.3 + 8, x * 0.2 + 44, x * 0.1 + 110], 195)
+
+
+def estimate_taxes(annual_income) -> TaxEstimate:
+    """年収（万円、配列可）から所得税・住民税を概算する（社会保険料は年収の15%、基礎控除のみ）。"""
+    x = np.asarray(annual_income, dtype=float)
+    employment = np.maximum(0.0, x - employment_deduction(x))
+    after_social = employment - x * SOCIAL_INSURANCE_RATE
+    taxable = np.maximum(0.0, after_social - BASIC_DEDUCTION)
+    income_tax = np.maximum(0.0, (taxable[..., None] * _INCOME_TAX_RATES - _INCOME_TAX_DEDUCTIONS).max(axis=-1))
+    resident = np.maximum(0.0, after_social - BASIC_DEDUCTION_RESIDENT) * RESIDENT_TAX_RATE
+    return TaxEstimate(employment, taxable, income_tax, resident)
+
+
+def _col(v) -> np.ndarray:
+    return np.asarray(v, dtype=float)[..., None]
+
+
+def loan_deduction(balances, limit, years, annual_income=None) -> Deduction:
+    """
+    年末残高 balances（シナリオ..., 年）から各年の控除額を求める。limit・years は (シナリオ...)。
+    annual_income（balances とブロードキャストできる形。シナリオ軸なら末尾に年の軸を足して渡す）を渡すと、
+    所得税 → 住民税（上限 9.75万円・課税所得の5%）の順に引ききれる分だけを控除額とし、
+    合計所得が2,000万円を超える年は 0 にする。None なら税額の上限なし。
+    """
+    b = np.asarray(balances, dtype=float)
+    t = np.arange(b.shape[-1])
+    base = np.where(t < _col(years), np.minimum(b, _col(limit)) * DEDUCTION_RATE, 0.0)
+    if annual_income is None:
+        zero = np.zeros_like(base)
+        return Deduction(base, base, zero, base)
+    tax = estimate_taxes(annual_income)
+    base = np.where(tax.employment_income > INCOME_LIMIT, 0.0, base)
+    from_income = np.minimum(base, tax.income_tax)
+    resident_cap = np.minimum(tax.taxable_income * RESIDENT_CAP_RATE, RESIDENT_CAP)
+    from_resident = np.minimum(base - from_income, np.minimum(resident_cap, tax.resident_tax))
+    return Deduction(base, from_income, from_resident, from_income + from_resident)
+
+
+def credit_schedule(balances, move_year, is_new, perf, kosodate=False,
+                    annual_income: Optional[np.ndarray] = None) -> Deduction:
+    """deduction_terms と loan_deduction をまとめて呼ぶ（ページ用）。"""
+    terms = deduction_terms(move_year, is_new, perf, kosodate)
+    return loan_deduction(balances, terms.limit, terms.years, annual_income)
@@ -0,0 +1,87 @@
+# lib/loan_grid.py
+# 銀行 × 団信プラン × 返済期間 × 借入額 の月々返済額を NumPy のブロードキャストで一括計算する。
+# 住宅ローン提案ページの比較表・グリッド試算の共通エンジン。
+from __future__ import annotations
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+from lib.amortization import monthly_payment
+
+LONG_TERM_YEARS = 35  # これを超える期間は長期加算金利の対象
+
+
+class LoanGrid(NamedTuple):
+    """軸は (借入額 A, 銀行 B, プラン P, 期間 T)。借入不可・取扱なしのセルは NaN。"""
+    rate: np.ndarray      # (B, P, T) 適用金利（小数）
+    years: np.ndarray     # (B, T)    実際の返済年数
+    monthly: np.ndarray   # (A, B, P, T) 月々返済額
+    is_min: np.ndarray    # (A, B, P, T) 銀行間で最安（0.5円未満の差は同率扱い）
+    cheapest: np.ndarray  # (A, P, T) 最安銀行のインデックス（全銀行不可なら -1）
+
+
+def plan_add_matrix(banks: Sequence[str], plans: Sequence[str],
+                    rate_diff: Dict[str, Dict[str, float]], base_plan: str = "一般団信") -> np.ndarray:
+    """rate_diff（%）を (B, P) の上乗せ金利（小数）に変換。取扱のないプランは NaN。"""
+    add = np.full((len(banks), len(plans)), np.nan)
+    for i, bank in enumerate(banks):
+        for j, plan in enumerate(plans):
+            if plan == base_plan or plan in rate_diff.get(bank, {}):
+                add[i, j] = rate_diff.get(bank, {}).get(plan, 0) / 100
+    return add
+
+
+def bank_rate_grid(
+    base_rates: Sequence[float],
+    plan_add: np.ndarray,
+    bank_max_years: Sequence[int],
+    long_term_add: Sequence[float],
+    terms: Sequence[int],
+    principals: Sequence[float],
+    limits: Sequence[float],
+    age_max_years: int,
+    clamp_terms: bool = True,
+) -> LoanGrid:
+    """
+    全セルを1回のブロードキャストで計算する。
+    - 期間は完済年齢（age_max_years）で必ず頭打ち。
+    - 銀行の最長年数を超える期間は clamp_terms=True なら最長年数に丸め、False なら NaN。
+    - 35年超は長期加算（long_term_add）を上乗せ。借入上限（limits）超は NaN。
+    """
+    base = np.asarray(base_rates, dtype=float)[:, None]              # (B, 1)
+    bank_max = np.asarray(bank_max_years, dtype=float)[:, None]      # (B, 1)
+    long_add = np.asarray(long_term_add, dtype=float)[:, None]       # (B, 1)
+    raw_terms = np.asarray(terms, dtype=float)[None, :]              # (1, T)
+    terms_arr = np.minimum(raw_terms, age_max_years)
+    principals_arr = np.asarray(principals, dtype=float)             # (A,)
+
+    years = np.minimum(terms_arr, bank_max)                          # (B, T)
+    term_ok = np.ones_like(years, dtype=bool) if clamp_terms else (raw_terms <= bank_max)
+    rate_bt = base + np.where(years > LONG_TERM_YEARS, long_add, 0.0)  # (B, T)
+    rate = rate_bt[:, None, :] + plan_add[:, :, None]                # (B, P, T)
+
+    monthly = monthly_payment(
+        principals_arr[:, None, None, None],
+        np.nan_to_num(rate)[None],
+        years[None, :, None, :],
+    )
+    ok = (
+        ~np.isnan(rate)[None]
+        & term_ok[None, :, None, :]
+        & (principals_arr[:, None] <= np.asarray(limits, dtype=float)[None, :])[:, :, None, None]
+    )
+    monthly = np.where(ok, monthly, np.nan)
+
+    any_ok = ok.any(axis=1)                                          # (A, P, T)
+    filled = np.where(ok, monthly, np.inf)
+    cheapest = np.where(any_ok, filled.argmin(axis=1), -1)
+    best = np.where(any_ok, filled.min(axis=1), 0.0)                 # (A, P, T)
+    is_min = ok & (np.where(ok, monthly, 0.0) - best[:, None] < 0.5)
+    years_out = np.where(term_ok, years, np.nan)
+    return LoanGrid(rate, years_out, monthly, is_min, cheapest)
+
+
+def cheapest_labels(grid: LoanGrid, banks: Sequence[str]) -> List:
+    """cheapest (A, P, T) を銀行名の入れ子リストに変換（不可は空文字）。"""
+    names = np.array(list(banks) + [""], dtype=object)
+    return names[grid.cheapest].tolist()
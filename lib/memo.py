@@ -0,0 +1,109 @@
+# lib/memo.py
+# 金融計算カーネル用の LRU メモ化。プロセス内で共有するので、同じ条件（借入額・金利・年数・方式）は
+# セッションや顧客をまたいでも再計算しない。件数上限つき（古いものから破棄）、ヒット/ミス数を記録する。
+from __future__ import annotations
+import functools
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional
+
+import numpy as np
+
+
+class MemoStats(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+_REGISTRY: Dict[str, "LRUMemo"] = {}
+
+
+def _norm(v):
+    """数値型の違い（int / float / numpy）と浮動小数の端数を吸収したキー要素。配列は None（キャッシュしない）。"""
+    if isinstance(v, np.ndarray):
+        return None if v.ndim > 0 else _norm(v.item())
+    if isinstance(v, (list, tuple)):
+        return None
+    if isinstance(v, (bool, str)) or v is None:
+        return v
+    if isinstance(v, (int, float, np.number)):
+        return round(float(v), 10)
+    return v
+
+
+def scalar_key(*args, **kwargs) -> Optional[tuple]:
+    """全引数がスカラーなら正規化したタプル、配列が混ざれば None。"""
+    parts = [_norm(a) for a in args] + [(k, _norm(v)) for k, v in sorted(kwargs.items())]
+    if any(p is None or (isinstance(p, tuple) and p[1] is None) for p in parts):
+        return None
+    return tuple(parts)
+
+
+def loan_key(principal, annual_rate, years, *rest, method: str = "元利均等", **kwargs) -> Optional[tuple]:
+    """(借入額, 金利, 年数, 方式) に正規化したキー。方式は位置引数・キーワードどちらでも同じキーになる。"""
+    if rest:
+        method, rest = rest[0], rest[1:]
+    return scalar_key(principal, annual_rate, years, method, *rest, **kwargs)
+
+
+class LRUMemo:
+    """スレッドセーフな LRU キャッシュ（Streamlit は複数セッションを別スレッドで動かす）。"""
+
+    def __init__(self, func: Callable, maxsize: int, key: Callable[..., Optional[tuple]]):
+        self.func = func
+        self.maxsize = maxsize
+        self.key = key
+        self._data: "OrderedDict[tuple, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        functools.update_wrapper(self, func)
+
+    def __call__(self, *args, **kwargs):
+        k = self.key(*args, **kwargs)
+        if k is None:
+            return self.func(*args, **kwargs)
+        with self._lock:
+            if k in self._data:
+                self._data.move_to_end(k)
+                self.hits += 1
+                return self._data[k]
+        value = self.func(*args, **kwargs)
+        with self._lock:
+            self.misses += 1
+            self._data[k] = value
+            self._data.move_to_end(k)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def cache_info(self) -> MemoStats:
+        return MemoStats(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+def memoize(maxsize: int = 4096, key: Callable[..., Optional[tuple]] = scalar_key):
+    """
+    デコレータ。key が None を返す呼び出し（配列入力など）はキャッシュせずそのまま計算する。
+    戻り値は共有されるため、配列を返す関数は読み取り専用にしてから返すこと。
+    """
+    def deco(func: Callable) -> LRUMemo:
+        memo = LRUMemo(func, maxsize, key)
+        _REGISTRY[f"{func.__module__}.{func.__qualname__}"] = memo
+        return memo
+    return deco
+
+
+def memo_stats() -> Dict[str, MemoStats]:
+    return {name: m.cache_info() for name, m in _REGISTRY.items()}
+
+
+def clear_all() -> None:
+    for m in _REGISTRY.values():
+        m.cache_clear()
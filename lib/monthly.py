@@ -0,0 +1,59 @@
+# lib/monthly.py
+# 月次（12ヶ月 × 年数）の系列を扱う共通部品。年次の値の月割り・月次系列の年次集計を
+# reshape / 累積和だけで行い、月ごとの Python ループを使わない。
+from __future__ import annotations
+from typing import Optional, Sequence
+
+import numpy as np
+
+MONTHS = 12
+
+
+def month_grid(years: int) -> np.ndarray:
+    """経過月 0〜years*12-1。"""
+    return np.arange(years * MONTHS)
+
+
+def spread(annual, weights: Optional[Sequence[float]] = None) -> np.ndarray:
+    """年次の系列（..., 年）を月次（..., 年*12）に割り振る。weights は12ヶ月分の配分（既定は均等）。"""
+    a = np.asarray(annual, dtype=float)
+    w = np.full(MONTHS, 1 / MONTHS) if weights is None else np.asarray(weights, dtype=float)
+    return (a[..., None] * w).reshape(a.shape[:-1] + (a.shape[-1] * MONTHS,))
+
+
+def _by_year(monthly) -> np.ndarray:
+    m = np.asarray(monthly, dtype=float)
+    years = -(-m.shape[-1] // MONTHS)
+    pad = years * MONTHS - m.shape[-1]
+    if pad:
+        m = np.concatenate([m, np.repeat(m[..., -1:], pad, axis=-1)], axis=-1)
+    return m.reshape(m.shape[:-1] + (years, MONTHS))
+
+
+def rollup_sum(monthly) -> np.ndarray:
+    """フロー（収入・支出など）の年次合計。"""
+    return _by_year(monthly).sum(axis=-1)
+
+
+def rollup_end(monthly) -> np.ndarray:
+    """ストック（残高）の年末値。"""
+    return _by_year(monthly)[..., -1]
+
+
+def rollup_start(monthly) -> np.ndarray:
+    """各年の最初の月の値（年齢・期首残高など）。"""
+    return _by_year(monthly)[..., 0]
+
+
+def at_month(months: np.ndarray, index, value) -> np.ndarray:
+    """index の月だけ value、ほかは 0 の系列（範囲外なら計上しない）。"""
+    return np.where(months == np.asarray(index, dtype=float)[..., None], np.asarray(value, dtype=float)[..., None], 0.0)
+
+
+def delay(monthly, k: int) -> np.ndarray:
+    """系列を k ヶ月後ろにずらす（先頭は 0、末尾は切り捨て）。"""
+    m = np.asarray(monthly, dtype=float)
+    if k <= 0:
+        return m
+    pad = np.zeros(m.shape[:-1] + (min(k, m.shape[-1]),))
+    return np.concatenate([pad, m[..., :m.shape[-1] - pad.shape[-1]]], axis=-1)
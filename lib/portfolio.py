@@ -0,0 +1,45 @@
+# lib/portfolio.py
+# ライフプランの資産運用バケット（名称・積立額・利回りの初期値）。他ページの比較用利回りもここから取る。
+from typing import Dict, List
+
+import numpy as np
+
+PORT_NAMES: List[str] = [
+    "NISA積立", "外貨預金積立", "投資信託/ETF積立", "保険（積立型）積立",
+    "仮想通貨積立", "オフショア積立", "FX積立", "定期預金積立", "金・現物積立"
+]
+PORT_DEFAULTS: List[float] = [3, 1, 2, 1, 1, 1, 0, 1, 0]               # 万円/月
+PORT_RATES: List[float] = [3.0, 2.0, 4.0, 1.5, 10.0, 5.0, 7.0, 1.0, 2.0]  # 年利（%）
+
+
+def portfolio_rates() -> Dict[str, float]:
+    """バケット名 → 既定の年利回り（小数）。"""
+    return {name: rate / 100 for name, rate in zip(PORT_NAMES, PORT_RATES)}
+
+# モンテカルロ用：各バケットの年率ボラティリティ（%）と相関（iDeCo は株式中心の運用とみなす）
+IDECO_NAME = "iDeCo"
+PORT_VOLS: List[float] = [16.0, 8.0, 16.0, 2.0, 60.0, 14.0, 25.0, 0.0, 15.0]
+IDECO_VOL = 12.0
+
+# 相関のグループ：株式系・為替系・その他（グループ内／株式系との相関）
+_GROUPS: Dict[str, str] = {
+    "NISA積立": "株式", "投資信託/ETF積立": "株式", "オフショア積立": "株式", IDECO_NAME: "株式",
+    "外貨預金積立": "為替", "FX積立": "為替",
+    "仮想通貨積立": "仮想通貨", "金・現物積立": "金", "保険（積立型）積立": "円金利", "定期預金積立": "円金利",
+}
+_GROUP_CORR: Dict[frozenset, float] = {
+    frozenset(["株式"]): 0.85, frozenset(["為替"]): 0.7, frozenset(["円金利"]): 0.5,
+    frozenset(["株式", "為替"]): 0.4, frozenset(["株式", "仮想通貨"]): 0.3, frozenset(["株式", "金"]): 0.1,
+    frozenset(["為替", "金"]): 0.2,
+}
+
+
+def default_correlation(names: List[str]) -> np.ndarray:
+    """バケット名の並びに対応する相関行列（グループ間の代表値から作る）。"""
+    n = len(names)
+    corr = np.eye(n)
+    for i in range(n):
+        for j in range(i + 1, n):
+            key = frozenset([_GROUPS.get(names[i], names[i]), _GROUPS.get(names[j], names[j])])
+            corr[i, j] = corr[j, i] = _GROUP_CORR.get(key, 0.0)
+    return corr
@@ -0,0 +1,129 @@
+# lib/prepayment.py
+# 繰上返済（期間短縮型／返済額軽減型）。元利均等の返済表に繰上返済イベントを順に適用し、
+# イベント以降の「残り部分」だけを再計算する。タイミング × 金額のグリッド探索は閉形式で一括評価。
+from __future__ import annotations
+from typing import Literal, NamedTuple, Sequence
+
+import numpy as np
+
+from lib.amortization import Schedule, amortization_schedule, monthly_payment, remaining_balance
+
+PrepayMode = Literal["期間短縮", "返済額軽減"]
+PREPAY_MODES = ("期間短縮", "返済額軽減")
+
+
+class PrepaymentEvent(NamedTuple):
+    month: int            # 何回目の返済の直後に繰上返済するか（1〜）
+    amount: float         # 繰上返済額
+    mode: PrepayMode = "期間短縮"
+
+
+class PrepaymentResult(NamedTuple):
+    schedule: Schedule        # 繰上返済後の月次返済表
+    prepaid: np.ndarray       # 各月の繰上返済額（schedule と同じ長さ）
+    total_interest: float
+    months: int               # 実際の返済回数
+
+
+def _empty_schedule() -> Schedule:
+    empty = np.zeros(0)
+    return Schedule(np.zeros(0, dtype=int), empty, empty, empty, empty)
+
+
+def _fixed_payment_tail(balance: float, r: float, pmt: float) -> Schedule:
+    """返済額を据え置いた場合の残り返済表（期間短縮型）。最終回は端数のみ返済。"""
+    if balance <= 0:
+        return _empty_schedule()
+    if r == 0:
+        n = int(np.ceil(balance / pmt - 1e-9))
+        k = np.arange(n + 1)
+        bal = np.maximum(balance - pmt * k, 0.0)
+    else:
+        n = int(np.ceil(-np.log(1 - balance * r / pmt) / np.log(1 + r) - 1e-9))
+        growth = (1 + r) ** np.arange(n + 1)
+        bal = np.maximum(balance * growth - pmt * (growth - 1) / r, 0.0)
+    bal[-1] = 0.0
+    opening = bal[:-1]
+    interest = opening * r
+    principal_paid = opening - bal[1:]
+    return Schedule(np.arange(1, n + 1), interest + principal_paid, interest, principal_paid, bal[1:])
+
+
+def apply_prepayments(principal: float, annual_rate: float, years: int,
+                      events: Sequence[PrepaymentEvent]) -> PrepaymentResult:
+    """
+    繰上返済イベントを時系列順に適用。イベント月までの返済表はそのまま残し、
+    以降の部分だけを期間短縮（返済額据え置き）または返済額軽減（期間据え置き）で作り直す。
+    """
+    r = float(annual_rate) / 12
+    sched = amortization_schedule(principal, annual_rate, years)
+    prepaid = np.zeros(len(sched.month))
+
+    for ev in sorted(events, key=lambda e: e.month):
+        if ev.mode not in PREPAY_MODES:
+            raise ValueError(f"繰上返済の方式が不正です: {ev.mode}")
+        k = int(ev.month)
+        if k < 1 or k >= len(sched.month) or ev.amount <= 0:
+            continue  # 返済期間外・0円は無視
+        amount = min(float(ev.amount), float(sched.balance[k - 1]))
+        new_balance = sched.balance[k - 1] - amount
+        if ev.mode == "期間短縮":
+            tail = _fixed_payment_tail(new_balance, r, float(sched.payment[k]))
+        elif new_balance > 0:
+            tail = amortization_schedule(new_balance, annual_rate, (len(sched.month) - k) / 12)
+        else:
+            tail = _empty_schedule()
+
+        balance_head = sched.balance[:k].copy()
+        balance_head[-1] = new_balance  # 繰上返済後の残高
+        sched = Schedule(
+            np.arange(1, k + len(tail.month) + 1),
+            np.concatenate([sched.payment[:k], tail.payment]),
+            np.concatenate([sched.interest[:k], tail.interest]),
+            np.concatenate([sched.principal[:k], tail.principal]),
+            np.concatenate([balance_head, tail.balance]),
+        )
+        prepaid = np.concatenate([prepaid[:k], np.zeros(len(tail.month))])
+        prepaid[k - 1] += amount
+
+    return PrepaymentResult(sched, prepaid, float(sched.interest.sum()), len(sched.month))
+
+
+def interest_saved_grid(principal: float, annual_rate: float, years: int,
+                        months, amounts, mode: PrepayMode = "期間短縮") -> np.ndarray:
+    """
+    1回の繰上返済（タイミング × 金額）ごとの利息軽減額を閉形式で一括計算する。
+    戻り値は (len(months), len(amounts))。残高を超える金額は残高で頭打ち。
+    """
+    if mode not in PREPAY_MODES:
+        raise ValueError(f"繰上返済の方式が不正です: {mode}")
+    r = float(annual_rate) / 12
+    n = int(round(years * 12))
+    k = np.clip(np.asarray(months, dtype=float), 0, n)[:, None]
+    pmt = float(monthly_payment(principal, annual_rate, years))
+    bal_k = remaining_balance(principal, annual_rate, years, k)
+    new_bal = np.maximum(bal_k - np.asarray(amounts, dtype=float)[None, :], 0.0)
+    left = n - k
+    base_tail_interest = pmt * left - bal_k
+
+    if mode == "返済額軽減":
+        new_tail_interest = monthly_payment(new_bal, annual_rate, left / 12) * left - new_bal
+    elif r == 0:
+        new_tail_interest = np.zeros_like(new_bal)
+    else:
+        # 期間短縮：返済額据え置きで完済までの回数 m、最終回は端数
+        with np.errstate(divide="ignore", invalid="ignore"):
+            m = np.ceil(-np.log(1 - new_bal * r / pmt) / np.log(1 + r) - 1e-9)
+        m = np.where(new_bal > 0, m, 0)
+        growth = (1 + r) ** np.maximum(m - 1, 0)
+        before_last = new_bal * growth - pmt * (growth - 1) / r
+        paid = np.where(m > 0, (m - 1) * pmt + before_last * (1 + r), 0.0)
+        new_tail_interest = paid - new_bal
+    return base_tail_interest - new_tail_interest
+
+
+def invest_gain_grid(years: int, months, amounts, invest_rate: float) -> np.ndarray:
+    """同じ資金を繰上返済せず運用した場合の運用益（元の完済時点まで月複利）。"""
+    n = int(round(years * 12))
+    left = n - np.clip(np.asarray(months, dtype=float), 0, n)[:, None]
+    return np.asarray(amounts, dtype=float)[None, :] * ((1 + invest_rate / 12) ** left - 1)
@@ -0,0 +1,95 @@
+# lib/purchase_timing.py
+# 購入時期（今 vs 何年後）の計算エンジン（万円）。総返済額・将来価格・60歳時の残債はすべて閉形式で、
+# 待機年数・価格上昇率・将来金利に配列を渡すとブロードキャストで全組み合わせを一度に計算する。
+from __future__ import annotations
+from typing import NamedTuple
+
+import numpy as np
+
+from lib import amortization
+
+CHECK_AGE = 60   # 残債を比べる年齢
+
+
+class Purchase(NamedTuple):
+    """1つの購入プラン（配列なら同じ形）。"""
+    down: np.ndarray         # 購入時自己資金
+    accum_save: np.ndarray   # うち待機中の積立
+    price: np.ndarray        # 購入時の物件価格
+    loan: np.ndarray         # 借入額
+    loan_total: np.ndarray   # ローン返済額（総額）
+    rent_total: np.ndarray   # 購入までの家賃
+    total_cost: np.ndarray   # 生涯住居費総額
+    remain_60: np.ndarray    # 60歳時のローン残債
+
+
+class WaitGrid(NamedTuple):
+    """待機年数 × 価格上昇率 × 将来金利 のグリッド（軸の順もこの通り）。"""
+    wait_years: np.ndarray
+    growth_pct: np.ndarray
+    rates_pct: np.ndarray
+    future: Purchase
+    diff: np.ndarray              # 将来の総額 − 今の総額（プラスなら今買う方が有利）
+    loss_per_day_yen: np.ndarray  # 待機1日あたりの差額（円）
+    remain_diff: np.ndarray       # 60歳時の残債：将来 − 今
+
+
+def monthly_payment(principal_man, years, annual_rate_pct) -> np.ndarray:
+    """元利均等の月々返済額（万円）。"""
+    return amortization.monthly_payment(principal_man, np.asarray(annual_rate_pct) / 100.0, years)
+
+
+def total_payment(principal_man, years, annual_rate_pct) -> np.ndarray:
+    return monthly_payment(principal_man, years, annual_rate_pct) * np.asarray(years) * 12
+
+
+def remaining_balance_at_k(principal_man, years, annual_rate_pct, k_months) -> np.ndarray:
+    """kヶ月返済後の残高（万円）。"""
+    return amortization.remaining_balance(principal_man, np.asarray(annual_rate_pct) / 100.0, years, k_months)
+
+
+def future_price_man(price_now_man, growth_pct_per_year, years_wait) -> np.ndarray:
+    """価格の将来値（複利）。"""
+    return np.asarray(price_now_man) * (1 + np.asarray(growth_pct_per_year) / 100.0) ** np.asarray(years_wait)
+
+
+def months_to(age, target: int = CHECK_AGE) -> np.ndarray:
+    return np.maximum(0, np.trunc((target - np.asarray(age)) * 12)).astype(int)
+
+
+def purchase(age, price_now_man, cash_man, years, rate_pct, wait_years=0, monthly_save_man=0.0,
+             growth_pct=0.0, rent_man=0.0, cap_down: bool = False) -> Purchase:
+    """
+    wait_years 年後に買うプラン。待機中は毎月積み立てて家賃を払う。引数はブロードキャストする。
+    cap_down=True（今買うプラン）は自己資金を 0〜物件価格 に収める。
+    """
+    wait = np.asarray(wait_years)
+    accum = np.asarray(monthly_save_man) * 12 * wait
+    price = future_price_man(price_now_man, growth_pct, wait)
+    down = np.clip(cash_man, 0.0, price) if cap_down else cash_man + accum
+    loan = np.maximum(0.0, price - down)
+    loan_total = total_payment(loan, years, rate_pct)
+    rent_total = np.asarray(rent_man) * 12 * wait
+    remain = remaining_balance_at_k(loan, years, rate_pct, months_to(np.asarray(age) + wait))
+    return Purchase(down, accum, price, loan, loan_total, rent_total, down + loan_total + rent_total, remain)
+
+
+def loss_per_day(diff_man, wait_years) -> np.ndarray:
+    """差額（万円）を待機日数で割った円/日（待機 0 年は 1 日として扱う）。"""
+    days = np.maximum(1, np.trunc(np.asarray(wait_years) * 365))
+    return np.asarray(diff_man) * 10_000 / days
+
+
+def wait_grid(now: Purchase, age, price_now_man, cash_man, years_future, rent_man, monthly_save_man,
+              wait_years, growth_pct, rates_pct) -> WaitGrid:
+    """今買うプラン now と、待機年数 × 上昇率 × 将来金利 の全組み合わせを1回のブロードキャストで比べる。"""
+    w = np.asarray(wait_years)[:, None, None]
+    g = np.asarray(growth_pct, dtype=float)[None, :, None]
+    r = np.asarray(rates_pct, dtype=float)[None, None, :]
+    shape = np.broadcast_shapes(w.shape, g.shape, r.shape)
+    fut = purchase(age, price_now_man, cash_man, years_future, np.broadcast_to(r, shape),
+                   np.broadcast_to(w, shape), monthly_save_man, np.broadcast_to(g, shape), rent_man)
+    fut = Purchase(*(np.broadcast_to(a, shape) for a in fut))
+    diff = fut.total_cost - now.total_cost
+    return WaitGrid(np.asarray(wait_years), np.asarray(growth_pct), np.asarray(rates_pct), fut, diff,
+                    loss_per_day(diff, w), fut.remain_60 - now.remain_60)
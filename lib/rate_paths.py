@@ -0,0 +1,146 @@
+# lib/rate_paths.py
+# 変動金利のモンテカルロ・シミュレーション。
+# 金利パス（パス数 × 見直し回数）を1つの NumPy 配列で生成し、5年ルール・125%ルールの有無を
+# 銀行ごとに切り替えて、月々返済額・総利息・未払利息のばらつきを求める。
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from lib.amortization import monthly_payment
+
+REVIEW_MONTHS = 6           # 金利見直し：半年ごと
+PAYMENT_RESET_MONTHS = 60   # 5年ルール：返済額の見直しは5年ごと
+PERCENTILES = (5, 25, 50, 75, 95)
+RULE_FREE_NOTE = "125%ルールなし"
+
+
+class VariableLoanPaths(NamedTuple):
+    """パスごとの結果。rate / payment は (パス数, 見直し回数)、その他は (パス数,)。"""
+    rate: np.ndarray            # 各期間の適用金利（年・小数）
+    payment: np.ndarray         # 各期間の月々返済額
+    total_interest: np.ndarray  # 総利息（最終回の一括精算を含む）
+    unpaid_interest: np.ndarray # 完済時点の未払利息
+    final_lump: np.ndarray      # 最終回に一括返済する額（残元金＋未払利息）
+
+
+def has_payment_rules(notes: Sequence[str]) -> bool:
+    """特記事項に「125%ルールなし」がある銀行は、5年ルールも無し（半年ごとに返済額を再計算）とみなす。"""
+    return not any(RULE_FREE_NOTE in n for n in notes)
+
+
+def simulate_rate_paths(base_rate: float, years: int, n_paths: int, drift: float = 0.0,
+                        vol: float = 0.005, floor: float = 0.0, seed=None) -> np.ndarray:
+    """
+    半年ごとの適用金利パス（パス数 × 見直し回数）。
+    基準金利に、年率 drift・ボラティリティ vol のランダムウォークを加える（下限 floor）。
+    """
+    n_blocks = -(-int(years * 12) // REVIEW_MONTHS)
+    dt = REVIEW_MONTHS / 12
+    rng = np.random.default_rng(seed)
+    shocks = drift * dt + vol * np.sqrt(dt) * rng.standard_normal((n_paths, n_blocks - 1))
+    walk = np.concatenate([np.zeros((n_paths, 1)), np.cumsum(shocks, axis=1)], axis=1)
+    return np.maximum(base_rate + walk, floor)
+
+
+def simulate_payments(principal: float, rates: np.ndarray, years: int,
+                      five_year_rule: bool = True, cap_ratio: Optional[float] = 1.25) -> VariableLoanPaths:
+    """
+    金利パスに対する返済を全パス同時に計算する（ループは見直し回数分のみ・月次ループなし）。
+    - 5年ルールあり：返済額は5年ごとに再計算し、cap_ratio（125%）で上昇を頭打ち。
+      利息が返済額を超える期間は元金が減らず、差額を未払利息として繰り越す。
+    - 5年ルールなし：見直しごとに残期間で返済額を再計算（未払利息は発生しない）。
+    未払利息・残元金は最終回に一括返済する（簡易化のため未払利息は無利息で繰り越し）。
+    """
+    n_paths, n_blocks = rates.shape
+    n = int(years * 12)
+    balance = np.full(n_paths, float(principal))
+    unpaid = np.zeros(n_paths)
+    paid = np.zeros(n_paths)
+    pmt = np.zeros(n_paths)
+    payments = np.zeros((n_paths, n_blocks))
+
+    for j in range(n_blocks):
+        start = j * REVIEW_MONTHS
+        mb = min(REVIEW_MONTHS, n - start)
+        annual = rates[:, j]
+        if j == 0 or not five_year_rule or start % PAYMENT_RESET_MONTHS == 0:
+            new_pmt = monthly_payment(balance, annual, (n - start) / 12)
+            if j > 0 and five_year_rule and cap_ratio is not None:
+                new_pmt = np.minimum(new_pmt, pmt * cap_ratio)
+            pmt = new_pmt
+        payments[:, j] = pmt
+
+        r = annual / 12
+        interest = balance * r
+        short = interest > pmt  # 利息 > 返済額 → 未払利息
+        growth = (1 + r) ** mb
+        with np.errstate(divide="ignore", invalid="ignore"):
+            amortized = np.where(r > 0, balance * growth - pmt * (growth - 1) / r, balance - pmt * mb)
+        next_balance = np.where(short, balance, np.maximum(amortized, 0.0))
+        unpaid += np.where(short, (interest - pmt) * mb, 0.0)
+        # 最終期に返済額が残高を上回った分は払わない
+        overpay = np.where(short, 0.0, np.maximum(-amortized, 0.0))
+        paid += pmt * mb - overpay
+        balance = next_balance
+
+    balance[balance < 0.5] = 0.0  # 1円未満の端数は完済扱い
+    final_lump = balance + unpaid
+    total_interest = paid + final_lump - principal
+    return VariableLoanPaths(rates, payments, total_interest, unpaid, final_lump)
+
+
+def _simulate_shard(args) -> VariableLoanPaths:
+    principal, base_rate, years, n_paths, drift, vol, floor, seed, five_year_rule, cap_ratio = args
+    rates = simulate_rate_paths(base_rate, years, n_paths, drift, vol, floor, seed)
+    return simulate_payments(principal, rates, years, five_year_rule, cap_ratio)
+
+
+def simulate_variable_loan(principal: float, base_rate: float, years: int, n_paths: int = 10_000,
+                           drift: float = 0.0, vol: float = 0.005, floor: float = 0.0,
+                           five_year_rule: bool = True, cap_ratio: Optional[float] = 1.25,
+                           seed=None, n_workers: Optional[int] = 1) -> VariableLoanPaths:
+    """
+    金利パス生成から返済計算までを一括実行。
+    n_workers > 1（None は CPU 数）ならパスを分割してプロセスプールで並列計算する。
+    乱数は SeedSequence で分岐させるため、同じ seed・同じ分割数なら結果は再現する。
+    """
+    workers = n_workers or os.cpu_count() or 1
+    workers = max(1, min(workers, n_paths))
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    sizes = np.diff(np.linspace(0, n_paths, workers + 1).astype(int))
+    jobs = [(principal, base_rate, years, int(sz), drift, vol, floor, ss, five_year_rule, cap_ratio)
+            for sz, ss in zip(sizes, seeds)]
+    if workers == 1:
+        return _simulate_shard(jobs[0])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shards = list(pool.map(_simulate_shard, jobs))
+    return VariableLoanPaths(*(np.concatenate(parts) for parts in zip(*shards)))
+
+
+def payment_bands(paths: VariableLoanPaths, years: int,
+                  percentiles: Sequence[int] = PERCENTILES) -> pd.DataFrame:
+    """月々返済額のパーセンタイル帯（行＝経過月）。"""
+    n = int(years * 12)
+    bands = np.percentile(paths.payment, percentiles, axis=0)       # (q, 見直し回数)
+    monthly = np.repeat(bands, REVIEW_MONTHS, axis=1)[:, :n]
+    return pd.DataFrame(monthly.T, index=pd.RangeIndex(1, n + 1, name="月"),
+                        columns=[f"P{q}" for q in percentiles])
+
+
+def risk_summary(paths: VariableLoanPaths, percentiles: Sequence[int] = PERCENTILES) -> Dict[str, float]:
+    """総利息・最大返済額・未払利息のパーセンタイルと、未払利息の発生確率。"""
+    out: Dict[str, float] = {}
+    max_pmt = paths.payment.max(axis=1)
+    for q, ti, mp, lump in zip(percentiles,
+                               np.percentile(paths.total_interest, percentiles),
+                               np.percentile(max_pmt, percentiles),
+                               np.percentile(paths.final_lump, percentiles)):
+        out[f"総利息 P{q}"] = float(ti)
+        out[f"最大月返済 P{q}"] = float(mp)
+        out[f"最終一括 P{q}"] = float(lump)
+    out["未払利息 発生確率"] = float((paths.unpaid_interest > 0).mean())
+    return out
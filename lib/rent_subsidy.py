@@ -0,0 +1,119 @@
+# lib/rent_subsidy.py
+# 家賃補助シミュレーション（家賃補助ページ）の計算エンジン（万円）。年齢ごとの家賃は区分の境界を並べた区間表から
+# searchsorted で引き、補助期間中の積立は閉形式、補助終了後の取り崩し（貯蓄→運用の順）は累積和で求める。
+# 補助終了年齢・積立額に配列を渡すと先頭の軸がシナリオ軸になり、終了年齢 × 配分の全組み合わせをまとめて計算できる。
+from __future__ import annotations
+from typing import NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+AGE_END = 90
+
+RentBand = Tuple[int, int, float]   # (開始年齢, 終了年齢, 家賃・月) 両端を含む
+
+
+class RentIndex(NamedTuple):
+    """区分の境界（昇順）と、各境界から次の境界の手前までの家賃（月）。"""
+    breaks: np.ndarray
+    rents: np.ndarray
+
+
+class SubsidyResult(NamedTuple):
+    """年次系列。形状は (シナリオ..., 年)。"""
+    ages: np.ndarray
+    rent: np.ndarray        # その年齢の家賃（月）
+    saving: np.ndarray      # 貯蓄残高（年末）
+    investing: np.ndarray   # 運用残高（年末）
+    total: np.ndarray
+
+
+class SubsidySweep(NamedTuple):
+    """補助終了年齢 × 配分 のグリッド（軸の順もこの通り）。"""
+    end_ages: np.ndarray
+    splits: np.ndarray        # (配分, 3)：浪費・貯蓄・運用（万円/月）
+    asset_65: np.ndarray
+    asset_90: np.ndarray
+    depleted_age: np.ndarray  # 補助終了後に資産が尽きる最初の年齢（尽きなければ NaN）
+
+
+def _col(v) -> np.ndarray:
+    return np.asarray(v, dtype=float)[..., None]
+
+
+def rent_index(bands: Sequence[RentBand]) -> RentIndex:
+    """
+    区分の並びから区間表を作る。区分が重なる年齢は、元の画面と同じく先に並んだ区分を優先し、
+    どの区分にも入らない年齢の家賃は 0。
+    """
+    b = np.asarray(bands, dtype=float).reshape(-1, 3)
+    start, end, rent = b[:, 0], b[:, 1], b[:, 2]
+    breaks = np.unique(np.concatenate([start, end + 1]))
+    cover = (start[:, None] <= breaks) & (breaks <= end[:, None])     # (区分, 境界)
+    first = cover.argmax(axis=0)
+    return RentIndex(breaks, np.where(cover.any(axis=0), rent[first], 0.0))
+
+
+def rent_by_age(index: RentIndex, ages) -> np.ndarray:
+    """年齢（配列可）の家賃（月）。"""
+    k = np.searchsorted(index.breaks, np.asarray(ages, dtype=float), side="right") - 1
+    return np.where(k >= 0, index.rents[np.clip(k, 0, None)], 0.0)
+
+
+def _annuity(k, rate: float) -> np.ndarray:
+    """毎年末に1を積み立てて rate で複利運用した k 年後の額。"""
+    k = np.asarray(k, dtype=float)
+    return ((1.0 + rate) ** k - 1.0) / rate if rate > 0 else k
+
+
+def simulate(age_start: int, support_end_age, save, invest, rate: float,
+             bands: Sequence[RentBand], age_end: int = AGE_END) -> SubsidyResult:
+    """
+    support_end_age より前の年は 貯蓄 += 貯蓄額×12、運用 = 運用×(1+rate) + 運用額×12。
+    それ以降は家賃×12 を貯蓄から、足りない分を運用から取り崩す（取り崩し中の運用益は見込まない）。
+    """
+    ages = age_start + np.arange(age_end - age_start + 1)
+    rent = rent_by_age(rent_index(bands), ages)
+    during = ages < _col(support_end_age)                                  # (シナリオ..., 年)
+    k = np.cumsum(during, axis=-1)                                         # 積立した年数
+    saved = _col(save) * 12 * k
+    invested = _col(invest) * 12 * _annuity(k, rate)
+    spent = np.cumsum(np.where(during, 0.0, rent * 12), axis=-1)
+    saving = np.maximum(0.0, saved - spent)
+    investing = np.maximum(0.0, invested - np.maximum(0.0, spent - saved))
+    shape = saving.shape
+    return SubsidyResult(np.broadcast_to(ages, shape), np.broadcast_to(rent, shape), saving, investing,
+                         saving + investing)
+
+
+def asset_at(res: SubsidyResult, age: int) -> np.ndarray:
+    """指定年齢の総資産（万円に丸め、期間外なら 0）。"""
+    i = age - int(res.ages.flat[0])
+    if not 0 <= i < res.total.shape[-1]:
+        return np.zeros(res.total.shape[:-1])
+    return np.round(res.total[..., i])
+
+
+def depleted_age(res: SubsidyResult, support_end_age) -> np.ndarray:
+    """補助終了後に総資産が 0 になる最初の年齢（なければ NaN）。"""
+    hit = (res.ages >= _col(support_end_age)) & (np.round(res.total) <= 0)
+    first = hit.argmax(axis=-1)
+    return np.where(hit.any(axis=-1), np.take_along_axis(res.ages, first[..., None], axis=-1)[..., 0], np.nan)
+
+
+def portfolio_splits(total: int, step: int = 1) -> np.ndarray:
+    """毎月の補助額 total を 浪費・貯蓄・運用 に step 刻みで分ける全通り (配分, 3)。"""
+    grid = np.arange(0, total + 1, step)
+    save, invest = np.meshgrid(grid, grid, indexing="ij")
+    ok = save + invest <= total
+    save, invest = save[ok], invest[ok]
+    return np.stack([total - save - invest, save, invest], axis=-1)
+
+
+def sweep(age_start: int, end_ages, splits, rate: float, bands: Sequence[RentBand],
+          age_end: int = AGE_END) -> SubsidySweep:
+    """補助終了年齢 × 配分 の全組み合わせを1回のブロードキャストで計算する。"""
+    e = np.asarray(end_ages)[:, None]
+    s = np.asarray(splits, dtype=float)
+    res = simulate(age_start, e, s[None, :, 1], s[None, :, 2], rate, bands, age_end)
+    return SubsidySweep(np.asarray(end_ages), s, asset_at(res, 65), asset_at(res, 90),
+                        depleted_age(res, e))
@@ -0,0 +1,170 @@
+# lib/rent_vs_buy.py
+# 賃貸 vs 購入（予算ページ）の計算エンジン。家賃・引越し費用・ローン返済・残債・住宅ローン控除・物件価値を
+# 累積和と閉形式だけで求め、資産価値が残債を上回る年（逆転年）も配列から直接出す。
+# 入力に配列を渡すと先頭の軸がシナリオ軸になり、複数条件をまとめて計算できる（単位は万円）。
+from __future__ import annotations
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+from lib.amortization import monthly_payment
+from lib.loan_deduction import loan_deduction
+from lib.valuation import HOUSE_BUILDING, MANSION, RenovationEvent, renovation_uplift, value_path
+
+RENT_INCREASE = 0.02      # 賃料上昇率（2年ごと）
+RENT_STEP_YEARS = 2
+MOVE_MONTHS = 6           # 引越し費用＝家賃 × 6ヶ月
+EXPENSE_RATE = 0.07       # 諸費用（物件価格の7%）
+
+
+class RentResult(NamedTuple):
+    """賃貸プランの年次系列。形状は (シナリオ..., 年)。"""
+    ages: np.ndarray
+    annual_rent: np.ndarray
+    move_cost: np.ndarray
+    cum_rent: np.ndarray
+
+
+class BuyResult(NamedTuple):
+    """購入プランの年次系列。形状は (シナリオ..., 年)、loan_* のスカラー項目は (シナリオ...)。"""
+    loan_amount: np.ndarray      # 借入額（物件価格＋諸費用−自己資金）
+    loan_monthly: np.ndarray     # 月々返済額（万円・整数に丸め）
+    loan_payment: np.ndarray
+    loan_cumulative: np.ndarray
+    loan_balance: np.ndarray     # 期首残債
+    property_value: np.ndarray
+    koujo: np.ndarray
+    koujo_cumulative: np.ndarray
+    gap: np.ndarray              # 物件価値 − 残債
+    reverse_year: np.ndarray     # gap が初めてプラスになる経過年（なければ -1）
+
+
+def _col(v) -> np.ndarray:
+    return np.asarray(v, dtype=float)[..., None]
+
+
+def rent_costs(age_from: Sequence[float], age_to: Sequence[float], rent: Sequence[float], years: int = 50,
+               increase_rate: float = RENT_INCREASE, step_years: int = RENT_STEP_YEARS) -> RentResult:
+    """
+    年齢区分ごとの家賃（age_from / age_to / rent の末尾の軸が区分）から年次の家賃を求める。
+    - 区分の終了年齢を過ぎた翌年から次の区分の家賃。次の区分の開始年齢になった年にも家賃を改定し直す。
+    - 区分内では step_years ごとに increase_rate で上昇（月額は万円の整数に丸め）。
+    - 2番目以降の区分の開始年齢の年に、引越し費用（月額 × 6ヶ月）。
+    """
+    frm = np.asarray(age_from, dtype=float)
+    to = np.asarray(age_to, dtype=float)
+    rent = np.asarray(rent, dtype=float)
+    n_sec = frm.shape[-1]
+    t = np.arange(years)
+    ages = frm[..., :1] + t                                                    # (..., 年)
+
+    # 各年の区分：終了年齢を過ぎた区分の数（最後の区分で止める）
+    sec = np.minimum((to[..., None, :] < ages[..., :, None]).sum(axis=-1), n_sec - 1)
+    # 区分の開始年：その区分に入った年、または区分の開始年齢に達した年（後の方）
+    sec_ids = np.arange(n_sec)
+    entered = (sec[..., None, :] == sec_ids[:, None])                          # (..., 区分, 年)
+    first_idx = np.where(entered.any(axis=-1), entered.argmax(axis=-1), years)  # (..., 区分)
+    reset_at = entered & (ages[..., None, :] == frm[..., :, None])
+    reset_idx = np.where(reset_at.any(axis=-1), reset_at.argmax(axis=-1), years)
+    first_t = np.take_along_axis(first_idx, sec, axis=-1)
+    reset_t = np.take_along_axis(reset_idx, sec, axis=-1)
+    start = np.where(t >= reset_t, reset_t, first_t)
+    if n_sec:
+        start = np.where(t == 0, 0, start)
+
+    base = np.take_along_axis(rent, sec, axis=-1)
+    monthly = np.round(base * (1 + increase_rate) ** ((t - start) // step_years))
+    annual_rent = monthly * 12
+    move_years = frm[..., 1:]
+    is_move = (ages[..., :, None] == move_years[..., None, :]).any(axis=-1)
+    move_cost = np.where(is_move, (annual_rent // 12) * MOVE_MONTHS, 0.0)
+    return RentResult(ages, annual_rent, move_cost, np.cumsum(annual_rent + move_cost, axis=-1))
+
+
+def remaining_balance_ratio(annual_rate, loan_years, k_months) -> np.ndarray:
+    """k回返済後の残高 / 借入額（元利均等・閉形式、配列をブロードキャスト）。"""
+    r = _col(annual_rate) / 12
+    n = _col(loan_years) * 12
+    k = np.minimum(np.asarray(k_months, dtype=float), n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth_n = (1 + r) ** n
+        ratio = np.where(r == 0, 1 - k / n, (growth_n - (1 + r) ** k) / (growth_n - 1))
+    return np.where(k >= n, 0.0, ratio)
+
+
+def buy_costs(price, funds, loan_rate, loan_years, years: int = 50, is_house=False, built_year=0,
+              building_price=0, reno_cost=0, reno_effect=0, reno_timing=100,
+              koujo_limit=0, koujo_years=0, expense_rate: float = EXPENSE_RATE, curves=None,
+              annual_income=None) -> BuyResult:
+    """
+    購入プランの年次系列を一括計算（年のループなし）。loan_rate は小数。
+    月々返済額は万円の整数に丸め、残債はその返済額で返す場合の期首残高（閉形式）。
+    住宅ローン控除は min(期首残債, 借入限度額) × 0.7%（koujo_years 年間）。annual_income（万円）を渡すと
+    lib.loan_deduction で見積もった所得税・住民税の額を上限にする。
+    物件価値は lib.valuation の減価テーブルで評価する（curves に地域別カーブを渡すと差し替え）。
+    """
+    t = np.arange(years)
+    price = np.asarray(price, dtype=float)
+    loan_amount = price + np.round(price * expense_rate) - np.asarray(funds, dtype=float)
+    raw = monthly_payment(loan_amount * 10000, loan_rate, loan_years)
+    loan_monthly = np.round(np.asarray(raw) / 10000)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(raw > 0, loan_monthly * 10000 / raw, 1.0)
+
+    loan_payment = np.where(t < _col(loan_years), _col(loan_monthly) * 12, 0.0)
+    loan_cumulative = np.cumsum(loan_payment, axis=-1)
+    ratio = remaining_balance_ratio(loan_rate, loan_years, t * 12)
+    loan_balance = np.round(_col(loan_amount) * ratio * _col(scale))
+
+    # 物件価値（リノベは実施年だけ効果を加算）
+    mansion = value_path(_col(price), _col(built_year), t, MANSION, curves=curves)
+    building = np.maximum(value_path(_col(building_price), _col(built_year), t, HOUSE_BUILDING, relative=True,
+                                     curves=curves), 0)
+    house = building + _col(price) - _col(building_price)
+    reno = renovation_uplift(t, [RenovationEvent(_col(reno_timing), _col(reno_cost), _col(reno_effect))])
+    property_value = np.trunc(np.where(_col(is_house), house, mansion) + reno)
+
+    koujo = np.round(loan_deduction(loan_balance, koujo_limit, np.minimum(loan_years, koujo_years),
+                                    None if annual_income is None else _col(annual_income)).total)
+    gap = property_value - loan_balance
+    return BuyResult(loan_amount, loan_monthly, loan_payment, loan_cumulative, loan_balance, property_value,
+                     koujo, np.cumsum(koujo, axis=-1), gap, first_positive(gap))
+
+
+def first_positive(gap) -> np.ndarray:
+    """gap が初めてプラスになるインデックス（末尾の軸、なければ -1）。"""
+    pos = np.asarray(gap) > 0
+    return np.where(pos.any(axis=-1), pos.argmax(axis=-1), -1)
+
+
+class SweepResult(NamedTuple):
+    """価格 × 自己資金 × 金利 のグリッド（軸の順もこの通り）。自己資金が価格を超えるセルは NaN / -1。"""
+    prices: np.ndarray
+    funds: np.ndarray
+    rates: np.ndarray
+    gap: np.ndarray            # 賃貸の累計支出 − 購入の実質負担（プラスなら購入が有利）
+    reverse_year: np.ndarray   # 資産価値が残債を上回る経過年（なければ -1）
+
+
+def net_buy_cost(buy: BuyResult, funds) -> np.ndarray:
+    """購入の実質負担：自己資金 ＋ 返済累計 − 控除累計 − 最終年の純資産（物件価値 − 残債）。"""
+    equity = buy.property_value[..., -1] - buy.loan_balance[..., -1]
+    return np.asarray(funds, dtype=float) + buy.loan_cumulative[..., -1] - buy.koujo_cumulative[..., -1] - equity
+
+
+def sweep(prices, funds, rates, loan_years, rent_total, years: int = 50,
+          building_ratio: float = 0.0, **buy_kwargs) -> SweepResult:
+    """
+    価格・自己資金・金利（小数）の全組み合わせを1回のブロードキャストで計算する。
+    rent_total は同じ期間の賃貸累計支出。戸建ては建物価格を価格 × building_ratio とする。
+    """
+    p = np.asarray(prices, dtype=float)[:, None, None]
+    f = np.asarray(funds, dtype=float)[None, :, None]
+    r = np.asarray(rates, dtype=float)[None, None, :]
+    shape = np.broadcast_shapes(p.shape, f.shape, r.shape)
+    buy = buy_costs(np.broadcast_to(p, shape), np.broadcast_to(f, shape), np.broadcast_to(r, shape),
+                    loan_years, years, building_price=p * building_ratio, **buy_kwargs)
+    valid = np.broadcast_to(f <= p, shape)
+    gap = np.where(valid, rent_total - net_buy_cost(buy, f), np.nan)
+    reverse_year = np.where(valid, buy.reverse_year, -1)
+    return SweepResult(np.asarray(prices), np.asarray(funds), np.asarray(rates), gap, reverse_year)
@@ -0,0 +1,152 @@
+# lib/repair_fund.py
+# 修繕積立金の妥当性（国交省ガイドラインの代表帯＋機械式加算）・次回大規模修繕の予想額・利回りを、
+# 建物の一覧（CSV / Parquet）に対して列単位の配列演算で一括評価する。大きなファイルはチャンクごとに読んで返す。
+from __future__ import annotations
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from lib.repair_plan import MAJOR_CYCLE, PRIVATE_RATIO_BUILDING, cost_in_year, next_major_year, repair_plan
+
+# 機械式の月額（妥当性の円/㎡・月に加算する用）
+MECH_PARK_UNIT_YEN = {
+    "2段（ピット1段）昇降式":      6_450,
+    "2段（ピット2段）昇降式":      5_840,
+    "3段（ピット1段）昇降横行式":  7_210,
+    "4段（ピット2段）昇降横行式":  6_235,
+    "エレベーター式・垂直循環式":   4_645,
+    "その他":                       5_235,
+}
+
+# 国交省ガイドライン（R6.6.7改定相当）の代表帯：(平均, 下限, 上限, ラベル)
+MLIT_BANDS = (
+    (338, 240, 410, "20階以上"),
+    (335, 235, 430, "20階未満・延床<5,000㎡"),
+    (252, 170, 320, "20階未満・延床5,000〜10,000㎡"),
+    (271, 200, 330, "20階未満・延床10,000〜20,000㎡"),
+    (255, 190, 325, "20階未満・延床20,000㎡以上"),
+)
+_BAND_AVG, _BAND_LOW, _BAND_HIGH = (np.array([b[i] for b in MLIT_BANDS]) for i in range(3))
+_BAND_LABEL = np.array([b[3] for b in MLIT_BANDS], dtype=object)
+JUDGE_LABELS = np.array(["未入力", "安い", "高い", "妥当"], dtype=object)
+
+# 一括評価の入力列（日本語名 → 既定値）。英語の列名も受け付ける
+INPUT_COLUMNS: Dict[str, float] = {
+    "階数": 0, "延床面積": 0, "築年": 0, "戸数": 0, "EV台数": 0, "機械式区画数": 0, "現状円㎡": 0,
+}
+OPTIONAL_COLUMNS = ("機械式形式", "専有面積", "周辺家賃円㎡", "価格万円")
+COLUMN_ALIASES = {
+    "floors": "階数", "total_floor_area": "延床面積", "built_year": "築年", "units": "戸数",
+    "ev_count": "EV台数", "mech_park_slots": "機械式区画数", "current_psqm": "現状円㎡",
+    "mech_park_type": "機械式形式", "private_area": "専有面積", "rent_psqm": "周辺家賃円㎡", "price_man": "価格万円",
+}
+
+
+def band_index(floors, total_floor_area) -> np.ndarray:
+    """MLIT_BANDS のどの帯か（配列可）。"""
+    f = np.asarray(floors)
+    a = np.asarray(total_floor_area)
+    return np.select([f >= 20, a < 5_000, a < 10_000, a < 20_000], [0, 1, 2, 3], 4)
+
+
+def mlit_benchmark(floors: int, total_floor_area: float) -> dict:
+    """1棟分の代表帯（機械式加算は別処理）。"""
+    avg, low, high, label = MLIT_BANDS[int(band_index(floors, total_floor_area))]
+    return {"avg": avg, "low": low, "high": high, "label": label}
+
+
+def mech_add_psqm(unit_type, slots, total_private_area) -> np.ndarray:
+    """機械式駐車場の加算（円/㎡・月）。unit_type は形式名（配列可、未知の形式は 0）。"""
+    per = pd.Series(np.atleast_1d(np.asarray(unit_type, dtype=object))).map(MECH_PARK_UNIT_YEN).fillna(0).to_numpy(float)
+    per = per.reshape(np.shape(unit_type))
+    s = np.asarray(slots, dtype=float)
+    area = np.asarray(total_private_area, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        add = np.where((area > 0) & (s > 0), np.round(per * s / np.where(area > 0, area, 1)), 0)
+    return add.astype(int)
+
+
+def judge_price(psqm, low, high):
+    """未入力(0) / 安い / 高い / 妥当（配列なら同じ形のラベル配列）。"""
+    p = np.asarray(psqm)
+    idx = np.select([p == 0, p < low, p > high], [0, 1, 2], 3)
+    return JUDGE_LABELS[idx] if idx.ndim else str(JUDGE_LABELS[int(idx)])
+
+
+def _normalize(df: pd.DataFrame, defaults: Dict[str, object]) -> pd.DataFrame:
+    df = df.rename(columns=lambda c: COLUMN_ALIASES.get(str(c).strip(), str(c).strip()))
+    missing = [c for c in ("階数", "延床面積", "築年") if c not in df.columns]
+    if missing:
+        raise ValueError(f"必須の列がありません：{', '.join(missing)}")
+    for col, default in {**INPUT_COLUMNS, **defaults}.items():
+        if col not in df.columns:
+            df[col] = default
+    num = list(INPUT_COLUMNS) + [c for c in OPTIONAL_COLUMNS if c != "機械式形式"]
+    df[num] = df[num].apply(pd.to_numeric, errors="coerce").fillna(0)
+    df["機械式形式"] = df["機械式形式"].fillna(defaults.get("機械式形式", "その他"))
+    return df
+
+
+def evaluate_buildings(df: pd.DataFrame, start_year: int, safe_ratio: float = 0.30,
+                       defaults: Optional[Dict[str, object]] = None) -> pd.DataFrame:
+    """
+    建物の表（1行1棟）を一括評価して、入力列に結果列を足した表を返す。
+    defaults には列がない場合の値（機械式形式・専有面積・周辺家賃円㎡・価格万円）を渡す。
+    """
+    defaults = {"機械式形式": "その他", "専有面積": 70, "周辺家賃円㎡": 0, "価格万円": 0, **(defaults or {})}
+    df = _normalize(df.copy(), defaults)
+    floors = df["階数"].to_numpy(float)
+    tfa = df["延床面積"].to_numpy(float)
+    built = df["築年"].to_numpy(float).astype(int)
+    psqm = df["現状円㎡"].to_numpy(float)
+
+    band = band_index(floors, tfa)
+    private_total = np.where(tfa > 0, np.trunc(tfa * PRIVATE_RATIO_BUILDING), 0)
+    mech = mech_add_psqm(df["機械式形式"].to_numpy(object), df["機械式区画数"].to_numpy(float), private_total)
+    low, avg, high = _BAND_LOW[band] + mech, _BAND_AVG[band] + mech, _BAND_HIGH[band] + mech
+
+    # 次回大規模：次の周期の年まで入る期間だけ計画を作り、その年の A.支出合計を引く
+    plan = repair_plan(tfa, floors, df["戸数"].to_numpy(float), df["EV台数"].to_numpy(float),
+                       df["機械式区画数"].to_numpy(float), built, start_year, MAJOR_CYCLE + 1)
+    major_year = next_major_year(built, start_year)
+    major_cost = np.where(built > 0, cost_in_year(plan, major_year), 0)
+
+    area = df["専有面積"].to_numpy(float)
+    rent_monthly = df["周辺家賃円㎡"].to_numpy(float) * area
+    price_yen = df["価格万円"].to_numpy(float) * 10_000
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yield_pct = np.where(price_yen > 0, rent_monthly * 12 / price_yen * 100, np.nan)
+
+    out = df.assign(**{
+        "基準帯": _BAND_LABEL[band],
+        "基準下限": low, "基準平均": avg, "基準上限": high,
+        "判定": judge_price(psqm, low, high),
+        "基準平均との差": np.where(psqm > 0, psqm - avg, np.nan),
+        "次回大規模年": np.where(built > 0, major_year, 0),
+        "次回大規模予想額": major_cost,
+        "安心ライン": np.round(major_cost * safe_ratio).astype(np.int64),
+        "家賃見込み月額": rent_monthly,
+        "表面利回り": yield_pct,
+    })
+    return out
+
+
+def read_chunks(source, kind: str = "csv", chunksize: int = 50_000) -> Iterator[pd.DataFrame]:
+    """CSV / Parquet を chunksize 行ずつ読む（Parquet は pyarrow が必要）。"""
+    if kind == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet の読み込みには pyarrow が必要です。") from e
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, chunksize=chunksize)
+
+
+def evaluate_file(source, start_year: int, kind: str = "csv", chunksize: int = 50_000,
+                  safe_ratio: float = 0.30, defaults: Optional[Dict[str, object]] = None) -> Iterator[pd.DataFrame]:
+    """ファイルをチャンクごとに評価して返す（メモリにはチャンク1つ分の計画行列しか持たない）。"""
+    for chunk in read_chunks(source, kind, chunksize):
+        yield evaluate_buildings(chunk, start_year, safe_ratio, defaults)
@@ -0,0 +1,168 @@
+# lib/repair_plan.py
+# 長期修繕計画（修繕積立金_収益性ページ）の計算エンジン。工事項目 × 年 の行列を、周期のマスクとインフレ係数の
+# ブロードキャストで一度に作り、諸経費・消費税・残高は列の合計と累積和で求める（金額は円の整数）。
+# 建物条件に配列を渡すと先頭の軸が建物の軸になり、多数の建物をまとめて計算できる。
+from __future__ import annotations
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+INFL = 0.03   # インフレ率（年3%・複利）
+OH   = 0.10   # 諸経費（工事費小計の10%）
+TAX  = 0.10   # 消費税（小計+諸経費の10%）
+PRIVATE_RATIO_BUILDING = 0.75  # 延床→総専有（代表値）
+FACADE_COEF   = 1.25
+STEEL_RATIO   = 0.10
+MAJOR_CYCLE   = 12             # 大規模修繕の周期
+
+# 工事項目マスター（区分, 項目, 周期, 単価タイプ, 単価）
+# ※㎡按分の単価を「×10」補正（桁不足解消）
+# 単価タイプ：'sqm'（㎡按分）/'per_unit'（戸数×単価）/'ev'（EV台数×単価）/'per_slot'（機械式区画×単価）/'lump'（一式）
+ITEMS = [
+    # 建築（12年）
+    ("建築", "外壁塗装・タイル補修・シーリング", 12, "sqm",      60_000),  # 6,000 → 60,000
+    ("建築", "屋上・バルコニー・庇 防水改修",     12, "sqm",      28_000),  # 2,800 → 28,000
+    ("建築", "鉄部塗装（手すり・階段・フェンス等）", 12, "sqm",  10_000),  # 1,000 → 10,000
+    ("建築", "外構・舗装・植栽 等",               12, "sqm",       8_000),  #   800 → 8,000
+    ("仮設", "足場仮設（外装工事年）",            12, "sqm",      20_000),  # 2,000 → 20,000
+
+    # 設備（代表単価は据置。EV本体や更生系は元々スケール大）
+    ("設備", "給水設備（ポンプ・受水槽等）更新",   12, "sqm",      12_000),  # 1,200 → 12,000（設備も×10）
+    ("設備", "給排水管 更生/更新（㎡按分）",      24, "sqm",      44_000),  # 4,400 → 44,000
+    ("設備", "分電盤・配電盤・受変電設備 更新",    24, "sqm",      15_000),  # 1,500 → 15,000
+    ("設備", "インターホン更新（モニター化）",     20, "per_unit", 70_000),
+    ("設備", "エレベーター更新（本体）",          25, "ev",   20_000_000),
+
+    # 機械式（ある場合のみ反映）
+    ("機械式", "機械式駐車設備 更新（部分）",      12, "per_slot", 1_500_000),
+    ("機械式", "機械式駐車設備 更新（全面）",      20, "per_slot", 3_000_000),
+
+    # 毎年（定期保守・点検）
+    ("毎年", "エレベーター保守点検（毎年）",        1, "ev",   1_200_000),
+    ("毎年", "消防設備点検（毎年）",                1, "lump",    300_000),
+    ("毎年", "雑修繕・軽微補修（毎年）",            1, "lump",    500_000),
+]
+
+CYCLES = np.array([it[2] for it in ITEMS])
+UNIT_COSTS = np.array([it[4] for it in ITEMS], dtype=float)
+IS_MECH = np.array([it[0] == "機械式" for it in ITEMS])
+
+
+class RepairPlan(NamedTuple):
+    """長期修繕計画（円・int64）。costs は (建物..., 項目, 年)、ほかは (建物..., 年)。"""
+    years: np.ndarray
+    costs: np.ndarray
+    subtotal: np.ndarray       # 工事費小計
+    overhead: np.ndarray       # 諸経費
+    tax: np.ndarray            # 消費税
+    total: np.ndarray          # A.支出合計
+    balance_begin: np.ndarray  # 期首残高
+    income: np.ndarray         # 修繕積立金収入（年額）
+    income_total: np.ndarray   # 当期収入合計（期首残高＋収入）
+    net: np.ndarray            # 当期収支（収入合計－A）
+    balance_end: np.ndarray    # 期末残高
+    invest: np.ndarray         # 参考：積立の一部を運用した場合の評価額（残高には含めない）
+
+
+def _col(v) -> np.ndarray:
+    return np.asarray(v, dtype=float)[..., None]
+
+
+def floor_factor_by_floors(floors) -> np.ndarray:
+    """階数による足場・外装の割増（配列可）。"""
+    f = np.asarray(floors)
+    return np.select([f <= 5, f <= 10, f <= 20], [1.00, 1.10, 1.25], 1.40)
+
+
+def item_quantities(total_floor_area, floors, units, ev_count, mech_park_slots) -> np.ndarray:
+    """各工事項目の数量（㎡・戸・基・区画・一式）。形状は (建物..., 項目)。"""
+    tfa = np.asarray(total_floor_area, dtype=float)
+    fl = np.asarray(floors, dtype=float)
+    per_floor_area = np.where(fl > 0, tfa / np.maximum(1, fl), 0.0)
+    facade = per_floor_area * FACADE_COEF
+    ff = floor_factor_by_floors(fl)
+    by_name = {
+        "外壁塗装": facade * ff,
+        "防水": per_floor_area * ff,
+        "鉄部塗装": facade * STEEL_RATIO * ff,
+        "外構・舗装・植栽": per_floor_area * 0.5,
+        "足場仮設": facade * ff,
+    }
+    by_type = {"per_unit": units, "ev": ev_count, "per_slot": mech_park_slots, "lump": 1}
+    cols = []
+    for _, name, _, utype, _ in ITEMS:
+        if utype == "sqm":
+            cols.append(next((v for k, v in by_name.items() if k in name), tfa))   # 設備系は延床で按分
+        else:
+            cols.append(by_type[utype])
+    return np.stack(np.broadcast_arrays(*[np.asarray(c, dtype=float) for c in cols]), axis=-1)
+
+
+def schedule_mask(built_year, years) -> np.ndarray:
+    """(建物..., 項目, 年) の実施マスク。築年＋周期の倍数の年（築年の年は含まない）。毎年項目は毎年。"""
+    y = np.asarray(years)
+    since = y - _col(built_year)[..., None]                        # (建物..., 1, 年)
+    cyc = CYCLES[:, None]
+    return (cyc == 1) | ((since > 0) & (since % cyc == 0))
+
+
+def repair_plan(total_floor_area, floors, units, ev_count, mech_park_slots, built_year,
+                start_year: int, horizon: int = 35, annual_income=0, current_balance=0,
+                invest_share: float = 0.0, invest_rate: float = 0.0) -> RepairPlan:
+    """
+    長期修繕計画を一括計算する（年・項目のループなし）。
+    - 各項目：数量 × 単価 × (1+INFL)^経過年 を円に丸め、周期のマスクの年だけ計上。
+      周期工事は延床 0 なら計上せず、築年 0（未入力）なら毎年項目も含めて計上しない。
+    - 諸経費・消費税は年ごとの小計から、期末残高は 現在残高 ＋ 収入の累計 − 支出の累計。
+    """
+    years = start_year + np.arange(horizon)
+    t = np.arange(horizon)
+    qty = item_quantities(total_floor_area, floors, units, ev_count, mech_park_slots)    # (建物..., 項目)
+    inflation = (1.0 + INFL) ** t
+    amounts = np.round((UNIT_COSTS * qty)[..., None] * inflation).astype(np.int64)     # (建物..., 項目, 年)
+    built = np.asarray(built_year)
+    active = np.where(CYCLES == 1, True, _col(total_floor_area) > 0) & (_col(built) > 0)  # (建物..., 項目)
+    mask = schedule_mask(built, years) & active[..., None]
+    costs = np.where(mask, amounts, 0)
+
+    subtotal = costs.sum(axis=-2)
+    overhead = np.round(subtotal * OH).astype(np.int64)
+    tax = np.round((subtotal + overhead) * TAX).astype(np.int64)
+    total = subtotal + overhead + tax
+
+    income = np.broadcast_to(np.asarray(annual_income, dtype=np.int64)[..., None], total.shape)
+    balance_end = np.asarray(current_balance, dtype=np.int64)[..., None] + np.cumsum(income - total, axis=-1)
+    balance_begin = np.concatenate([np.broadcast_to(np.asarray(current_balance, dtype=np.int64)[..., None],
+                                                    balance_end[..., :1].shape), balance_end[..., :-1]], axis=-1)
+    income_total = balance_begin + income
+
+    # 参考：毎年 収入 × invest_share を積み立てて invest_rate で複利運用（年末評価額）
+    add = _col(annual_income) * invest_share
+    if invest_rate > 0:
+        invest = add * ((1.0 + invest_rate) ** (t + 1) - 1) / invest_rate
+    else:
+        invest = add * (t + 1)
+    invest = np.round(np.broadcast_to(invest, total.shape)).astype(np.int64)
+    return RepairPlan(years, costs, subtotal, overhead, tax, total, balance_begin, income, income_total,
+                      income_total - total, balance_end, invest)
+
+
+def item_labels(include_mech: bool = True) -> List[Tuple[str, str, str]]:
+    """表の行見出し（区分, 項目, 周期）。"""
+    return [(cat, name, f"{cy}年" if cy > 1 else "毎年") for cat, name, cy, _, _ in ITEMS
+            if include_mech or cat != "機械式"]
+
+
+def next_major_year(built_year, this_year: int, cycle: int = MAJOR_CYCLE) -> np.ndarray:
+    """this_year より後で最初に来る 築年＋周期の倍数 の年（築年が this_year より後ならその年、築年 0 なら 0）。"""
+    b = np.asarray(built_year)
+    k = np.maximum(0, (this_year - b) // cycle + 1)
+    return np.where(b > 0, b + k * cycle, 0)
+
+
+def cost_in_year(plan: RepairPlan, year) -> np.ndarray:
+    """指定年の A.支出合計（計画期間外なら 0）。year は (建物...) の配列可。"""
+    idx = np.asarray(year) - plan.years[0]
+    inside = (idx >= 0) & (idx < len(plan.years))
+    got = np.take_along_axis(plan.total, np.clip(idx, 0, len(plan.years) - 1)[..., None], axis=-1)[..., 0]
+    return np.where(inside, got, 0)
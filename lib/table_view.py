@@ -0,0 +1,80 @@
+# lib/table_view.py
+# 横長の年次表（行＝項目、列＝年）の表示用データ。値は数値の dtype のまま（空欄は NaN）で持ち、桁区切りなどの
+# 書式は表示側の書式指定（NUMBER_FORMAT）に任せる。同じ中身の表は内容のハッシュをキーに使い回し、年数の多い表は範囲で分けて出す。
+from __future__ import annotations
+import hashlib
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from lib.memo import memoize
+
+NUMBER_FORMAT = "localized"   # st.column_config.NumberColumn の書式（桁区切り、小数は必要な分だけ）
+YEARS_PER_PAGE = 20           # これより列が多い表は年の範囲で分けて表示する
+
+
+def _feed(h, v) -> None:
+    if isinstance(v, np.ndarray) and v.dtype != object:
+        a = np.ascontiguousarray(v)
+        h.update(f"nd{a.dtype.str}{a.shape}".encode())
+        h.update(a.tobytes())
+    elif isinstance(v, (pd.Index, pd.Series)):
+        _feed(h, v.to_numpy())
+    elif isinstance(v, (list, tuple, np.ndarray)):
+        h.update(f"seq{len(v)}(".encode())
+        for x in v:
+            _feed(h, x)
+        h.update(b")")
+    elif isinstance(v, dict):
+        _feed(h, sorted(v.items()))
+    else:
+        h.update(f"{type(v).__name__}:{v!r};".encode())
+
+
+def content_key(*args, **kwargs) -> tuple:
+    """引数の中身（配列は dtype・形・バイト列、タプル・リストは要素ごと）のハッシュをキーにする。"""
+    h = hashlib.blake2b(digest_size=16)
+    _feed(h, args)
+    _feed(h, sorted(kwargs.items()))
+    return (h.hexdigest(),)
+
+
+@memoize(maxsize=64, key=content_key)
+def man_table(matrix_yen, index: Sequence[tuple], columns, names: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    円の行列（項目, 年）→ 万円に丸めた数値の表。0 以下は空欄（NaN）。
+    結果は同じ入力の呼び出しで共有されるので、書き換えずに表示だけに使う。
+    """
+    m = np.asarray(matrix_yen, dtype=float)
+    man = np.where(m > 0, np.round(m / 10_000), np.nan)
+    return pd.DataFrame(man, index=pd.MultiIndex.from_tuples(list(index), names=names), columns=list(columns))
+
+
+@memoize(maxsize=64, key=content_key)
+def row_table(rows: Sequence[Tuple[str, Optional[np.ndarray]]], columns, label: str = "項目") -> pd.DataFrame:
+    """
+    (見出し, 値の配列) の並び → 行＝見出しの数値の表。値が None の行は区切りの空行、値の NaN は空欄。
+    結果は同じ入力の呼び出しで共有されるので、書き換えずに表示だけに使う。
+    """
+    columns = list(columns)
+    values = np.full((len(rows), len(columns)), np.nan)
+    for i, (_, v) in enumerate(rows):
+        if v is not None:
+            values[i] = v
+    return pd.DataFrame(values, index=pd.Index([r[0] for r in rows], name=label), columns=columns)
+
+
+def year_pages(n_columns: int, per_page: int = YEARS_PER_PAGE) -> List[slice]:
+    """列を per_page 列ずつに分けたスライス（1ページに収まるなら全体の1つだけ）。"""
+    return [slice(s, min(s + per_page, n_columns)) for s in range(0, max(n_columns, 1), per_page)]
+
+
+def page_label(columns, sl: slice) -> str:
+    cols = list(columns)[sl]
+    return f"{cols[0]}〜{cols[-1]}" if cols else ""
+
+
+def to_csv(df: pd.DataFrame) -> str:
+    """数値の表を CSV に（整数値は小数点なし、空欄は空文字）。"""
+    return df.to_csv(float_format="%.15g")
@@ -0,0 +1,161 @@
+# lib/valuation.py
+# 建物の資産価値・簿価の減価テーブル。築年数（0〜100年＋予測期間50年）× 構造ごとに1回だけ作っておき、
+# 各シミュレーターは配列の参照だけで評価する（年ごとの分岐なし）。地域別のカーブは CSV から読み込める。
+from __future__ import annotations
+import io
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+MAX_AGE = 150             # 築100年で購入して50年後まで
+AGES = np.arange(MAX_AGE + 1)
+
+# 法定耐用年数（定額法）
+LIFE_MAP: Dict[str, int] = {
+    "木造（住宅・耐用22年）": 22,
+    "S造（耐用34年）":        34,
+    "RC造（耐用47年）":       47,
+}
+MANSION = "マンション"
+HOUSE_BUILDING = "戸建て建物"
+HOUSE_DEPRECIATION = 0.04  # 戸建て建物の年間減価率
+CURVE_COLUMNS = ("構造", "築年数", "比率")
+CSV_ENCODINGS = ("utf-8-sig", "cp932")   # UTF-8（BOM 可）と Excel の Shift-JIS 書き出し
+
+
+class RenovationEvent(NamedTuple):
+    year: int                   # 購入から何年目に実施するか
+    cost: float                 # 費用
+    effect: float = 1.0         # 資産価値への反映率
+    life: Optional[int] = None  # 定額で償却する年数（None はその年だけ上乗せ）
+
+
+def _mansion_curve() -> np.ndarray:
+    """新築時92%、築15年まで年2%、30年まで年1.5%、以降年0.8%の減価（価格に対する比率）。"""
+    a = AGES.astype(float)
+    return 0.92 * np.where(
+        a <= 2, 1.0,
+        np.where(a <= 15, 0.98 ** (a - 2),
+                 np.where(a <= 30, 0.98 ** 13 * 0.985 ** (a - 15),
+                          0.98 ** 13 * 0.985 ** 15 * 0.992 ** (a - 30))))
+
+
+@lru_cache(maxsize=1)
+def straight_line_table() -> np.ndarray:
+    """定額法の残存率 (耐用年数 0〜MAX_AGE, 経過年数 0〜MAX_AGE)。耐用年数 0 は 1 年として扱う。"""
+    life = np.maximum(AGES, 1)[:, None].astype(float)
+    table = np.maximum(0.0, 1.0 - np.minimum(AGES[None, :], life) / life)
+    table.setflags(write=False)
+    return table
+
+
+@lru_cache(maxsize=1)
+def default_curves() -> Dict[str, np.ndarray]:
+    """構造名 → 築年数ごとの価値の比率（新築時の価格に対する比率）。"""
+    curves = {
+        MANSION: _mansion_curve(),
+        HOUSE_BUILDING: (1 - HOUSE_DEPRECIATION) ** AGES.astype(float),
+    }
+    for name, life in LIFE_MAP.items():
+        curves[name] = straight_line_table()[life]
+    for v in curves.values():
+        v.setflags(write=False)
+    return curves
+
+
+def _read_curve_csv(source) -> pd.DataFrame:
+    raw = source.read() if hasattr(source, "read") else open(source, "rb").read()
+    for enc in CSV_ENCODINGS:
+        try:
+            return pd.read_csv(io.BytesIO(raw), encoding=enc)
+        except UnicodeDecodeError:
+            continue
+        except pd.errors.EmptyDataError:
+            raise ValueError("減価カーブの CSV が空です。") from None
+    raise ValueError("CSV の文字コードを読み取れません（UTF-8 または Shift-JIS で保存してください）。")
+
+
+def load_curves(source) -> Dict[str, np.ndarray]:
+    """
+    地域別などのカーブを CSV（列：構造, 築年数, 比率）から読み込み、既定のカーブに上書きした辞書を返す。
+    築年数の抜けは線形補間し、最後の値以降は横ばいとする。列の不足・数値でない値は ValueError。
+    """
+    df = _read_curve_csv(source)
+    df.columns = [str(c).strip() for c in df.columns]
+    missing = [c for c in CURVE_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"減価カーブの CSV に列がありません：{'、'.join(missing)}（必要な列：{'、'.join(CURVE_COLUMNS)}）")
+    if df.empty:
+        raise ValueError("減価カーブの CSV にデータ行がありません。")
+    for col in ("築年数", "比率"):
+        values = pd.to_numeric(df[col], errors="coerce")
+        bad = values.isna()
+        if bad.any():
+            rows = ", ".join(str(i + 2) for i in df.index[bad][:5])   # 見出しを1行目とした行番号
+            raise ValueError(f"減価カーブの CSV の「{col}」に数値でない値があります（{rows} 行目）。")
+        df[col] = values
+    df["構造"] = df["構造"].astype(str).str.strip()
+    curves = dict(default_curves())
+    for name, g in df.groupby("構造"):
+        g = g.sort_values("築年数")
+        table = np.interp(AGES, g["築年数"].to_numpy(float), g["比率"].to_numpy(float))
+        table.setflags(write=False)
+        curves[str(name)] = table
+    return curves
+
+
+def unknown_structures(curves: Dict[str, np.ndarray], used: Sequence[str]) -> List[str]:
+    """CSV から読み込んだ構造名のうち、計算で参照する used にないもの（既定のまま残っているカーブは除く）。"""
+    defaults = default_curves()
+    return [name for name, table in curves.items() if name not in used and table is not defaults.get(name)]
+
+
+def lookup(table: np.ndarray, ages) -> np.ndarray:
+    """築年数（配列可）でテーブルを引く。範囲外は端の値。"""
+    return table[np.clip(np.asarray(ages, dtype=int), 0, len(table) - 1)]
+
+
+def value_path(price, built_age, elapsed, structure: str = MANSION, relative: bool = False,
+               curves: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+    """
+    築 built_age 年で購入した建物の、購入 elapsed 年後の価値。引数はブロードキャストする。
+    relative=False はカーブの比率をそのまま価格に掛ける（予算ページのマンション）、
+    relative=True は購入時点を 1 として以降の減価だけを掛ける（戸建て建物）。
+    """
+    table = (curves or default_curves())[structure]
+    age = np.asarray(built_age) + np.asarray(elapsed)
+    factor = lookup(table, age)
+    if relative:
+        start = lookup(table, built_age)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            factor = np.where(start > 0, factor / start, 0.0)
+    return np.asarray(price, dtype=float) * factor
+
+
+def straight_line(cost, life, elapsed) -> np.ndarray:
+    """定額法の残存価額 cost × (1 − min(経過, 耐用)/耐用)。耐用年数・経過年数は整数（配列可）。"""
+    table = straight_line_table()
+    life = np.clip(np.asarray(life, dtype=int), 0, MAX_AGE)
+    elapsed = np.clip(np.asarray(elapsed, dtype=int), 0, MAX_AGE)
+    return np.asarray(cost, dtype=float) * table[life, elapsed]
+
+
+def book_value(building_price, structure: str, elapsed, built_age: int = 0) -> np.ndarray:
+    """中古は残存耐用年数（法定耐用年数 − 築年数、最低1年）で定額償却した簿価。"""
+    life_rem = np.maximum(1, LIFE_MAP[structure] - np.maximum(0, np.asarray(built_age)))
+    return straight_line(building_price, life_rem, elapsed)
+
+
+def renovation_uplift(elapsed, events: Sequence[RenovationEvent]) -> np.ndarray:
+    """リノベによる価値の上乗せ（elapsed の形）。life なしは実施年のみ、ありは実施年から定額で減る。"""
+    t = np.asarray(elapsed)
+    out = np.zeros(t.shape)
+    for ev in events:
+        amount = ev.cost * ev.effect
+        if ev.life is None:
+            out = out + np.where(t == ev.year, amount, 0.0)
+        else:
+            out = out + np.where(t >= ev.year, straight_line(amount, ev.life, t - ev.year), 0.0)
+    return out
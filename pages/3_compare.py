@@ -2,7 +2,9 @@
 
 import streamlit as st
 import json, os, datetime, hashlib
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List
+
+from lib.compare_score import build_age, cached_scores, current_home_fit, tsubo_price
 
 # ==== Supabase 接続設定（追記） ====
 SUPABASE_URL = st.secrets.get("SUPABASE_URL", "")
@@ -25,6 +27,8 @@ if USE_DB and create_client:
         st.warning(f"Supabase初期化に失敗（ローカル保存にフォールバック）：{e}")
 
 TABLE = "compare_states"
+DEFAULT_PROP_COUNT = 5    # 新規・クリア時の物件数
+MAX_PROP_COUNT = 200      # 「比較する物件数」の上限（採点は件数に依らず一括）
 
 # ---------------- グローバル設定 ----------------
 st.set_page_config(page_title="物件比較｜希望適合度×偏差値（顧客別自動保存）", layout="wide")
@@ -171,189 +175,15 @@ def load_prefs(client_id: str | None) -> Dict[str, Any]:
         "importance": {"price":1, "location":2, "size_layout":3, "spec":4, "management":5}
     }
 
-# ---------------- ユーティリティ（採点） ----------------
+# ---------------- ユーティリティ（採点は lib/compare_score.py） ----------------
 def auto_tsubo_price(price_man: float, area_m2: float) -> float:
     # 坪単価（万/坪）= 価格(万円) / ㎡ × 3.30578
-    if area_m2 <= 0: return 0.0
-    return price_man / area_m2 * 3.30578
-
-def build_age(year_built: int) -> int:
-    if year_built<=0: return -1
-    y = datetime.date.today().year
-    return max(0, y - year_built)
+    return float(tsubo_price(price_man, area_m2))
 
 def build_age_text(year_built: int) -> str:
     a = build_age(year_built)
     return "築年不明" if a<0 else f"築{a}年"
 
-def norm_more(x: float, lo: float, hi: float) -> float:
-    if hi<=lo: return 0.5
-    x = min(max(x, lo), hi)
-    return (x - lo) / (hi - lo)
-
-def norm_less(x: float, lo: float, hi: float) -> float:
-    if hi<=lo: return 0.5
-    x = min(max(x, lo), hi)
-    return 1.0 - (x - lo) / (hi - lo)
-
-def imp_to_weight(imp: int) -> float:
-    # 1=最優先 → 5点、5=最低 → 1点
-    imp = int(imp or 5)
-    return float(6 - min(max(imp,1),5))
-
-def feature_label_score(present: bool, label: str) -> float:
-    if label == "◎":   # 必須：無ければ0
-        return 1.0 if present else 0.0
-    if label == "○":   # 推奨：あれば1.0、無ければ0.0
-        return 1.0 if present else 0.0
-    if label == "△":   # どちらでも
-        return 0.6
-    if label == "×":   # 無い方がよい
-        return 0.7 if not present else 0.4
-    return 0.5
-
-def aggregate_label_block(presence_map: Dict[str,bool], labels: Dict[str,str]) -> Tuple[float, Dict[str,float]]:
-    if not labels:
-        return 0.5, {}
-    scores = {}
-    need_count = 0
-    unmet_need = 0
-    for feat, lab in labels.items():
-        pres = bool(presence_map.get(feat, False))
-        s = feature_label_score(pres, lab)
-        scores[feat] = s
-        if lab == "◎":
-            need_count += 1
-            if pres is False:
-                unmet_need += 1
-    base = sum(scores.values())/max(1,len(scores))
-    if need_count>0 and unmet_need>0:
-        base *= 0.6  # 必須未充足あり→減衰
-    return base, scores
-
-def score_price_block(price_man: float, tsubo_price: float, prefs: Dict[str,Any]) -> float:
-    b = prefs.get("budget_man")
-    if not b:
-        return 0.5
-    return norm_less(price_man, 0, float(b)*1.4)
-
-def score_location_block(p: Dict[str,Any], prefs: Dict[str,Any]) -> float:
-    dist = p.get("dist_station", 10)
-    access = p.get("access_work", 30)
-    base = 0.6*norm_less(dist,0,20) + 0.4*norm_less(access,0,90)
-    if p.get("redevelopment_bonus", False):
-        base = min(1.0, base*1.2)
-    return base
-
-def score_size_layout_block(area_m2: float, layout_note: str, prefs: Dict[str,Any]) -> float:
-    s = norm_more(area_m2, 40, 90)
-    wish = prefs.get("layout_free","") or ""
-    if wish and layout_note and any(w in layout_note for w in wish.split()):
-        s = min(1.0, s + 0.05)
-    return s
-
-def score_spec_block(presence_map: Dict[str,bool], labels_spec: Dict[str,str]) -> float:
-    val, _ = aggregate_label_block(presence_map, labels_spec)
-    return val
-
-def score_mgmt_block(presence_map: Dict[str,bool], labels_mgmt: Dict[str,str], parking_type: str, parking_must: bool) -> float:
-    val, _ = aggregate_label_block(presence_map, labels_mgmt)
-    if parking_must:
-        ok = (parking_type in ["平置き","機械式"])
-        if not ok:
-            val *= 0.6
-    return val
-
-# ——（置き換え）戸建てスコア：簡易ルール —— 
-# ——（置き換え）戸建てスコア：簡易ルール —— 
-def _grade_to_score(v: str) -> float:
-    """
-    共通ラベル→スコア変換
-    - 高い/良い/十分/適切/合致/良好/可 = 1.0
-    - 普通/不明 = 0.6
-    - 低い/不足/不適切/不一致/不良/不可 = 0.3
-    - bool は True=1.0 / False=0.0
-    """
-    if isinstance(v, bool):
-        return 1.0 if v else 0.0
-    if v in ["高い","良い","十分","適切","合致","良好","可"]:
-        return 1.0
-    if v in ["普通","不明"]:
-        return 0.6
-    if v in ["低い","不足","不適切","不一致","不良","不可"]:
-        return 0.3
-    return 0.6
-
-
-def score_house_spec(p: Dict[str,Any]) -> float:
-    """
-    戸建ての「建物（構造・性能）」スコア
-    """
-    # UIのキーに合わせてエイリアス（無ければ envelope を流用）
-    exterior_wall = p.get("exterior_wall", p.get("envelope", "普通"))
-    roof_state    = p.get("roof_state",    p.get("envelope", "普通"))
-
-    base_keys = ["quake", "insulation", "deterioration"]
-    base_vals = [
-        _grade_to_score(p.get("quake", "普通")),
-        _grade_to_score(p.get("insulation", "普通")),
-        _grade_to_score(p.get("deterioration", "普通")),
-        _grade_to_score(exterior_wall),
-        _grade_to_score(roof_state),
-    ]
-    base = sum(base_vals)/len(base_vals) if base_vals else 0.5
-
-    bonus = 0.0
-    if p.get("long_term", False):     bonus += 0.05
-    if p.get("zeh", False):           bonus += 0.05
-    if p.get("energy_saving", False): bonus += 0.05
-    return min(1.0, base + bonus)
-
-def score_house_management_like(p: Dict[str,Any]) -> float:
-    """
-    戸建ての「管理・共用」相当を敷地/外構で評価
-    """
-    # UIの 'road' を丸めて評価（良好/普通/不良/不明）
-    road_raw = str(p.get("road", "不明"))
-    if road_raw == "良好":
-        road_label = "良い"
-    elif road_raw == "不良":
-        road_label = "低い"
-    elif road_raw in ["普通", "不明"]:
-        road_label = road_raw
-    else:
-        road_label = "不明"
-
-    parts = [
-        _grade_to_score(road_label),                         # 接道状況の総合評価
-        _grade_to_score(p.get("garbage_spot", "普通")),      # ゴミ捨て場
-        _grade_to_score(p.get("utility_pole", "普通")),      # 電柱位置
-        _grade_to_score(p.get("car_parking_ease", "普通")),  # 車の止め易さ
-        _grade_to_score(p.get("site_retaining", "普通")),    # 高低差・擁壁・排水
-    ]
-    return sum(parts) / len(parts)
-# —— ここから下は共有関数（削除してしまった場合の復旧用。既に他所にあれば重複定義は削除してください）——
-
-def to_weights(importance: Dict[str,int]) -> Dict[str,float]:
-    raw = {
-        "price":       imp_to_weight(importance.get("price",3)),
-        "location":    imp_to_weight(importance.get("location",3)),
-        "size_layout": imp_to_weight(importance.get("size_layout",3)),
-        "spec":        imp_to_weight(importance.get("spec",3)),
-        "management":  imp_to_weight(importance.get("management",3)),
-    }
-    s = sum(raw.values()) or 1.0
-    return {k: v/s for k,v in raw.items()}
-
-def to_fit_score(blocks: Dict[str,float], weights: Dict[str,float]) -> float:
-    return sum(blocks[k]*weights.get(k,0) for k in blocks)
-
-def to_hensachi_abs(fit: float) -> float:
-    return 50.0 + 50.0*max(0.0, min(1.0, fit))
-
-def to_hensachi_rel(fit_cand: float, fit_current: float) -> float:
-    return 50.0 + 50.0*(fit_cand - fit_current)
-
 def save_compare_state(client_id: str, state: Dict[str, Any]):
     """
     1) Supabase へ UPSERT
@@ -398,7 +228,6 @@ with top_d:
 
 # ---------------- 希望条件（②の成果物） ----------------
 prefs = load_prefs(client_id_query)
-weights = to_weights(prefs.get("importance", {}))
 
 
 
@@ -505,14 +334,7 @@ if client_id_q and st.session_state.get("__curhome_autosave__", True):
         st.session_state["__last_saved__"] = datetime.datetime.now().strftime("%H:%M:%S")  # 任意：最終保存表示を更新
         st.toast("現住を自動保存しました。", icon="💾")
 # ====== ブロック別適合度（現住は保存値から算出） ======
-cur_blocks = {
-    "price": 0.5,
-    "location": 0.6*norm_less(int(cur.get("walk_min",20)),0,20) + 0.4*norm_less(min(int(cur.get("commute_h",60)), int(cur.get("commute_w",40))),0,90),
-    "size_layout": norm_more(float(cur.get("area_m2",55.0)),40,90),
-    "spec": 0.5,
-    "management": 0.5,
-}
-cur_fit = to_fit_score(cur_blocks, weights)
+cur_fit = current_home_fit(cur, prefs)
 
 # ====== 次セクション見出し（元の位置を維持） ======
 st.header("② 基本の希望条件（採点ルール）")
@@ -529,7 +351,7 @@ with st.container(border=True):
         st.markdown(f"**物件種別**： {', '.join(prefs.get('types', [])) if prefs.get('types') else '未設定'}")
     st.caption("※ ラベル評価：◎=必須／○=推奨（70%充足で合格水準）／△・×＝軽微加点。重要度(1=最優先〜5)は重み化。")
 
-# ========== 5物件の基本情報（顧客別・自動保存に対応） ==========
+# ========== 物件の基本情報（顧客別・自動保存に対応） ==========
 # props の初期化：顧客IDがあれば顧客別ファイルから復元。なければ旧DRAFTを参照。
 if "props" not in st.session_state:
     client_id = _get_client_id_from_query()
@@ -539,7 +361,7 @@ if "props" not in st.session_state:
         if not st.session_state.props:
             st.session_state.props = [
                 {"name": f"物件{i+1}","type":"マンション","price_man":0.0,"year_built":0,"area_m2":0.0,
-                 "kanri":0, "shuzen":0} for i in range(5)
+                 "kanri":0, "shuzen":0} for i in range(DEFAULT_PROP_COUNT)
             ]
     else:
         if os.path.exists(DRAFT_JSON):
@@ -547,7 +369,7 @@ if "props" not in st.session_state:
         else:
             st.session_state.props = [
                 {"name": f"物件{i+1}","type":"マンション","price_man":0.0,"year_built":0,"area_m2":0.0,
-                 "kanri":0, "shuzen":0} for i in range(5)
+                 "kanri":0, "shuzen":0} for i in range(DEFAULT_PROP_COUNT)
             ]
 
 # 後方互換：保存に type が無い場合はデフォルトで付与
@@ -557,7 +379,7 @@ for p in st.session_state.props:
 
 props: List[Dict[str,Any]] = st.session_state.props
 
-# --- 5件固定のため安全パディング／トリム ---
+# --- 比較する件数に合わせてパディング／トリム ---
 def _default_prop(i: int) -> Dict[str, Any]:
     return {
         "name": f"物件{i+1}",
@@ -569,13 +391,15 @@ def _default_prop(i: int) -> Dict[str, Any]:
         "shuzen": 0
     }
 
-# 長さ不足なら埋める／多すぎれば切る（UIは常に5行）
+# 長さ不足なら埋める／多すぎれば切る（UIは「比較する物件数」の行数）
 if not isinstance(props, list):
     props = []
-if len(props) < 5:
-    props += [_default_prop(i) for i in range(len(props), 5)]
-elif len(props) > 5:
-    props = props[:5]
+n_props = int(st.number_input("比較する物件数", min_value=1, max_value=MAX_PROP_COUNT, step=1,
+                              value=min(max(DEFAULT_PROP_COUNT, len(props)), MAX_PROP_COUNT), key="__n_props__"))
+if len(props) < n_props:
+    props += [_default_prop(i) for i in range(len(props), n_props)]
+elif len(props) > n_props:
+    props = props[:n_props]
 
 # 必要キーの欠落を補完（後方互換）
 for i, p in enumerate(props):
@@ -590,7 +414,7 @@ for i, p in enumerate(props):
 # st.session_state にも反映（次回保存用）
 st.session_state.props = props
 
-st.header("③ 5物件の基本情報（顧客別の下書き保存対応）")
+st.header(f"③ {n_props}物件の基本情報（顧客別の下書き保存対応）")
 
 with st.container(border=True):
 
@@ -619,8 +443,8 @@ with st.container(border=True):
     for i, h in enumerate(["名称","種別","価格（万円）","築：西暦","築表示","面積（㎡）","管理費（円/月）","修繕積立（円/月）"]):
         cols[i].markdown(f"**{h}**")
 
-    # 3) 5行を固定インデックスで描画（列インデックスは常に不変）
-    for idx in range(5):
+    # 3) 物件数ぶんの行を固定インデックスで描画（列インデックスは常に不変）
+    for idx in range(n_props):
         c0,cT,c1,c2,c3,c4,c5,c6 = st.columns([1.1,0.9,1,1,1,1,1,1], gap="small")
 
         # 名称
@@ -728,7 +552,7 @@ with st.container(border=True):
         if st.button("🗑 クリア（このページ）", use_container_width=True):
             st.session_state.props = [
                 {"name": f"物件{i+1}","type":"マンション","price_man":0.0,"year_built":0,"area_m2":0.0,"kanri":0,"shuzen":0}
-                for i in range(5)
+                for i in range(n_props)
             ]
             st.success("このページの入力をクリアしました。必要なら保存してください。")
             st.rerun()
@@ -1037,28 +861,10 @@ else:
         p["border"] = p["boundary"]["dispute"]
 # ========== 比較表 ==========
 st.header("⑤ 比較サマリー")
+scores = cached_scores(props, prefs, M, cur_fit)
+tsubo_all = tsubo_price([float(p.get("price_man",0)) for p in props], [float(p.get("area_m2",0)) for p in props])
 rows = []
-for p in props:
-    tsubo = auto_tsubo_price(float(p.get("price_man",0)), float(p.get("area_m2",0)))
-    # スコア再計算（表用）
-    if p.get("type","マンション") == "マンション":
-        sp_map, mg_map = {}, {}
-        for cat, items in M["spec_categories"].items():
-            for jdx, feat in enumerate(items):
-                sp_map[feat] = bool(p.get("spec",{}).get(cat,{}).get(feat, False))
-        for feat in M["mgmt_shared_etc"]:
-            mg_map[feat] = bool(p.get("mgmt",{}).get(feat, False))
-        b_spec = score_spec_block(sp_map, prefs.get("labels_spec",{}))
-        b_mgmt = score_mgmt_block(mg_map, prefs.get("labels_mgmt",{}), p.get("parking_type","なし/不明"), bool(prefs.get("parking_must", False)))
-    else:
-        b_spec = score_house_spec(p)
-        b_mgmt = score_house_management_like(p)
-
-    b_price = score_price_block(p.get("price_man",0.0), tsubo, prefs)
-    b_loc   = score_location_block(p, prefs)
-    b_size  = score_size_layout_block(p.get("area_m2",0.0), "", prefs)
-    fit     = to_fit_score({"price":b_price,"location":b_loc,"size_layout":b_size,"spec":b_spec,"management":b_mgmt}, to_weights(prefs.get("importance", {})))
-
+for p, tsubo, fit_abs, fit_rel in zip(props, tsubo_all, scores.fit_abs, scores.fit_rel):
     rows.append({
         "物件名": p["name"],
         "種別": p.get("type","マンション"),
@@ -1067,9 +873,9 @@ for p in props:
      "築": ("新築" if p.get("new_build") else (build_age_text(int(p.get("year_built",0)) if str(p.get("year_built","")).isdigit() else 0) if p.get("year_built") else "—")),
         "駅徒歩(分)": p.get("dist_station", None),
         "通勤(分)": p.get("access_work", None),
-        "坪単価(万/坪)": round(tsubo,1),
-        "適合度(0-100)": round(to_hensachi_abs(fit),1),
-        "偏差値(現住=50)": round(to_hensachi_rel(fit, cur_fit),1),
+        "坪単価(万/坪)": round(float(tsubo),1),
+        "適合度(0-100)": round(float(fit_abs),1),
+        "偏差値(現住=50)": round(float(fit_rel),1),
         "再開発": "有" if p.get("redevelopment_bonus") else "無",
         "宅配ボックス": ("—" if p.get("type","マンション")=="戸建て" else ("有" if p.get("mgmt",{}).get("宅配ボックス", False) else "無"))
     })
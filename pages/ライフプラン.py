@@ -1,12 +1,22 @@
 import streamlit as st
 import pandas as pd
-import numpy_financial as npf
+import numpy as np
 # ==== 日本語フォント（Matplotlib用）をファイル内で自給 ====
 import io, zipfile
 from pathlib import Path
 from matplotlib import font_manager, rcParams
 import requests
 
+from lib.portfolio import PORT_NAMES, PORT_DEFAULTS, PORT_RATES
+from lib.lifeplan import LifePlan, lifeplan_table
+from lib.loan_deduction import MOVE_YEARS, PERF_CLASSES, deduction_terms
+from lib.lifeplan_graph import LifePlanGraph
+from lib.table_view import NUMBER_FORMAT, to_csv as table_csv
+from lib.lifeplan_goal import THROUGH_AGE, max_living, max_house, earliest_retire_age
+from lib.lifeplan_monthly import simulate_monthly, rollup
+from lib.lifeplan_mc import ASSET_NAMES, simulate_lifeplan, percentile_bands, shortfall_by_year, mc_summary
+from lib.portfolio import PORT_VOLS, IDECO_VOL, default_correlation
+
 # 公式IPAex直リンク（単体zip）
 _IPAEX_G_ZIP = "https://moji.or.jp/wp-content/ipafont/IPAexfont/ipaexg00401.zip"  # ゴシック
 # （必要なら明朝も可） _IPAEX_M_ZIP = "https://moji.or.jp/wp-content/ipafont/IPAexfont/ipaexm00401.zip"
@@ -45,9 +55,6 @@ def set_matplotlib_japanese_font():
 # ✅ 今後グラフ追加に備えてフォント設定
 set_matplotlib_japanese_font()
 
-def fv(rate, nper, pmt, pv=0, when=0):
-    return npf.fv(rate, nper, pmt, pv, when)
-
 st.title("50年ライフプラン＋キャッシュフロー/資産運用")
 
 with st.form("lifeplan_form"):
@@ -98,6 +105,18 @@ with st.form("lifeplan_form"):
         other = st.number_input("その他（月）", value=2)
         extra = st.number_input("臨時支出（年額）", value=0)
         event = st.number_input("イベント支出（年額）", value=0)
+    st.caption("住宅ローン控除（借入額0なら控除なし。控除額はご主人の年収から見積もった税額が上限）")
+    colK1, colK2, colK3 = st.columns(3)
+    with colK1:
+        loan_amount = st.number_input("住宅ローン借入額（万円）", min_value=0, value=0)
+        loan_rate = st.number_input("住宅ローン金利（年%）", min_value=0.0, value=0.5, step=0.1) / 100
+        loan_term = st.number_input("住宅ローン期間（年）", min_value=1, max_value=50, value=35)
+    with colK2:
+        move_year = st.selectbox("入居年", list(MOVE_YEARS), index=len(MOVE_YEARS) - 1)
+        perf = st.selectbox("住宅性能区分", list(PERF_CLASSES))
+    with colK3:
+        is_new = st.checkbox("新築（買取再販を含む）", value=True)
+        is_kosodate = st.checkbox("子育て・若者世帯", value=False)
 
     st.header("④ 年金・iDeCo")
     colP, colQ = st.columns(2)
@@ -121,12 +140,9 @@ with st.form("lifeplan_form"):
     # ⑤ 資産運用
     st.header("⑤ 資産運用（月額積立・利回り入力）")
     st.caption("積立額は全て“万円/月”、利回りは“年利（%）”。積立0でもOK")
-    port_names = [
-        "NISA積立", "外貨預金積立", "投資信託/ETF積立", "保険（積立型）積立",
-        "仮想通貨積立", "オフショア積立", "FX積立", "定期預金積立", "金・現物積立"
-    ]
-    port_defaults = [3, 1, 2, 1, 1, 1, 0, 1, 0]
-    port_rates = [3.0, 2.0, 4.0, 1.5, 10.0, 5.0, 7.0, 1.0, 2.0]
+    port_names = PORT_NAMES
+    port_defaults = PORT_DEFAULTS
+    port_rates = PORT_RATES
     port_inputs, port_rate_inputs = [], []
     for i, name in enumerate(port_names):
         c1, c2 = st.columns(2)
@@ -151,171 +167,107 @@ with st.form("lifeplan_form"):
         deposit = st.number_input("定期預金（万円）", value=0)
         gold = st.number_input("金・現物（万円）", value=0)
 
-    submitted = st.form_submit_button("シミュレーション実行")
+    st.header("⑦ 月次計算（600ヶ月）")
+    st.caption("ボーナス月・誕生月（退職金・iDeCo受取・年金開始の月）・月複利の積立を反映。表は年次に集計して表示します。")
+    monthly_on = st.checkbox("月次で計算する", value=False)
+    colM1, colM2, colM3, colM4 = st.columns(4)
+    with colM1:
+        start_month = st.number_input("計算開始月", min_value=1, max_value=12, value=1)
+    with colM2:
+        bonus_pct = st.number_input("年収のうちボーナス（%・6月/12月）", min_value=0, max_value=60, value=0)
+    with colM3:
+        birth_month_main = st.number_input("ご主人 誕生月", min_value=1, max_value=12, value=1)
+    with colM4:
+        birth_month_spouse = st.number_input("奥様 誕生月", min_value=1, max_value=12, value=1)
+
+    st.header("⑧ リスク評価（モンテカルロ）")
+    st.caption("各資産の利回りを毎年ランダムに変動させ（ボラティリティ＋資産間の相関）、資産推移のばらつきを試算します。")
+    mc_on = st.checkbox("モンテカルロを実行する", value=False)
+    mc_paths = st.selectbox("パス数", [1_000, 10_000, 50_000], index=1)
+    mc_vols = []
+    vol_cols = st.columns(5)
+    for i, (name, vol) in enumerate(zip(ASSET_NAMES, PORT_VOLS + [IDECO_VOL])):
+        with vol_cols[i % 5]:
+            mc_vols.append(st.number_input(f"{name.replace('積立', '')} 変動幅（%/年）", min_value=0.0,
+                                           value=float(vol), step=1.0, key=f"{name}_vol") / 100)
 
-def get_child_age(years, age, plan):
-    if age > 0:
-        return [age + i for i in range(years)]
-    elif plan > 0:
-        return [""] * plan + [i for i in range(years - plan)]
-    else:
-        return [""] * years
+    submitted = st.form_submit_button("シミュレーション実行")
 
 if submitted:
-    years = 50
-    base_year = 2025
-    columns = [str(base_year + i) for i in range(years)]
-
-    # 家族年齢
-    ages_main = [age_main + i for i in range(years)]
-    ages_spouse = [age_spouse + i for i in range(years)]
-    child_list = [get_child_age(years, child_ages[i], child_plans[i]) for i in range(4)]
-
-    # 年金の簡易計算
-    def nenkin_simple(avg_income, record_year, missing_year):
-        wage_pension = avg_income * 5.481 / 1000 * record_year
-        fix_pension = 80 * ((40-missing_year)/40)
-        return wage_pension + fix_pension
-
-    nenkin_main_value = nenkin_net_main if nenkin_net_main > 0 else nenkin_simple(avg_income_nenkin, nenkin_record_year, nenkin_missing_year)
-    nenkin_spouse_value = nenkin_net_spouse if nenkin_net_spouse > 0 else nenkin_simple(avg_income_nenkin_s, nenkin_record_year_s, nenkin_missing_year_s)
-    nenkin_main = [round(nenkin_main_value) if age >= 65 else 0 for age in ages_main]
-    nenkin_spouse = [round(nenkin_spouse_value) if age >= 65 else 0 for age in ages_spouse]
-
-    # iDeCo積立額
-    ideco_total_main = round(fv(ideco_rate/12, ideco_year*12, -ideco_month, 0, 0) / 10000)
-    ideco_main = [0]*years
-    if 65 - age_main >= 0 and 65 - age_main < years:
-        ideco_main[65 - age_main] = ideco_total_main
-
-    ideco_total_spouse = round(fv(ideco_rate_s/12, ideco_year_s*12, -ideco_month_s, 0, 0) / 10000)
-    ideco_spouse = [0]*years
-    if 65 - age_spouse >= 0 and 65 - age_spouse < years:
-        ideco_spouse[65 - age_spouse] = ideco_total_spouse
-
-    # 収入・退職金
-    incomes_main = [round(income_main*((1+income_up_main)**i)) if ages_main[i] < retire_age_main else 0 for i in range(years)]
-    incomes_spouse = [round(income_spouse*((1+income_up_spouse)**i)) if ages_spouse[i] < retire_age_spouse else 0 for i in range(years)]
-    retire_main_paid = [0]*years
-    retire_spouse_paid = [0]*years
-    if retire_age_main-age_main < years:
-        retire_main_paid[retire_age_main-age_main] = round(retire_main)
-    if retire_age_spouse-age_spouse < years:
-        retire_spouse_paid[retire_age_spouse-age_spouse] = round(retire_spouse)
-
-    # 収入合計
-    stock_incomes = [round(stock_income) for _ in range(years)]
-    other_incomes = [round(other_income) for _ in range(years)]
-    total_income = [
-        incomes_main[i]+incomes_spouse[i]+retire_main_paid[i]+retire_spouse_paid[i]+stock_incomes[i]+other_incomes[i]
-        for i in range(years)
-    ]
-    total_pension = [nenkin_main[i]+nenkin_spouse[i]+ideco_main[i]+ideco_spouse[i] for i in range(years)]
-    total_income_all = [total_income[i]+total_pension[i] for i in range(years)]
-
-    # 支出
-    monthly_expense = living+house+car+edu+ins+other
-    annual_expense = [round(monthly_expense*12+extra+event) for _ in range(years)]
-    surplus = [total_income_all[i]-annual_expense[i] for i in range(years)]
-
-    # 投資積立
-    asset_invest_sum = round(sum(port_inputs)*12)
-    asset_invest_sums = [asset_invest_sum for _ in range(years)]
-
-    # 資産残高計算
-    asset_keys = [
-        "NISA積立", "外貨預金積立", "投資信託/ETF積立", "保険（積立型）積立",
-        "仮想通貨積立", "オフショア積立", "FX積立", "定期預金積立", "金・現物積立"
-    ]
-    initial_vals = [securities, foreign, 0, insurance_product, crypto, offshore, fx, deposit, gold]
-    asset_balances = {}
-    for idx, k in enumerate(asset_keys):
-        amt = port_inputs[idx]
-        rate = port_rate_inputs[idx]
-        balances = [round(initial_vals[idx])]
-        for y in range(years):
-            prev = balances[-1]
-            add_amt = amt*12
-            bal = round(prev*(1+rate)+add_amt)
-            balances.append(bal)
-        asset_balances[k] = balances[1:]
-
-    # iDeCo
-    ideco_balances = []
-    val = 0
-    for y in range(years):
-        if y < 65-age_main:
-            val = round(val*(1+ideco_rate)+(ideco_month*12)/10000)
-        elif y == 65-age_main:
-            val = 0
-        ideco_balances.append(val)
-    asset_balances["iDeCo積立"] = ideco_balances
-
-    # 現預金
-    cash_balances = [round(savings)]
-    for y in range(years):
-        net = surplus[y]-sum(port_inputs)*12
-        cash_balances.append(cash_balances[-1]+net)
-    cash_balances = cash_balances[1:]
-
-    total_asset = [cash_balances[i]+sum(asset_balances[k][i] for k in asset_balances) for i in range(years)]
-
-    # === 表作成 ===
-    records = []
-    records += [
-        ["ご主人年齢"]+ages_main,
-        ["奥様年齢"]+ages_spouse,
-        ["①子供年齢"]+child_list[0],
-        ["②子供年齢"]+child_list[1],
-        ["③子供年齢"]+child_list[2],
-        ["④子供年齢"]+child_list[3],
-        ["" for _ in range(years+1)],
-    ]
-    records += [
-        ["ご主人年収（万円）"]+incomes_main,
-        ["奥様年収（万円）"]+incomes_spouse,
-        ["ご主人退職金（万円）"]+retire_main_paid,
-        ["奥様退職金（万円）"]+retire_spouse_paid,
-        ["ストック収入（万円）"]+stock_incomes,
-        ["その他収入（万円）"]+other_incomes,
-        ["" for _ in range(years+1)],
-    ]
-    records += [
-        ["ご主人年金（万円）"]+nenkin_main,
-        ["奥様年金（万円）"]+nenkin_spouse,
-        ["ご主人iDeCo（万円）"]+ideco_main,
-        ["奥様iDeCo（万円）"]+ideco_spouse,
-        ["収入合計（万円）"]+total_income,
-        ["年金・iDeCo合計（万円）"]+total_pension,
-        ["収入+年金合計（万円）"]+total_income_all,
-        ["" for _ in range(years+1)],
-    ]
-    records += [
-        ["基本生活費（月・万円）"]+[round(living*12) for _ in range(years)],
-        ["住居費（月・万円）"]+[round(house*12) for _ in range(years)],
-        ["車両費（月・万円）"]+[round(car*12) for _ in range(years)],
-        ["教育費（月・万円）"]+[round(edu*12) for _ in range(years)],
-        ["保険料（月・万円）"]+[round(ins*12) for _ in range(years)],
-        ["その他（月・万円）"]+[round(other*12) for _ in range(years)],
-        ["臨時支出（万円）"]+[round(extra) for _ in range(years)],
-        ["イベント支出（万円）"]+[round(event) for _ in range(years)],
-        ["支出合計（万円）"]+annual_expense,
-        ["" for _ in range(years+1)],
-    ]
-    records += [
-        ["年間収支（収入+年金合計-支出）"]+surplus,
-        ["" for _ in range(years+1)],
-        ["資産運用積立（年額）"]+asset_invest_sums,
-        ["" for _ in range(years+1)],
-    ]
-    records += [["現預金（万円）"]+cash_balances]
-    for k in asset_keys:
-        records.append([f"{k.replace('積立','')}残高（万円）"]+asset_balances[k])
-    records.append(["iDeCo残高（万円）"]+asset_balances["iDeCo積立"])
-    records.append(["資産合計（万円）"]+total_asset)
-
-    df = pd.DataFrame(records)
-    df.columns = ["項目"]+columns
+    terms = deduction_terms(move_year, is_new, perf, is_kosodate)
+    plan = LifePlan(
+        age_main=age_main, age_spouse=age_spouse,
+        child_ages=tuple(child_ages), child_plans=tuple(child_plans),
+        income_main=income_main, income_up_main=income_up_main,
+        retire_age_main=retire_age_main, retire_main=retire_main,
+        income_spouse=income_spouse, income_up_spouse=income_up_spouse,
+        retire_age_spouse=retire_age_spouse, retire_spouse=retire_spouse,
+        stock_income=stock_income, other_income=other_income,
+        living=living, house=house, car=car, edu=edu, ins=ins, other=other, extra=extra, event=event,
+        loan_amount=loan_amount, loan_rate=loan_rate, loan_term=loan_term,
+        koujo_limit=float(terms.limit), koujo_years=float(terms.years),
+        nenkin_net_main=nenkin_net_main, nenkin_record_year=nenkin_record_year,
+        nenkin_missing_year=nenkin_missing_year, avg_income_nenkin=avg_income_nenkin,
+        ideco_month=ideco_month, ideco_year=ideco_year, ideco_rate=ideco_rate,
+        nenkin_net_spouse=nenkin_net_spouse, nenkin_record_year_s=nenkin_record_year_s,
+        nenkin_missing_year_s=nenkin_missing_year_s, avg_income_nenkin_s=avg_income_nenkin_s,
+        ideco_month_s=ideco_month_s, ideco_year_s=ideco_year_s, ideco_rate_s=ideco_rate_s,
+        port_amounts=tuple(port_inputs), port_rates=tuple(port_rate_inputs),
+        savings=savings, foreign=foreign, securities=securities, insurance_product=insurance_product,
+        crypto=crypto, offshore=offshore, fx=fx, deposit=deposit, gold=gold,
+    )
+    # 計算は lib.lifeplan（Streamlit 非依存・配列演算）に任せ、ここでは表示だけ行う。
+    # 前回の入力との差分に依存する系列だけを再計算する（セッションごとにグラフを保持）
+    graph = st.session_state.setdefault("lifeplan_graph", LifePlanGraph(years=50, base_year=2025))
+    result = graph.update(plan)
+    if monthly_on:
+        result_monthly = simulate_monthly(plan, years=50, base_year=2025, start_month=start_month,
+                                          birth_month_main=birth_month_main, birth_month_spouse=birth_month_spouse,
+                                          bonus_ratio=bonus_pct / 100)
+        result = rollup(result_monthly)
+    df = lifeplan_table(plan, result)
     st.subheader("ライフプラン50年表（A3横型・資産推移・全項目）")
-    st.dataframe(df, height=900, width=2400)
-    st.download_button("CSVでダウンロード", data=df.to_csv(index=False), file_name="lifeplan_fullwide.csv", mime="text/csv")
+    st.dataframe(df, height=900, width=2400,
+                 column_config={c: st.column_config.NumberColumn(format=NUMBER_FORMAT) for c in df.columns})
+    st.download_button("CSVでダウンロード", data=table_csv(df), file_name="lifeplan_fullwide.csv", mime="text/csv")
+    if monthly_on:
+        st.caption("現預金の推移（月次・万円）")
+        st.line_chart(pd.DataFrame({"現預金": result_monthly.cash_balances, "資産合計": result_monthly.total_asset},
+                                   index=pd.RangeIndex(1, len(result_monthly.cash_balances) + 1, name="月")))
+    with st.expander("⏱ 再計算の内訳（系列ごとの計算時間）", expanded=False):
+        timing = graph.timing_table()
+        st.caption(f"再計算した系列：{int(timing['再計算'].sum())} / {len(timing)}　合計 {timing['時間(ms)'].sum():.2f} ms")
+        st.dataframe(timing.round(3), use_container_width=True, hide_index=True)
+
+    st.subheader(f"🎯 逆算（現預金が{THROUGH_AGE}歳までマイナスにならない条件）")
+    st.caption("他の入力はそのままで1項目だけを動かした場合の上限・下限です。「制約年」は現預金が最も少なくなる年。")
+    goals = [
+        ("基本生活費（月）の上限", max_living(plan), lambda v: f"{v:,.1f}万円"),
+        ("住居費（月）の上限", max_house(plan), lambda v: f"{v:,.1f}万円"),
+        ("ご主人の最短退職年齢", earliest_retire_age(plan), lambda v: f"{v:.0f}歳"),
+    ]
+    for col, (label, g, fmt) in zip(st.columns(3), goals):
+        if np.isnan(g.value):
+            col.metric(label, "達成不可")
+            col.caption(f"{g.binding_year}年（{g.binding_age:.0f}歳）に現預金 {g.min_cash:,.0f}万円")
+        else:
+            col.metric(label, fmt(g.value))
+            col.caption(f"制約年：{g.binding_year}年（{g.binding_age:.0f}歳）")
+
+    if mc_on:
+        st.subheader("リスク評価（モンテカルロ）")
+        with st.expander("資産間の相関（既定値）", expanded=False):
+            st.dataframe(pd.DataFrame(default_correlation(ASSET_NAMES), index=ASSET_NAMES, columns=ASSET_NAMES).round(2))
+        paths = simulate_lifeplan(plan, vols=mc_vols, n_paths=mc_paths, seed=0,
+                                  n_workers=None if mc_paths >= 50_000 else 1)
+        summary = mc_summary(paths)
+        k1, k2, k3 = st.columns(3)
+        k1.metric("50年後の資産合計（中央値）", f"{summary['最終資産 P50']:,.0f}万円")
+        cash_neg = np.flatnonzero(np.asarray(result.cash_balances) < 0)
+        k2.metric("現預金がマイナスになる年（確定計算）",
+                  f"{result.calendar[cash_neg[0]]}年" if len(cash_neg) else "なし")
+        k3.metric("資産合計がマイナスになる確率", f"{summary['資産枯渇確率']:.1%}")
+        st.caption("資産合計（万円）のパーセンタイル帯")
+        st.line_chart(percentile_bands(paths.total_asset, result.calendar))
+        st.caption("その年までに資産合計がマイナスになったパスの割合（累積）。現預金は運用リターンに依らないため確定計算の値を表示しています。")
+        st.line_chart(shortfall_by_year(paths).set_index(pd.Index(result.calendar, name="年")))
@@ -1,46 +1,20 @@
 import streamlit as st
 import pandas as pd
-import numpy_financial as npf
+import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib import font_manager, rcParams
 
-# ===== ここで日本語フォントをセット（utils不要・このファイル内に実装）=====
-def set_matplotlib_japanese_font():
-    """
-    利用可能な日本語フォントを探して matplotlib に設定する。
-    ダメなら最後に DejaVu Sans にフォールバック（記号は出るが日本語は□になる可能性あり）。
-    """
-    candidates = [
-        "IPAexGothic",           # Linux系で入っていることが多い
-        "IPAGothic",
-        "Noto Sans CJK JP",
-        "Noto Sans JP",
-        "Hiragino Sans",         # macOS
-        "Hiragino Kaku Gothic ProN",
-        "Yu Gothic",             # Windows
-        "Meiryo",
-        "MS Gothic",
-        "TakaoGothic",
-        "VL PGothic",
-        "DejaVu Sans",           # 最終手段（日本語×）
-    ]
-    found = None
-    for name in candidates:
-        try:
-            font_manager.findfont(name, fallback_to_default=False)
-            found = name
-            break
-        except Exception:
-            continue
-    if found is None:
-        found = "DejaVu Sans"
-
-    # 日本語フォントを優先しつつ、複数候補を設定
-    rcParams["font.family"] = "sans-serif"
-    rcParams["font.sans-serif"] = [found] + [f for f in candidates if f != found]
-    rcParams["axes.unicode_minus"] = False  # マイナスが豆腐になるのを防止
+from lib import amortization
+from lib.charts import set_matplotlib_japanese_font
+from lib.monthly import MONTHS, delay, month_grid, rollup_end, rollup_start, rollup_sum
+from lib.portfolio import portfolio_rates
+from lib.rent_vs_buy import buy_costs, first_positive, rent_costs, sweep
+from lib.loan_deduction import MOVE_YEARS, PERF_CLASSES, deduction_terms, loan_deduction
+from lib.valuation import HOUSE_BUILDING, MANSION, default_curves, load_curves, unknown_structures
+from lib.prepayment import (
+    PREPAY_MODES, PrepaymentEvent, apply_prepayments, interest_saved_grid, invest_gain_grid,
+)
 
-# ✅ フォント設定（このファイル内の関数を呼ぶ）
+# ✅ フォント設定（lib/charts.py の共通関数）
 set_matplotlib_japanese_font()
 
 st.title("賃貸 vs 購入 住居費・資産価値シミュレーター")
@@ -64,39 +38,14 @@ st.caption("※賃料上昇率は自動で2年ごと2%、引越し費用は家
 
 start_age = age_rent_list[0][0]
 years = 50
-ages = [start_age + i for i in range(years)]
-
-# --- 年間家賃計算 ---
-annual_rent = []
-current_rent = None
-increase_rate = 0.02
-section_idx = 0
-section = age_rent_list[section_idx]
-section_start_idx = 0
 
-for i, age in enumerate(ages):
-    if section_idx < len(age_rent_list) and age > section[1]:
-        section_idx += 1
-        if section_idx < len(age_rent_list):
-            section = age_rent_list[section_idx]
-            section_start_idx = i
-            current_rent = section[2]
-    if current_rent is None or age == section[0]:
-        current_rent = section[2]
-        section_start_idx = i
-    in_section_years = i - section_start_idx
-    up_count = in_section_years // 2
-    applied_rent = current_rent * ((1 + increase_rate) ** up_count)
-    applied_rent = int(round(applied_rent))
-    annual_rent.append(applied_rent * 12)
-
-move_years = [section[0] for section in age_rent_list[1:]]
-move_cost = [annual_rent[i] // 12 * 6 if ages[i] in move_years else 0 for i in range(years)]
-cum_rent = []
-total = 0
-for i in range(years):
-    total += annual_rent[i] + move_cost[i]
-    cum_rent.append(total)
+# --- 年間家賃・引越し費用・累計（lib/rent_vs_buy.py のエンジンで一括計算） ---
+rent_from, rent_to, rent_amounts = (list(col) for col in zip(*age_rent_list))
+rent_res = rent_costs(rent_from, rent_to, rent_amounts, years)
+ages = [int(a) for a in rent_res.ages]
+annual_rent = [int(v) for v in rent_res.annual_rent]
+move_cost = [int(v) for v in rent_res.move_cost]
+cum_rent = [int(v) for v in rent_res.cum_rent]
 
 # --- 購入プラン入力 ---
 st.markdown("---\n#### 購入条件の入力")
@@ -125,6 +74,8 @@ with left:
     loan_years = st.number_input("借入期間（年）", 1, 50, 35)
     loan_rate = st.number_input("金利（年%）", 0.1, 5.0, 0.59) / 100
     funds = st.number_input("自己資金（万円）", 0, int(price), 500)
+    monthly_mode = st.checkbox("月次で計算（ローン開始月・控除は年末残高で判定）", value=False)
+    purchase_month = st.number_input("ローン開始月（開始年齢の年の何ヶ月目か）", 1, 12, 1) if monthly_mode else 1
     if reno:
         reno_cost = st.number_input("リノベ費用（万円・不明なら自動計算）", 0, 3000, int(area * 10))
         reno_effect = st.slider("リノベ効果の資産価値反映率（目安0.6）", 0.0, 1.0, 0.6)
@@ -135,6 +86,19 @@ with left:
         reno_timing = 100
     if property_type == "戸建て":
         land_price = price - building_price
+    curve_file = st.file_uploader("地域別の減価カーブ（任意・CSV：構造, 築年数, 比率）", type="csv")
+    value_curves = None
+    if curve_file is not None:
+        try:
+            value_curves = load_curves(curve_file)
+        except ValueError as e:
+            st.error(f"{e}　既定の減価カーブで計算します。")
+            value_curves = default_curves()
+        else:
+            unknown = unknown_structures(value_curves, (MANSION, HOUSE_BUILDING))
+            if unknown:
+                st.warning(f"次の構造名はこのページで使うカーブ（{MANSION}、{HOUSE_BUILDING}）と一致しないため使われません："
+                           f"{'、'.join(unknown)}")
 
 with right:
     st.write("")
@@ -143,86 +107,58 @@ expense = int(round(price * 0.07))
 loan_amount = price + expense - funds
 st.caption(f"諸費用（7%自動計算）：{expense}万円　→　借入額：{loan_amount}万円")
 
-# --- ローン返済推移（元利均等返済・npf.pvで計算） ---
-n_months = loan_years * 12
-monthly_rate = loan_rate / 12
-loan_monthly = -npf.pmt(monthly_rate, n_months, loan_amount * 10000) / 10000  # 万円
-loan_monthly = int(round(loan_monthly, 0))
-loan_payment = [loan_monthly * 12 if i < loan_years else 0 for i in range(years)]
-loan_cumulative = [sum(loan_payment[:i + 1]) for i in range(years)]
-loan_balance = []
-for y in range(years):
-    n = n_months - y * 12
-    if n > 0:
-        bal = npf.pv(monthly_rate, n, -loan_monthly * 10000, 0) / 10000  # 万円
-        loan_balance.append(int(round(bal)))
-    else:
-        loan_balance.append(0)
-
-# --- 資産価値推移 ---
-property_value = []
-if property_type == "マンション":
-    for y in range(years):
-        age = built_year + y
-        if age <= 2:
-            base = price * 0.92
-        elif age <= 15:
-            base = price * 0.92 * (0.98 ** (age - 2))
-        elif age <= 30:
-            base = price * 0.92 * (0.98 ** 13) * (0.985 ** (age - 15))
-        else:
-            base = price * 0.92 * (0.98 ** 13) * (0.985 ** 15) * (0.992 ** (age - 30))
-        if reno and y == reno_timing:
-            base += reno_cost * reno_effect
-        property_value.append(int(base))
-elif property_type == "戸建て":
-    building_value = [building_price * ((1 - 0.04) ** y) for y in range(years)]
-    land_value = [land_price for _ in range(years)]
-    building_value = [max(b, 0) for b in building_value]
-    for y in range(years):
-        bv = building_value[y]
-        lv = land_value[y]
-        if reno and y == reno_timing:
-            bv += reno_cost * reno_effect
-        property_value.append(int(bv + lv))
+# --- ローン返済推移（元利均等返済・共通エンジンで計算） ---
+loan_schedule = amortization.amortization_schedule(loan_amount * 10000, loan_rate, loan_years)
 
 # --- 住宅性能・世帯区分選択 ---
 st.markdown("##### 住宅性能・世帯要件の選択")
-perf = st.selectbox("住宅性能区分", [
-    "長期優良住宅・低炭素住宅", "ZEH水準省エネ住宅", "省エネ基準適合住宅", "その他の住宅"])
+perf = st.selectbox("住宅性能区分", list(PERF_CLASSES))
 is_kosodate = st.checkbox("子育て・若者世帯", value=False)
+tc1, tc2 = st.columns(2)
+with tc1:
+    move_year = st.selectbox("入居年", list(MOVE_YEARS), index=len(MOVE_YEARS) - 1)
+with tc2:
+    tax_income = st.number_input("世帯主の年収（万円・0なら税額による上限なし）", 0, 10000, 0)
+annual_income = tax_income or None
 
-# --- 住宅ローン控除 判定ロジック ---
-if seller_type == "宅建業者・買取再販" and is_shinchiku:
-    if perf == "長期優良住宅・低炭素住宅":
-        koujo_limit = 5000 if is_kosodate else 4500
-        koujo_years = 13
-    elif perf == "ZEH水準省エネ住宅":
-        koujo_limit = 4500 if is_kosodate else 3500
-        koujo_years = 13
-    elif perf == "省エネ基準適合住宅":
-        koujo_limit = 4000 if is_kosodate else 3000
-        koujo_years = 13
-    else:
-        koujo_limit = 0
-        koujo_years = 0
-else:
-    if perf in ["長期優良住宅・低炭素住宅", "ZEH水準省エネ住宅", "省エネ基準適合住宅"]:
-        koujo_limit = 3000
-        koujo_years = 10
-    else:
-        koujo_limit = 2000
-        koujo_years = 10
-koujo_years = min(loan_years, koujo_years)
+# --- 住宅ローン控除：借入限度額と控除期間（買取再販の新築扱いは新築の要件） ---
+terms = deduction_terms(move_year, seller_type == "宅建業者・買取再販" and is_shinchiku, perf, is_kosodate)
+koujo_limit = int(terms.limit)
+koujo_years = min(loan_years, int(terms.years))
 
-koujo = []
-for y in range(years):
-    if y < koujo_years:
-        k = min(loan_balance[y], koujo_limit) * 0.007
-        koujo.append(int(round(k, 0)))
-    else:
-        koujo.append(0)
-koujo_cumulative = [sum(koujo[:i + 1]) for i in range(years)]
+# --- 購入プラン（返済・残債・物件価値・控除）を一括計算 ---
+buy = buy_costs(
+    price, funds, loan_rate, loan_years, years,
+    is_house=(property_type == "戸建て"), built_year=built_year,
+    building_price=building_price if property_type == "戸建て" else 0,
+    reno_cost=reno_cost, reno_effect=reno_effect, reno_timing=reno_timing,
+    koujo_limit=koujo_limit, koujo_years=koujo_years, curves=value_curves, annual_income=annual_income,
+)
+loan_monthly = int(buy.loan_monthly)  # 万円
+loan_payment = [int(v) for v in buy.loan_payment]
+loan_cumulative = [int(v) for v in buy.loan_cumulative]
+loan_balance = [int(v) for v in buy.loan_balance]
+property_value = [int(v) for v in buy.property_value]
+koujo = [int(v) for v in buy.koujo]
+koujo_cumulative = [int(v) for v in buy.koujo_cumulative]
+
+# --- 月次モード：600ヶ月の配列で返済・残債・控除を計算し、年次に集計して上書き ---
+if monthly_mode:
+    n_months = years * MONTHS
+    k0 = int(purchase_month) - 1
+    m = month_grid(years)
+    pay_m = delay(np.pad(loan_schedule.payment, (0, max(0, n_months - len(loan_schedule.month))))[:n_months], k0)
+    bal_after = np.concatenate([loan_schedule.balance, np.zeros(max(0, n_months - len(loan_schedule.month)))])[:n_months]
+    bal_after = np.where(m < k0, loan_amount * 10000, delay(bal_after, k0))
+    bal_before = np.concatenate([[loan_amount * 10000], bal_after[:-1]])
+    loan_payment = [int(v) for v in np.round(rollup_sum(pay_m) / 10000)]
+    loan_cumulative = [int(v) for v in np.cumsum(loan_payment)]
+    loan_balance = [int(v) for v in np.round(rollup_start(bal_before) / 10000)]
+    year_end = rollup_end(bal_after) / 10000
+    koujo = [int(v) for v in np.round(loan_deduction(year_end, koujo_limit, koujo_years, annual_income).total)]
+    koujo_cumulative = [int(v) for v in np.cumsum(koujo)]
+    st.caption(f"月次モード：ローンは{start_age}歳の年の{purchase_month}ヶ月目から返済開始。"
+               "住宅ローン控除は各年末の残高で計算しています。")
 
 # --- 横持ち比較テーブル ---
 data = {
@@ -237,6 +173,7 @@ data = {
     "物件価値": property_value,
     "ローン控除額": koujo,
     "ローン控除累計": koujo_cumulative,
+    "控除後の実質返済(年)": [p - k for p, k in zip(loan_payment, koujo)],
 }
 df = pd.DataFrame(data)
 df = df.T.reset_index()
@@ -246,7 +183,8 @@ st.dataframe(df, width=2500, height=520)
 
 # --- 残債 vs 評価額比較テーブル ---
 gap = [pv - lb for pv, lb in zip(property_value, loan_balance)]
-reverse_year = next((i for i, g in enumerate(gap) if g > 0), None)
+reverse_year = int(first_positive(np.array(gap)))
+reverse_year = None if reverse_year < 0 else reverse_year
 df_compare = pd.DataFrame({
     "年齢": ages,
     "ローン残債": loan_balance,
@@ -281,6 +219,111 @@ ax2.grid(True)
 st.pyplot(fig2)
 st.caption("※ローン残債と資産価値（物件評価額）が逆転するタイミングに注目。背景黄色行が逆転年。")
 
+# --- 価格 × 自己資金 × 金利 スイープ ---
+with st.expander("🗺 価格 × 自己資金 × 金利 の一括比較（ヒートマップ）", expanded=False):
+    st.caption("物件価格・自己資金・金利の全組み合わせを一括計算。物件種別・築年数・リノベ・控除条件・家賃プランは上の入力を使います。")
+    s1, s2, s3 = st.columns(3)
+    with s1:
+        sw_price = st.slider("物件価格の範囲（万円）", 1000, 20000,
+                             (min(max(1000, price - 3000), 20000), min(price + 3000, 20000)), step=100)
+    with s2:
+        sw_funds = st.slider("自己資金の範囲（万円）", 0, 5000, (0, 2000), step=100)
+    with s3:
+        sw_rate = st.slider("金利の範囲（年%）", 0.1, 5.0, (0.3, 2.0), step=0.1)
+    sw_prices = np.arange(sw_price[0], sw_price[1] + 1, 100)
+    sw_funds_axis = np.arange(sw_funds[0], sw_funds[1] + 1, 100)
+    sw_rates = np.round(np.arange(sw_rate[0], sw_rate[1] + 1e-9, 0.1), 1)
+    sw = sweep(sw_prices, sw_funds_axis, sw_rates / 100, loan_years, cum_rent[-1], years,
+               building_ratio=(building_price / price) if property_type == "戸建て" else 0.0,
+               is_house=(property_type == "戸建て"), built_year=built_year,
+               reno_cost=reno_cost, reno_effect=reno_effect, reno_timing=reno_timing,
+               koujo_limit=koujo_limit, koujo_years=koujo_years, curves=value_curves,
+               annual_income=annual_income)
+    st.caption(f"{sw.gap.size:,} 通りを計算しました。")
+    view_rate = st.select_slider("表示する金利（年%）", options=list(sw_rates),
+                                 value=min(sw_rates, key=lambda r: abs(r - loan_rate * 100)))
+    ri = list(sw_rates).index(view_rate)
+    extent = [sw_funds_axis[0] - 50, sw_funds_axis[-1] + 50, sw_prices[0] - 50, sw_prices[-1] + 50]
+    fig_sw, (ax_gap, ax_rev) = plt.subplots(1, 2, figsize=(14, 5))
+    lim = np.nanmax(np.abs(sw.gap[:, :, ri])) or 1
+    im1 = ax_gap.imshow(sw.gap[:, :, ri], origin="lower", aspect="auto", extent=extent, cmap="RdYlGn", vmin=-lim, vmax=lim)
+    ax_gap.set_title(f"{years}年累計：賃貸 − 購入の実質負担（万円）")
+    fig_sw.colorbar(im1, ax=ax_gap)
+    rev = np.where(sw.reverse_year >= 0, sw.reverse_year, np.nan)[:, :, ri].astype(float)
+    rev[np.isnan(sw.gap[:, :, ri])] = np.nan
+    im2 = ax_rev.imshow(rev, origin="lower", aspect="auto", extent=extent, cmap="viridis_r")
+    ax_rev.set_title("資産価値が残債を上回る経過年（空白＝期間内なし）")
+    fig_sw.colorbar(im2, ax=ax_rev)
+    for ax in (ax_gap, ax_rev):
+        ax.set_xlabel("自己資金（万円）")
+        ax.set_ylabel("物件価格（万円）")
+    st.pyplot(fig_sw)
+    st.caption("実質負担＝自己資金＋返済累計−控除累計−最終年の純資産（物件価値−残債）。緑（プラス）は購入が有利。"
+               "自己資金が物件価格を超える組み合わせは空白。")
+
+# --- 繰上返済シミュレーション ---
+st.markdown("### 繰上返済シミュレーション（期間短縮型／返済額軽減型）")
+loan_yen = loan_amount * 10000
+prepay_df = st.data_editor(
+    pd.DataFrame({"経過年": [10], "金額（万円）": [300], "方式": ["期間短縮"]}),
+    num_rows="dynamic", key="prepay_events",
+    column_config={
+        "経過年": st.column_config.NumberColumn(min_value=1, max_value=max(1, loan_years - 1), step=1),
+        "金額（万円）": st.column_config.NumberColumn(min_value=0, step=10),
+        "方式": st.column_config.SelectboxColumn(options=list(PREPAY_MODES), required=True),
+    },
+)
+prepay_rows = prepay_df.dropna()
+late_years = sorted({int(y) for y in prepay_rows["経過年"] if int(y) >= loan_years})
+if late_years:
+    st.warning(f"経過年 {', '.join(map(str, late_years))} 年の繰上返済は、借入期間（{loan_years}年）の完済以降のため計算に含めません。"
+               f"（経過年は 1〜{loan_years - 1} 年で指定してください）" if loan_years > 1 else
+               f"借入期間が1年のため、繰上返済（経過年 {', '.join(map(str, late_years))} 年）は計算に含めません。")
+prepay_events = [
+    PrepaymentEvent(int(row["経過年"]) * 12, float(row["金額（万円）"]) * 10000, row["方式"])
+    for _, row in prepay_rows.iterrows() if int(row["経過年"]) < loan_years
+]
+prepay = apply_prepayments(loan_yen, loan_rate, loan_years, prepay_events)
+base_interest = float(loan_schedule.interest.sum())
+p1, p2, p3 = st.columns(3)
+p1.metric("総利息（繰上返済なし）", f"{base_interest / 10000:,.0f} 万円")
+p2.metric("総利息（繰上返済あり）", f"{prepay.total_interest / 10000:,.0f} 万円",
+          delta=f"{(prepay.total_interest - base_interest) / 10000:,.0f} 万円", delta_color="inverse")
+p3.metric("完済まで", f"{prepay.months // 12}年{prepay.months % 12}ヶ月",
+          delta=f"{(prepay.months - len(loan_schedule.month)) / 12:+.1f} 年", delta_color="inverse")
+if prepay_events:
+    after_last = min(max(e.month for e in prepay_events), prepay.months - 1)
+    st.caption(f"最後の繰上返済後の月々返済額：{prepay.schedule.payment[after_last] / 10000:,.1f} 万円")
+
+with st.expander("繰上返済 vs 運用（タイミング × 金額のグリッド比較）", expanded=False):
+    rates_by_bucket = portfolio_rates()
+    g1, g2, g3 = st.columns(3)
+    with g1:
+        grid_mode = st.radio("方式", list(PREPAY_MODES), horizontal=True, key="prepay_grid_mode")
+    with g2:
+        bucket = st.selectbox("比較する運用先（ライフプランの利回り）", list(rates_by_bucket), key="prepay_bucket")
+    with g3:
+        invest_rate = st.number_input("運用利回り（年%）", 0.0, 20.0, rates_by_bucket[bucket] * 100,
+                                      step=0.1, key=f"prepay_rate_{bucket}") / 100
+    grid_years = np.arange(1, loan_years)
+    if len(grid_years) == 0:
+        st.info("借入期間が1年のため、完済前に繰上返済できる年がありません（比較は借入期間2年以上で表示します）。")
+    else:
+        grid_amounts = np.arange(100, 1001, 100)
+        saved = interest_saved_grid(loan_yen, loan_rate, loan_years, grid_years * 12, grid_amounts * 10000, grid_mode)
+        gain = invest_gain_grid(loan_years, grid_years * 12, grid_amounts * 10000, invest_rate)
+        net = pd.DataFrame((saved - gain) / 10000, index=[f"{y}年目" for y in grid_years],
+                           columns=[f"{a}万円" for a in grid_amounts])
+        st.dataframe(net.style.format("{:,.0f}").background_gradient(cmap="RdYlGn", axis=None),
+                     use_container_width=True, height=420)
+        best = np.unravel_index(np.argmax(saved - gain), saved.shape)
+        if (saved - gain)[best] > 0:
+            st.success(f"最も有利：{grid_years[best[0]]}年目に{grid_amounts[best[1]]}万円を繰上返済"
+                       f"（運用より {(saved - gain)[best] / 10000:,.0f} 万円有利）")
+        else:
+            st.info(f"どの組み合わせでも、{bucket}（年{invest_rate * 100:.1f}%）で運用した方が有利です。")
+    st.caption("値は「利息軽減額 − 運用益」（万円・名目）。運用益は元の完済時点まで月複利で計算。プラスなら繰上返済が有利。")
+
 # --- 住宅ローン控除 比較テーブル（完全版） ---
 st.markdown("### 【2024-2025年度版】住宅ローン控除制度 比較表")
 html_table = """
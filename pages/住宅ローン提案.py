@@ -10,6 +10,15 @@ from reportlab.lib.styles import ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 import io
+import numpy as np
+
+from lib.amortization import monthly_payment
+from lib.loan_grid import bank_rate_grid, plan_add_matrix, cheapest_labels
+from lib.borrowing_limit import BANK_SCREENING, borrowing_limit, required_income
+from lib.rate_paths import simulate_variable_loan, has_payment_rules, payment_bands, risk_summary
+from lib.memo import memo_stats
+from lib.loan_deduction import MOVE_YEARS, PERF_CLASSES, deduction_terms, loan_deduction
+from lib.rent_vs_buy import remaining_balance_ratio
 
 # ========= フォント ==========
 FONT_PATH = "NotoSansJP-Regular.ttf"
@@ -33,11 +42,7 @@ def get_japanese_style(size=11, font_name='NotoSansJP', alignment='CENTER', lead
     )
 
 def calc_monthly_payment(principal, annual_rate, years):
-    r = annual_rate / 12
-    n = years * 12
-    if r == 0:
-        return principal / n
-    return principal * r / (1 - (1 + r) ** -n)
+    return float(monthly_payment(principal, annual_rate, years))
 
 # ========= 月次の基準金利（ここだけ毎月更新） =========
 # キーは "YYYY-MM"、値は「%（実数）」で3桁程度。
@@ -120,28 +125,15 @@ with st.expander("🔧 金利を修正する（営業担当用）", expanded=Fal
         )
 
 # ========= 借入上限額（10万円単位切り捨て・右揃え）==========
-def calc_borrowing_limit(income, exam_rate, limit_ratio, age):
-    exam_years = min(35, 79 - age)
-    annual_payment = income * limit_ratio
-    monthly_payment = annual_payment / 12
-    r = exam_rate / 12
-    n = exam_years * 12
-    if r == 0:
-        raw_limit = monthly_payment * n
-    else:
-        raw_limit = monthly_payment * (1 - (1 + r) ** -n) / r
-    return int(raw_limit // 100000 * 100000)
-
-banks_info = {
-    "SBI新生銀行": {"審査金利": 0.03,   "返済比率": 0.40},
-    "三菱UFJ銀行": {"審査金利": 0.0354, "返済比率": 0.35},
-    "PayPay銀行":  {"審査金利": 0.03,   "返済比率": 0.40},
-    "じぶん銀行":  {"審査金利": 0.0257, "返済比率": 0.35},
-    "住信SBI銀行": {"審査金利": 0.0325, "返済比率": 0.35},
-}
+other_debt_annual = st.number_input(
+    "他社借入の年間返済額 (万円)", 0, 2000, 0,
+    help="ヒアリングの「他社借入」（車・カードローン等）の年間返済額。返済比率の枠から差し引きます。",
+) * 10000
+
+banks_info = BANK_SCREENING
 limit_amounts, limit_data = {}, []
-for bank, info in banks_info.items():
-    limit = calc_borrowing_limit(annual_income, info["審査金利"], info["返済比率"], age)
+for bank in banks_info:
+    limit = int(borrowing_limit(bank, annual_income, age, other_debt_annual))
     limit_amounts[bank] = limit
     man = int(limit // 10000)
     limit_data.append([bank, f"{man:,} 万円"])
@@ -163,60 +155,48 @@ for _, row in limit_df.iterrows():
 table_html += "</tbody></table>"
 st.markdown(table_html, unsafe_allow_html=True)
 
+with st.expander("🔁 この借入額に必要な年収（逆算）", expanded=False):
+    need = {bank: required_income(bank, principal, age, other_debt_annual) for bank in banks_info}
+    need_df = pd.DataFrame({
+        "銀行名": list(need),
+        "必要年収": [("―" if v != v else f"{int(v // 10000):,} 万円") for v in need.values()],
+        "現在の年収との差": [("―" if v != v else f"{int((v - annual_income) // 10000):+,} 万円") for v in need.values()],
+    })
+    st.dataframe(need_df, use_container_width=True, hide_index=True)
+    st.caption("審査金利・返済比率・完済79歳（審査年数は最長35年）で逆算。10万円単位で切り上げ。")
+
 # ========= テーブル計算（Web/PDF 共通） =========
+# 銀行ごとの条件（配列化して lib/loan_grid.py で一括計算）
+MAX35_BANKS = ["SBI新生銀行", "三菱UFJ銀行"]   # 最長35年
+bank_max_years = [35 if b in MAX35_BANKS else 50 for b in bank_order]
+long_term_add = [0.0 if b in MAX35_BANKS else 0.001 for b in bank_order]  # 36年以上は+0.1% 想定
+plan_add = plan_add_matrix(bank_order, plans_order, rate_diff)
+limit_vec = [limit_amounts[b] for b in bank_order]
+
+def _grid_cells(grid, a, p, t):
+    cells = []
+    for b in range(len(bank_order)):
+        monthly = grid.monthly[a, b, p, t]
+        if np.isnan(monthly):
+            cells.append({"rate": None, "monthly": None, "years": None})
+        else:
+            cells.append({"rate": float(grid.rate[b, p, t]), "monthly": float(monthly),
+                          "years": int(grid.years[b, t])})
+    return cells, set(np.flatnonzero(grid.is_min[a, :, p, t]).tolist())
+
 def make_table_data_and_highlight():
+    base = [float(rates[b]) / 100 for b in bank_order]
+    grid = bank_rate_grid(base, plan_add, bank_max_years, long_term_add,
+                          [years], [principal], limit_vec, 79 - age)
     rows, highlights = [], []
-    for plan in plans_order:
-        row, row_vals = [], []
-        for bank in bank_order:
-            if principal > limit_amounts[bank]:
-                row.append({"rate": None, "monthly": None, "years": None})
-                continue
-            available = (plan == "一般団信" or plan in rate_diff.get(bank, {}))
-            if available:
-                base_rate = float(rates[bank]) / 100
-                add = rate_diff.get(bank, {}).get(plan, 0) / 100
-                calc_years = min(79 - age, years)
-                if bank in ["SBI新生銀行", "三菱UFJ銀行"]:
-                    calc_years = min(calc_years, 35)
-                if bank not in ["SBI新生銀行", "三菱UFJ銀行"] and calc_years > 35:
-                    base_rate += 0.001  # 36年以上は+0.1bp 想定
-                monthly = calc_monthly_payment(principal, base_rate + add, calc_years)
-                row.append({"rate": base_rate + add, "monthly": monthly, "years": calc_years})
-                row_vals.append((len(row)-1, monthly))
-            else:
-                row.append({"rate": None, "monthly": None, "years": None})
-        # 最小返済額ハイライト
-        min_idxs = set()
-        if row_vals:
-            minval = min(v for _, v in row_vals)
-            for col_idx, v in row_vals:
-                if abs(v - minval) < 0.5:
-                    min_idxs.add(col_idx)
+    for p in range(len(plans_order)):
+        row, min_idxs = _grid_cells(grid, 0, p, 0)
         rows.append(row); highlights.append(min_idxs)
 
-    # 最長50年（一般団信の下段）
-    row_50, row_50_vals = [], []
-    for bank in bank_order:
-        if principal > limit_amounts[bank] or bank in ["SBI新生銀行", "三菱UFJ銀行"]:
-            row_50.append({"rate": None, "monthly": None, "years": None})
-        else:
-            base_rate = float(rates[bank]) / 100
-            add = rate_diff.get(bank, {}).get("一般団信", 0) / 100
-            current_bank_max_years = min(79 - age, 50)
-            if current_bank_max_years > 35:
-                base_rate += 0.001
-            monthly_longest = calc_monthly_payment(principal, base_rate + add, current_bank_max_years)
-            row_50.append({"rate": base_rate + add, "monthly": monthly_longest, "years": current_bank_max_years})
-            row_50_vals.append((len(row_50)-1, monthly_longest))
-
-    min_idxs_50 = set()
-    if row_50_vals:
-        minval = min(v for _, v in row_50_vals)
-        for col_idx, v in row_50_vals:
-            if abs(v - minval) < 0.5:
-                min_idxs_50.add(col_idx)
-
+    # 最長50年（一般団信の下段）：最長35年の銀行は対象外
+    grid_50 = bank_rate_grid(base, plan_add, bank_max_years, long_term_add,
+                             [50], [principal], limit_vec, 79 - age, clamp_terms=False)
+    row_50, min_idxs_50 = _grid_cells(grid_50, 0, plans_order.index("一般団信"), 0)
     return rows, highlights, row_50, min_idxs_50
 
 table_rows, highlight_rows, row_50, highlight_50 = make_table_data_and_highlight()
@@ -271,6 +251,142 @@ html_table_output += "</tr></tbody></table>"
 
 st.markdown(html_table_output, unsafe_allow_html=True)
 
+# ========= 住宅ローン控除を反映した実質負担（一般団信）==========
+with st.expander("🏠 住宅ローン控除を反映した実質負担（一般団信）", expanded=False):
+    k1, k2, k3, k4 = st.columns(4)
+    with k1:
+        koujo_move_year = st.selectbox("入居年", list(MOVE_YEARS), index=len(MOVE_YEARS) - 1, key="koujo_move_year")
+    with k2:
+        koujo_perf = st.selectbox("住宅性能区分", list(PERF_CLASSES), index=2, key="koujo_perf")
+    with k3:
+        koujo_new = st.checkbox("新築（買取再販を含む）", value=True, key="koujo_new")
+    with k4:
+        koujo_kosodate = st.checkbox("子育て・若者世帯", value=False, key="koujo_kosodate")
+
+    cells = table_rows[plans_order.index("一般団信")]
+    ok = [i for i, c in enumerate(cells) if c["monthly"] is not None]
+    if ok:
+        terms = deduction_terms(koujo_move_year, koujo_new, koujo_perf, koujo_kosodate)
+        n_years = max(1, int(terms.years))
+        c_rates = np.array([cells[i]["rate"] for i in ok])
+        c_years = np.array([cells[i]["years"] for i in ok], dtype=float)
+        c_monthly = np.array([cells[i]["monthly"] for i in ok])
+        # 全銀行の年末残高（万円）を (銀行, 年) で一括計算し、年収から見積もった税額を上限に控除額を出す
+        year_end = principal / 10000 * remaining_balance_ratio(c_rates, c_years, (np.arange(n_years) + 1) * 12)
+        credit = loan_deduction(year_end, terms.limit, terms.years, annual_income / 10000)
+        credit_total = credit.total.sum(axis=-1)
+        total_paid = c_monthly * c_years * 12 / 10000
+        koujo_df = pd.DataFrame({
+            "銀行": [bank_order[i] for i in ok],
+            "月々返済(円)": c_monthly,
+            "控除額 初年度(万円)": credit.total[:, 0],
+            "控除額 合計(万円)": credit_total,
+            "控除期間中の実質月額(円)": c_monthly - credit_total * 10000 / (n_years * 12),
+            "総返済額(万円)": total_paid,
+            "控除後の総負担(万円)": total_paid - credit_total,
+        })
+        st.dataframe(koujo_df.style.format({c: "{:,.0f}" for c in koujo_df.columns if c != "銀行"}),
+                     use_container_width=True, hide_index=True)
+        st.caption(f"借入限度額 {int(terms.limit):,}万円・控除期間 {int(terms.years)}年。各年末残高 × 0.7% を、"
+                   "年収から見積もった所得税 → 住民税（上限9.75万円）の順に控除した額です（社会保険料は年収の15%で概算）。")
+    else:
+        st.info("借入可能な銀行がありません。")
+
+# ========= グリッド試算（銀行×団信×期間×借入額を一括計算）==========
+st.markdown("---")
+with st.expander("🧮 グリッド試算（借入額 × 返済期間 の最安銀行マップ）", expanded=False):
+    g1, g2, g3 = st.columns(3)
+    with g1:
+        grid_plan = st.selectbox("団信プラン", plans_order, index=0, key="grid_plan")
+        grid_view = st.selectbox("表示する銀行", ["最安銀行"] + bank_order, index=0, key="grid_view")
+    with g2:
+        p_mid = int(round(principal / 10000 / 100)) * 100   # スライダーの刻み（100万円）に合わせる
+        p_lo, p_hi = st.slider("借入額レンジ (万円)", 500, 20000,
+                               (min(max(500, p_mid - 1000), 20000), max(500, min(20000, p_mid + 1000))),
+                               step=100, key="grid_principal")
+        p_step = st.select_slider("借入額の刻み (万円)", [100, 250, 500, 1000], value=500, key="grid_p_step")
+    with g3:
+        t_lo, t_hi = st.slider("返済期間レンジ (年)", 20, 50, (20, 50), key="grid_terms")
+        t_step = st.select_slider("期間の刻み (年)", [1, 5], value=5, key="grid_t_step")
+
+    grid_principals = np.arange(p_lo, p_hi + 1, p_step) * 10000
+    grid_terms = np.arange(t_lo, t_hi + 1, t_step)
+    grid = bank_rate_grid([float(rates[b]) / 100 for b in bank_order], plan_add, bank_max_years,
+                          long_term_add, grid_terms, grid_principals, limit_vec, 79 - age, clamp_terms=False)
+    p_idx = plans_order.index(grid_plan)
+    plan_monthly = grid.monthly[:, :, p_idx, :]                      # (借入額, 銀行, 期間)
+    if grid_view == "最安銀行":
+        best = np.where(np.isnan(plan_monthly), np.inf, plan_monthly).min(axis=1)
+        values = np.where(np.isinf(best), np.nan, best)
+        names = np.array(cheapest_labels(grid, bank_order), dtype=object)[:, p_idx, :]
+    else:
+        b_idx = bank_order.index(grid_view)
+        values = plan_monthly[:, b_idx, :]
+        names = np.where(grid.is_min[:, b_idx, p_idx, :], "★最安", "")
+
+    labels = [["―" if np.isnan(v) else f"¥{v:,.0f} {n}".strip() for v, n in zip(vr, nr)]
+              for vr, nr in zip(values, names)]
+    idx = [f"{int(v // 10000):,}万円" for v in grid_principals]
+    cols = [f"{t}年" for t in grid_terms]
+    shown = pd.DataFrame(labels, index=idx, columns=cols)
+    gmap = pd.DataFrame(values, index=idx, columns=cols)
+    st.dataframe(shown.style.background_gradient(cmap="YlOrRd", axis=None, gmap=gmap), use_container_width=True)
+    st.caption(f"月々返済額（{grid_plan}）。空欄（―）は借入上限超・最長年数超・プラン取扱なし。"
+               f"期間は完済年齢79歳で頭打ち。{grid.monthly.size:,} セルを一括計算。")
+
+# ========= 変動金利リスク（モンテカルロ）==========
+with st.expander("📉 変動金利リスク（モンテカルロ：金利上昇シナリオ）", expanded=False):
+    st.caption("半年ごとの金利見直しをランダムウォークで多数生成し、一般団信・変動金利の返済額のばらつきを試算。"
+               "「125%ルールなし」の銀行は5年ルールも無し（半年ごとに返済額を再計算）として扱います。")
+    m1, m2, m3, m4 = st.columns(4)
+    with m1:
+        mc_drift = st.number_input("金利の上昇トレンド（%/年）", -1.0, 1.0, 0.05, step=0.01, format="%.2f") / 100
+    with m2:
+        mc_vol = st.number_input("金利の変動幅（%/年・標準偏差）", 0.0, 2.0, 0.25, step=0.05, format="%.2f") / 100
+    with m3:
+        mc_paths = st.selectbox("パス数", [1_000, 10_000, 50_000, 100_000], index=1)
+    with m4:
+        mc_parallel = st.checkbox("並列計算（プロセスプール）", value=mc_paths >= 50_000)
+
+    if st.button("▶ シミュレーション実行", key="mc_run"):
+        mc_rows, mc_bands = [], {}
+        for b_idx, bank in enumerate(bank_order):
+            mc_years = int(min(years, 79 - age, bank_max_years[b_idx]))
+            paths = simulate_variable_loan(
+                principal, float(rates[bank]) / 100, mc_years, n_paths=mc_paths,
+                drift=mc_drift, vol=mc_vol, five_year_rule=has_payment_rules(special_notes[bank]),
+                seed=0, n_workers=None if mc_parallel else 1,
+            )
+            summary = risk_summary(paths)
+            mc_rows.append({
+                "銀行": bank,
+                "返済年数": mc_years,
+                "5年/125%ルール": "あり" if has_payment_rules(special_notes[bank]) else "なし",
+                "総利息 中央値(万円)": summary["総利息 P50"] / 10000,
+                "総利息 95%点(万円)": summary["総利息 P95"] / 10000,
+                "最大月返済 中央値(円)": summary["最大月返済 P50"],
+                "最大月返済 95%点(円)": summary["最大月返済 P95"],
+                "最終一括 95%点(万円)": summary["最終一括 P95"] / 10000,
+                "未払利息 発生確率": f"{summary['未払利息 発生確率']:.1%}",
+            })
+            mc_bands[bank] = payment_bands(paths, mc_years)
+        st.session_state["mc_result"] = (pd.DataFrame(mc_rows), mc_bands)
+
+    if "mc_result" in st.session_state:
+        mc_df, mc_bands = st.session_state["mc_result"]
+        st.dataframe(mc_df.round(0), use_container_width=True, hide_index=True)
+        band_bank = st.selectbox("返済額の推移（パーセンタイル帯）", list(mc_bands.keys()), key="mc_band_bank")
+        st.line_chart(mc_bands[band_bank])
+
+with st.expander("⚙️ 計算キャッシュの状況（営業担当用）", expanded=False):
+    st.caption("返済額・返済表・借入上限は（借入額, 金利, 年数, 方式）ごとにサーバー内で共有キャッシュしています。")
+    st.dataframe(
+        pd.DataFrame([{"関数": name.rsplit(".", 1)[-1], "ヒット": s.hits, "ミス": s.misses,
+                       "ヒット率": f"{s.hits / max(s.hits + s.misses, 1):.0%}",
+                       "件数": f"{s.currsize}/{s.maxsize}"} for name, s in memo_stats().items()]),
+        use_container_width=True, hide_index=True,
+    )
+
 # ========= PDF出力：UIテーブルの完全コピー ==========
 def create_pdf_reportlab():
     buffer = io.BytesIO()
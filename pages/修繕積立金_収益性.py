@@ -7,7 +7,7 @@
 #  ③ 「安心な修繕積立金（全体）」＝ ② × S%（初期30%）
 #  ④ 収益性（家賃見込み・利回り）
 # 画面下（PDFには入れない）：
-#  ・長期修繕計画（35年・万円：横テーブル｜収入/支出/期首/期末）
+#  ・長期修繕計画（既定35年・期間は変更可・万円：横テーブル｜収入/支出/期首/期末）
 #  ・最下行に「もし運用（年5%・積立の30%）」行（情報用。残高へは合算しない）
 # 注意：
 #  ・「基金」NG。全て「修繕積立金残高」と表記。
@@ -23,9 +23,17 @@ import zipfile
 import requests
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+from lib.repair_plan import (
+    IS_MECH, PRIVATE_RATIO_BUILDING, cost_in_year, item_labels, repair_plan,
+    next_major_year as predict_next_major_year,
+)
+from lib.repair_fund import MECH_PARK_UNIT_YEN, evaluate_file, judge_price, mech_add_psqm, mlit_benchmark
+from lib.table_view import NUMBER_FORMAT, man_table, page_label, year_pages
+
 # ===== PDF（日本語フォント） =====
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
@@ -34,62 +42,6 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab import rl_config
 
-# =====================
-# 内部固定パラメータ
-# =====================
-INFL = 0.03   # インフレ率（年3%・複利）
-OH   = 0.10   # 諸経費（工事費小計の10%）
-TAX  = 0.10   # 消費税（小計+諸経費の10%）
-PRIVATE_RATIO_BUILDING = 0.75  # 延床→総専有（代表値）
-FACADE_COEF   = 1.25
-STEEL_RATIO   = 0.10
-
-def floor_factor_by_floors(f:int)->float:
-    if f <= 5:   return 1.00
-    if f <= 10:  return 1.10
-    if f <= 20:  return 1.25
-    return 1.40
-
-# ==========
-# 工事項目マスター（省略なし）
-# ※㎡按分の単価を「×10」補正（桁不足解消）
-# 単価タイプ：'sqm'（㎡按分）/'per_unit'（戸数×単価）/'ev'（EV台数×単価）/'per_slot'（機械式区画×単価）/'lump'（一式）
-# ==========
-ITEMS = [
-    # 建築（12年）
-    ("建築", "外壁塗装・タイル補修・シーリング", 12, "sqm",      60_000),  # 6,000 → 60,000
-    ("建築", "屋上・バルコニー・庇 防水改修",     12, "sqm",      28_000),  # 2,800 → 28,000
-    ("建築", "鉄部塗装（手すり・階段・フェンス等）", 12, "sqm",  10_000),  # 1,000 → 10,000
-    ("建築", "外構・舗装・植栽 等",               12, "sqm",       8_000),  #   800 → 8,000
-    ("仮設", "足場仮設（外装工事年）",            12, "sqm",      20_000),  # 2,000 → 20,000
-
-    # 設備（代表単価は据置。EV本体や更生系は元々スケール大）
-    ("設備", "給水設備（ポンプ・受水槽等）更新",   12, "sqm",      12_000),  # 1,200 → 12,000（設備も×10）
-    ("設備", "給排水管 更生/更新（㎡按分）",      24, "sqm",      44_000),  # 4,400 → 44,000
-    ("設備", "分電盤・配電盤・受変電設備 更新",    24, "sqm",      15_000),  # 1,500 → 15,000
-    ("設備", "インターホン更新（モニター化）",     20, "per_unit", 70_000),
-    ("設備", "エレベーター更新（本体）",          25, "ev",   20_000_000),
-
-    # 機械式（ある場合のみ反映）
-    ("機械式", "機械式駐車設備 更新（部分）",      12, "per_slot", 1_500_000),
-    ("機械式", "機械式駐車設備 更新（全面）",      20, "per_slot", 3_000_000),
-
-    # 毎年（定期保守・点検）
-    ("毎年", "エレベーター保守点検（毎年）",        1, "ev",   1_200_000),
-    ("毎年", "消防設備点検（毎年）",                1, "lump",    300_000),
-    ("毎年", "雑修繕・軽微補修（毎年）",            1, "lump",    500_000),
-]
-
-# 機械式の月額（妥当性の円/㎡・月に加算する用）
-MECH_PARK_UNIT_YEN = {
-    "2段（ピット1段）昇降式":      6_450,
-    "2段（ピット2段）昇降式":      5_840,
-    "3段（ピット1段）昇降横行式":  7_210,
-    "4段（ピット2段）昇降横行式":  6_235,
-    "エレベーター式・垂直循環式":   4_645,
-    "その他":                       5_235,
-}
-
 # ==========
 # ユーティリティ
 # ==========
@@ -117,56 +69,6 @@ def int_fmt(n)->str:
     except:
         return "0"
 
-def inflated(base_yen: float, years_from_start: int) -> int:
-    return int(round(base_yen * ((1.0 + INFL) ** max(0, years_from_start))))
-
-def schedule_years(built_year:int, cycle:int, start_year:int, end_year:int):
-    years = []
-    if cycle <= 0:
-        return [y for y in range(start_year, end_year+1)]
-    y = built_year + cycle
-    while y <= end_year + cycle*2:
-        if start_year <= y <= end_year:
-            years.append(y)
-        y += cycle
-    return years
-
-def area_for_item(cat:str, name:str, per_floor_area:float, facade_area_est:float,
-                  roof_area_est:float, steel_area_est:float, floor_factor:float,
-                  total_floor_area:float) -> float:
-    if "外壁塗装" in name:               return facade_area_est * floor_factor
-    if "防水" in name:                   return roof_area_est * floor_factor
-    if "鉄部塗装" in name:               return steel_area_est * floor_factor
-    if "外構・舗装・植栽" in name:        return per_floor_area * 0.5
-    if "足場仮設" in name:               return facade_area_est * floor_factor
-    return total_floor_area  # 設備系は㎡按分
-
-def predict_next_major_year(built_year:int, cycle:int=12)->int:
-    if built_year <= 0: return 0
-    this = dt.date.today().year
-    y = built_year
-    while y <= this:
-        y += cycle
-    return y
-
-def mlit_benchmark(floors:int, total_floor_area:float):
-    # R6.6.7改定相当の代表帯（機械式加算は別処理）
-    if floors >= 20:
-        return {"avg": 338, "low": 240, "high": 410, "label": "20階以上"}
-    if total_floor_area < 5_000:
-        return {"avg": 335, "low": 235, "high": 430, "label": "20階未満・延床<5,000㎡"}
-    if total_floor_area < 10_000:
-        return {"avg": 252, "low": 170, "high": 320, "label": "20階未満・延床5,000〜10,000㎡"}
-    if total_floor_area < 20_000:
-        return {"avg": 271, "low": 200, "high": 330, "label": "20階未満・延床10,000〜20,000㎡"}
-    return {"avg": 255, "low": 190, "high": 325, "label": "20階未満・延床20,000㎡以上"}
-
-def mech_add_psqm(unit_type:str, slots:int, total_private_area:float)->int:
-    if total_private_area <= 0 or slots <= 0:
-        return 0
-    per = MECH_PARK_UNIT_YEN.get(unit_type, 0)
-    return int(round(per * slots / total_private_area))
-
 # ==========
 # 画面
 # ==========
@@ -206,10 +108,11 @@ with st.sidebar:
     current_balance_total = st.number_input("現在の修繕積立金残高（全体・円）", min_value=0, value=0, step=100_000)
     invest_share_pct      = st.number_input("（長期表）運用に回す割合（積立の％）", min_value=0, max_value=100, value=30, step=5)
     invest_rate_pct       = st.number_input("（長期表）運用利回り（年％・複利）", min_value=0, max_value=20, value=5, step=1)
+    horizon_years         = st.number_input("（長期表）計画期間（年）", min_value=12, max_value=100, value=35, step=1)
 
 # 年レンジ（横展開）
 start_year = dt.date.today().year
-horizon    = 35
+horizon    = int(horizon_years)
 end_year   = start_year + horizon - 1
 years      = list(range(start_year, end_year + 1))
 
@@ -230,135 +133,41 @@ annual_income_now = monthly_total_now * 12  # 円
 
 # ========== ① 妥当性（国交省＋機械式加算） ==========
 g = mlit_benchmark(int(floors) if floors else 0, float(total_floor_area) if total_floor_area else 0)
-mech_add = mech_add_psqm(mech_park_type, int(mech_park_slots), float(total_private_area)) if total_private_area>0 else 0
+mech_add = int(mech_add_psqm(mech_park_type, int(mech_park_slots), float(total_private_area))) if total_private_area>0 else 0
 low, avg, high = g["low"]+mech_add, g["avg"]+mech_add, g["high"]+mech_add
 
-def judge_price(psqm:int, low:int, high:int):
-    if psqm == 0: return "未入力"
-    if psqm < low: return "安い"
-    if psqm > high: return "高い"
-    return "妥当"
-
 judge_now = judge_price(current_psqm, low, high)
 
 # ========== （仮）長期修繕計画（横テーブル：内部は円で保持） ==========
-per_floor_area  = total_floor_area / max(1, floors) if floors else 0
-facade_area_est = per_floor_area * FACADE_COEF
-roof_area_est   = per_floor_area
-steel_area_est  = facade_area_est * STEEL_RATIO
-floor_factor    = floor_factor_by_floors(int(floors)) if floors else 1.0
-
-def add_row(row_index, data, cat, name, cycle, utype, unit_cost):
-    row_index.append((cat, name, f"{cycle}年" if cycle>1 else "毎年"))
-    scheduled = set(schedule_years(int(built_year), int(cycle), start_year, end_year)) if built_year else set()
-    for y in years:
-        put = (cycle == 1 and built_year>0) or (y in scheduled and total_floor_area>0)
-        if put:
-            t = y - start_year
-            if utype == "sqm":
-                base = unit_cost * area_for_item(cat, name, per_floor_area, facade_area_est, roof_area_est,
-                                                 steel_area_est, floor_factor, total_floor_area)
-            elif utype == "per_unit":
-                base = unit_cost * units
-            elif utype == "ev":
-                base = unit_cost * ev_count
-            elif utype == "per_slot":
-                base = unit_cost * mech_park_slots
-            else:
-                base = unit_cost
-            amt_yen = inflated(base, t)      # 円
-            data[y].append(int(amt_yen))     # 円のまま保持
-        else:
-            data[y].append(0)                # 円（0）
-
-row_index = []
-data = {y: [] for y in years}
-
-for cat, name, cy, utype, unit in ITEMS:
-    if "機械式" in cat and mech_park_slots <= 0:
-        continue
-    add_row(row_index, data, cat, name, cy, utype, unit)
-
-# 支出集計（内部は円で保持）
-row_index.append(("支出集計", "工事費小計", ""))
-for y in years:
-    subtotal_yen = 0
-    for i, (c, n, cyc) in enumerate(row_index[:-1]):
-        if c == "支出集計":
-            continue
-        val = data[y][i]
-        if isinstance(val, int) and val > 0:
-            subtotal_yen += val
-    data[y].append(int(subtotal_yen))  # 円
-
-row_index.append(("支出集計", "諸経費（10%）", ""))
-for y in years:
-    sub_yen = int(data[y][-1])
-    data[y].append(int(round(sub_yen * OH)))  # 円
-
-row_index.append(("支出集計", "消費税（10%）", ""))
-for y in years:
-    sub_yen = int(data[y][-2])
-    oh_yen  = int(data[y][-1])
-    tax_yen = int(round((sub_yen + oh_yen) * TAX))
-    data[y].append(int(tax_yen))  # 円
-
-row_index.append(("支出集計", "A.支出合計", ""))
-for y in years:
-    sub_yen = int(data[y][-3])
-    oh_yen  = int(data[y][-2])
-    tax_yen = int(data[y][-1])
-    total_yen = sub_yen + oh_yen + tax_yen
-    data[y].append(int(total_yen))  # 円
-
-# 収入・残高（現行のまま徴収した場合）— 年額は一定（増やさない）
-row_index.append(("収入・残高", "期首残高", ""))
-row_index.append(("収入・残高", "修繕積立金収入（年額）", ""))
-row_index.append(("収入・残高", "当期収入合計", ""))
-row_index.append(("収入・残高", "当期収支（収入合計－A）", ""))
-row_index.append(("収入・残高", "期末残高", ""))
-
-for yi, y in enumerate(years):
-    beg = int(current_balance_total) if yi == 0 else int(data[years[yi-1]][-1])
-    income = int(annual_income_now)
-    income_total = beg + income
-    a_yen = int(data[y][-3])
-    net = income_total - a_yen
-    end_bal = net
-    data[y].extend([beg, income, income_total, net, end_bal])  # すべて円（int）
-
-# もし運用（年X%・積立のY%）…情報行（残高へは合算しない）
-row_index.append(("参考", f"もし運用（年{invest_rate_pct}%・積立の{invest_share_pct}%）", ""))
-invest_share = max(0, min(100, int(invest_share_pct))) / 100.0
-invest_rate  = max(0, int(invest_rate_pct)) / 100.0
-sim_val = 0  # 円
-for yi, y in enumerate(years):
-    invest_add = int(round(annual_income_now * invest_share))
-    sim_val = int(round((sim_val * (1 + invest_rate)) + invest_add))
-    data[y].append(sim_val)  # 円（情報表示用）
-
-# 横テーブル：内部は円 → 表示時だけ万円文字列に変換
-idx = pd.MultiIndex.from_tuples(row_index, names=["区分","項目","周期"])
-df_yen = pd.DataFrame({y: data[y] for y in years}, index=idx)  # 円（int）
-
-def yen_to_man_str(v):
-    try:
-        v_int = int(v)
-        return fmt_man(v_int) if v_int > 0 else ""
-    except:
-        return ""
+# 工事項目 × 年 の行列で一括計算（lib.repair_plan）
+plan = repair_plan(
+    total_floor_area, floors, units, ev_count, mech_park_slots, built_year, start_year, horizon,
+    annual_income=annual_income_now, current_balance=current_balance_total,
+    invest_share=max(0, min(100, int(invest_share_pct))) / 100.0,
+    invest_rate=max(0, int(invest_rate_pct)) / 100.0,
+)
+show_items = ~IS_MECH if mech_park_slots <= 0 else np.ones(len(IS_MECH), dtype=bool)
+row_index = item_labels(include_mech=mech_park_slots > 0) + [
+    ("支出集計", "工事費小計", ""),
+    ("支出集計", "諸経費（10%）", ""),
+    ("支出集計", "消費税（10%）", ""),
+    ("支出集計", "A.支出合計", ""),
+    ("収入・残高", "期首残高", ""),
+    ("収入・残高", "修繕積立金収入（年額）", ""),
+    ("収入・残高", "当期収入合計", ""),
+    ("収入・残高", "当期収支（収入合計－A）", ""),
+    ("収入・残高", "期末残高", ""),
+    ("参考", f"もし運用（年{invest_rate_pct}%・積立の{invest_share_pct}%）", ""),
+]
+matrix = np.vstack([plan.costs[show_items], plan.subtotal, plan.overhead, plan.tax, plan.total,
+                    plan.balance_begin, plan.income, plan.income_total, plan.net, plan.balance_end, plan.invest])
 
-df_man = df_yen.applymap(yen_to_man_str)  # 表示用（万円）
+# 横テーブル：内部は円 → 表示用は万円の数値（0 以下は空欄、桁区切りは表示側の書式で付ける）
+df_man = man_table(matrix, row_index, [str(y) for y in years], names=["区分","項目","周期"])
 
 # ========== ② 次回大規模の予想額（円） ==========
-next_major_year = predict_next_major_year(int(built_year), 12) if built_year else 0
-next_major_cost_yen = 0
-if next_major_year and (start_year <= next_major_year <= end_year):
-    try:
-        a_val = df_yen.loc[("支出集計","A.支出合計",""), next_major_year]  # 円（int）
-        next_major_cost_yen = int(a_val) if a_val else 0
-    except Exception:
-        next_major_cost_yen = 0
+next_major_year = int(predict_next_major_year(int(built_year), start_year)) if built_year else 0
+next_major_cost_yen = int(cost_in_year(plan, next_major_year)) if next_major_year else 0
 
 # ③ 安心ライン（円）＝② × S%
 safe_ratio = max(0, safe_ratio_pct) / 100.0
@@ -391,7 +200,59 @@ with c4:
 st.divider()
 st.subheader(f"（仮）長期修繕計画：横テーブル（{start_year}〜{end_year}・単位：万円）")
 st.caption("※ 本表は“仮”。一般的に予想しうる工事項目・周期の概算を年3%複利で表示。PDFには含めません。")
-st.dataframe(df_man, use_container_width=True)
+year_slices = year_pages(len(years))
+if len(year_slices) > 1:
+    page_opts = ["すべて"] + [page_label(years, sl) for sl in year_slices]
+    page_sel = st.radio("表示する年", page_opts, horizontal=True, key="plan_page")
+    shown_plan = df_man if page_sel == "すべて" else df_man.iloc[:, year_slices[page_opts.index(page_sel) - 1]]
+else:
+    shown_plan = df_man
+st.dataframe(shown_plan, use_container_width=True,
+             column_config={c: st.column_config.NumberColumn(format=NUMBER_FORMAT) for c in shown_plan.columns})
+
+# ========== 一括評価（CSV / Parquet：多数の建物） ==========
+st.divider()
+with st.expander("📦 一括評価（CSV / Parquet：物件一覧の修繕積立金をまとめて判定）", expanded=False):
+    st.caption("列：階数, 延床面積, 築年（必須）／戸数, EV台数, 機械式区画数, 現状円㎡, 機械式形式, 専有面積, "
+               "周辺家賃円㎡, 価格万円（任意。ない列はサイドバーの値を使用）。英語の列名（floors など）も可。")
+    bulk_file = st.file_uploader("建物一覧ファイル", type=["csv", "parquet"], key="bulk_file")
+    bulk_chunk = st.select_slider("1回に読む行数", [10_000, 50_000, 100_000], value=50_000, key="bulk_chunk")
+    if bulk_file is not None and st.button("▶ 一括評価を実行", key="bulk_run"):
+        kind = "parquet" if bulk_file.name.lower().endswith(".parquet") else "csv"
+        defaults = {"機械式形式": mech_park_type, "専有面積": my_private_area,
+                    "周辺家賃円㎡": rent_psqm, "価格万円": price_million}
+        parts, status = [], st.empty()
+        try:
+            for part in evaluate_file(bulk_file, start_year, kind, bulk_chunk, safe_ratio_pct / 100.0, defaults):
+                parts.append(part)
+                status.caption(f"{sum(len(x) for x in parts):,} 件を評価しました…")
+            st.session_state["bulk_result"] = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+        except (ValueError, ImportError) as e:
+            st.error(str(e))
+
+    bulk = st.session_state.get("bulk_result")
+    if bulk is not None and len(bulk):
+        counts = bulk["判定"].value_counts()
+        st.write("　".join(f"{k}：{int(counts.get(k, 0)):,}件" for k in ("安い", "妥当", "高い", "未入力")))
+        b1, b2 = st.columns(2)
+        with b1:
+            sort_col = st.selectbox("並べ替え", ["基準平均との差", "次回大規模予想額", "表面利回り", "築年"], key="bulk_sort")
+        with b2:
+            sort_asc = st.checkbox("昇順", value=True, key="bulk_asc")
+        shown = bulk.sort_values(sort_col, ascending=sort_asc, na_position="last")
+        st.dataframe(shown, use_container_width=True, hide_index=True)
+        d1, d2 = st.columns(2)
+        with d1:
+            st.download_button("📥 CSVでダウンロード", data=shown.to_csv(index=False).encode("utf-8-sig"),
+                               file_name="修繕積立金_一括評価.csv", mime="text/csv")
+        with d2:
+            try:
+                pq_buf = io.BytesIO()
+                shown.to_parquet(pq_buf, index=False)
+                st.download_button("📥 Parquetでダウンロード", data=pq_buf.getvalue(),
+                                   file_name="修繕積立金_一括評価.parquet", mime="application/octet-stream")
+            except ImportError:
+                st.caption("Parquet の出力には pyarrow が必要です。")
 
 # ========== フォント：IPAex（無ければ自動DL→登録） ==========
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
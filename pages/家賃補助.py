@@ -1,5 +1,12 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+
+from lib.charts import set_matplotlib_japanese_font
+from lib.rent_subsidy import asset_at, portfolio_splits, simulate, sweep
+
+set_matplotlib_japanese_font()
 
 st.title("🏠 家賃補助シミュレーション")
 
@@ -50,45 +57,16 @@ st.dataframe(df_rent.style.set_properties(**{"font-size": "12px"}), hide_index=T
 # -------------------------
 # 資産シミュレーション計算
 # -------------------------
-years = age_end - age_start
-rows = []
-saving = 0
-investing = 0
-
-for i in range(years + 1):
-    age = age_start + i
-
-    # 家賃決定
-    rent_now = 0
-    for s, e, r in rent_settings:
-        if s <= age <= e:
-            rent_now = r
-            break
-
-    # 家賃補助がある間は積立
-    if age < support_end_age:
-        saving += save * 12
-        investing = investing * (1 + rate) + invest * 12
-    else:
-        total_expense = rent_now * 12
-        if total_expense <= saving:
-            saving -= total_expense
-        else:
-            shortfall = total_expense - saving
-            saving = 0
-            investing = max(0, investing - shortfall)
-
-    total_asset = saving + investing
-    rows.append([age, rent_now, round(saving), round(investing), round(total_asset)])
-
-asset_65 = next((row[4] for row in rows if row[0] == 65), 0)
+# 家賃は区分の区間表から一括で引き、積立・取り崩しは配列演算（lib.rent_subsidy）
+res = simulate(age_start, support_end_age, save, invest, rate, rent_settings, age_end)
+asset_65 = int(asset_at(res, 65))
 
 st.markdown(f"### 💰 65歳時点の資産額（貯蓄＋運用分） ⇒ **{asset_65:,} 万円**")
 
-df_assets = pd.DataFrame(
-    rows,
-    columns=["年齢", "家賃 (万円)", "貯蓄 (万円)", "運用 (万円)", "総資産 (万円)"]
-)
+df_assets = pd.DataFrame({
+    "年齢": res.ages, "家賃 (万円)": res.rent, "貯蓄 (万円)": np.round(res.saving),
+    "運用 (万円)": np.round(res.investing), "総資産 (万円)": np.round(res.total),
+})
 
 st.dataframe(
     df_assets.style.format({
@@ -102,6 +80,48 @@ st.dataframe(
     height=400
 )
 
+# -------------------------
+# 補助終了年齢 × ポートフォリオ配分 スイープ
+# -------------------------
+with st.expander("🗺 補助終了年齢 × 配分（浪費/貯蓄/運用）の一括比較（ヒートマップ）", expanded=False):
+    subsidy_total = waste + save + invest
+    st.caption(f"毎月の家賃補助 {subsidy_total} 万円を 浪費・貯蓄・運用 に分ける全通りと、補助終了年齢の全組み合わせを一括計算します。"
+               "家賃区分・運用利回りは上の入力を使います。")
+    w1, w2 = st.columns(2)
+    with w1:
+        sw_end = st.slider("補助終了年齢の範囲", 40, 70, (40, 70))
+    with w2:
+        sw_step = st.select_slider("配分の刻み（万円）", [1, 2, 5], value=1 if subsidy_total <= 20 else 2)
+    if subsidy_total <= 0:
+        st.info("家賃補助のポートフォリオ（浪費・貯蓄・運用）を入力してください。")
+    else:
+        sw_ages = np.arange(sw_end[0], sw_end[1] + 1)
+        splits = portfolio_splits(subsidy_total, sw_step)
+        sw = sweep(age_start, sw_ages, splits, rate, rent_settings, age_end)
+        st.caption(f"{sw.asset_65.size:,} 通りを計算しました。")
+        split_labels = [f"{w}/{s}/{v}" for w, s, v in splits]
+        fig_sw, axes = plt.subplots(3, 1, figsize=(14, 13))
+        panels = [
+            (sw.asset_65, "65歳時点の総資産（万円）", "viridis"),
+            (sw.asset_90, "90歳時点の総資産（万円）", "viridis"),
+            (sw.depleted_age, "資産が尽きる年齢（空白＝90歳まで尽きない）", "magma"),
+        ]
+        for ax, (grid, title, cmap) in zip(axes, panels):
+            im = ax.imshow(grid, origin="lower", aspect="auto", cmap=cmap,
+                           extent=[-0.5, len(splits) - 0.5, sw_ages[0] - 0.5, sw_ages[-1] + 0.5])
+            ax.set_title(title)
+            ax.set_ylabel("補助終了年齢")
+            ax.set_xticks(range(len(splits)))
+            ax.set_xticklabels(split_labels, rotation=90, fontsize=6)
+            fig_sw.colorbar(im, ax=ax)
+        axes[-1].set_xlabel("配分（浪費/貯蓄/運用・万円/月）")
+        fig_sw.tight_layout()
+        st.pyplot(fig_sw)
+        best = np.unravel_index(np.argmax(sw.asset_90), sw.asset_90.shape)
+        w, s_, v = splits[best[1]]
+        st.caption(f"90歳時点の資産が最大：補助終了 {sw_ages[best[0]]}歳・浪費 {w}／貯蓄 {s_}／運用 {v} 万円 "
+                   f"⇒ {int(sw.asset_90[best]):,} 万円")
+
 # -------------------------
 # 老後生活費の目安
 # -------------------------
@@ -1,8 +1,14 @@
 # pages/housing_allowance.py
 from typing import Literal, Dict, List
+import numpy as np
 import pandas as pd
+import matplotlib.pyplot as plt
 import streamlit as st
 
+from lib import amortization, valuation
+from lib.valuation import LIFE_MAP
+from lib.charts import set_matplotlib_japanese_font
+
 # ========= ユーティリティ =========
 def man_to_yen(v_man: float) -> float:
     return float(v_man) * 10_000.0
@@ -14,11 +20,7 @@ def man(n_yen: float, digits: int = 1) -> str:
     return f"{yen_to_man(n_yen):,.{digits}f}万円"
 
 def annuity_payment_monthly(principal: float, annual_rate: float, years: int) -> float:
-    m = years * 12
-    if m <= 0: return 0.0
-    r = annual_rate / 12.0
-    if r == 0: return principal / m
-    return principal * r / (1 - (1 + r) ** (-m))
+    return float(amortization.monthly_payment(principal, annual_rate, years))
 
 def amortization_schedule_annual(
     principal: float,
@@ -26,73 +28,21 @@ def amortization_schedule_annual(
     years: int,
     method: Literal["元利均等", "元金均等"] = "元利均等",
 ) -> pd.DataFrame:
-    rows = []
-    bal = principal
-    years = max(1, years)
-    cum_pr = 0.0
-    if method == "元利均等":
-        # 年払いの近似（表示用）。残債は月ベースで別計算。
-        if annual_rate == 0:
-            pmt = principal / years
-        else:
-            r, n = annual_rate, years
-            pmt = principal * r / (1 - (1 + r) ** (-n))
-        for y in range(1, years + 1):
-            interest = bal * annual_rate
-            pr = min(pmt - interest, bal)
-            pay = pr + interest
-            bal = max(0.0, bal - pr)
-            cum_pr += pr
-            rows.append([y, pay, interest, pr, cum_pr, bal])
-    else:
-        pr_const = principal / years
-        for y in range(1, years + 1):
-            interest = bal * annual_rate
-            pr = min(pr_const, bal)
-            pay = pr + interest
-            bal = max(0.0, bal - pr)
-            cum_pr += pr
-            rows.append([y, pay, interest, pr, cum_pr, bal])
-    return pd.DataFrame(rows, columns=["年", "返済額", "利息", "元金", "資産累計", "期末残債"])
-
-def remaining_balance_monthly(principal: float, annual_rate: float, years_total: int, years_elapsed: int,
-                              method: Literal["元利均等", "元金均等"]) -> float:
-    months_total = years_total * 12
-    months_elapsed = min(years_elapsed * 12, months_total)
-    r = annual_rate / 12.0
-    bal = principal
-    if method == "元利均等":
-        pmt = annuity_payment_monthly(principal, annual_rate, years_total)
-        for _ in range(months_elapsed):
-            interest = bal * r
-            pr = min(pmt - interest, bal)
-            bal = max(0.0, bal - pr)
-        return bal
-    else:
-        pr_m = principal / months_total
-        for _ in range(months_elapsed):
-            bal = max(0.0, bal - pr_m)
-        return bal
+    # 月次返済表を年単位に集計（残債も同じ月次表から取るので表示と一致する）
+    sched = amortization.amortization_schedule(principal, annual_rate, max(1, years), method)
+    return amortization.annual_schedule(sched)
 
-# ========= 減価償却（定額法） =========
-LIFE_MAP: Dict[str, int] = {
-    "木造（住宅・耐用22年）": 22,
-    "S造（耐用34年）":        34,
-    "RC造（耐用47年）":       47,
-}
+def remaining_balance_monthly(principal: float, annual_rate: float, years_total: int, years_elapsed,
+                              method: Literal["元利均等", "元金均等"]):
+    # 閉形式（O(1)）。years_elapsed に配列を渡すと全売却年の残債を一括で返す
+    return amortization.remaining_balance(principal, annual_rate, years_total,
+                                          np.asarray(years_elapsed) * 12, method)
 
+# ========= 減価償却（定額法） =========
 def building_book_value_straight(building_price: float, structure: str,
-                                 years_elapsed: int, built_age_at_purchase: int = 0) -> float:
-    life_total = LIFE_MAP[structure]
-    life_rem = max(1, life_total - max(0, built_age_at_purchase))  # 残存耐用年数（簡易）
-    used = min(years_elapsed, life_rem)
-    factor = max(0.0, 1.0 - used / life_rem)
-    return building_price * factor
-
-def remaining_book_straight(add_cost_yen: float, life_years: int, years_elapsed_since_add: int) -> float:
-    used = min(years_elapsed_since_add, life_years)
-    factor = max(0.0, 1.0 - used / life_years)
-    return add_cost_yen * factor
+                                 years_elapsed, built_age_at_purchase: int = 0):
+    # years_elapsed は配列可（売却年スイープ用）。中古は残存耐用年数で償却（lib.valuation のテーブル参照）
+    return valuation.book_value(building_price, structure, years_elapsed, built_age_at_purchase)
 
 # ========= 社宅の概算税率（参考） =========
 def estimated_combined_tax_rate(income_yen: float) -> float:
@@ -107,6 +57,7 @@ def estimated_combined_tax_rate(income_yen: float) -> float:
 
 # ========= 画面 =========
 st.set_page_config(page_title="社宅 vs 購入", layout="wide")
+set_matplotlib_japanese_font()
 st.title("🏠 社宅 vs 不動産購入 シミュレーター")
 
 with st.expander("使い方 / 前提", expanded=False):
@@ -120,7 +71,13 @@ with st.expander("使い方 / 前提", expanded=False):
 
 # ===== 売却タイミング =====
 st.subheader("⏱ 売却タイミング")
-years_until_sale = st.number_input("売却までの年数", min_value=1, max_value=100, value=20, step=1)
+t1, t2 = st.columns(2)
+with t1:
+    years_until_sale = st.number_input("売却までの年数", min_value=1, max_value=100, value=20, step=1)
+with t2:
+    sweep_mode = st.checkbox("売却年スイープ（全売却年を一括比較）", value=False)
+    sweep_max = st.number_input("スイープ上限（年）", min_value=2, max_value=100, value=50, step=1,
+                                disabled=not sweep_mode)
 
 st.markdown("---")
 
@@ -216,68 +173,102 @@ land_price     = man_to_yen(land_price_man)
 building_price = man_to_yen(building_price_man)
 loan_principal = man_to_yen(loan_principal_man)
 
-# 建物簿価（中古は残存年数償却）
-building_book_base = building_book_value_straight(building_price, structure, years_until_sale, built_age_at_purchase=built_age)
-
-# リフォーム簿価＋プレミアム
-ren_book_total = 0.0
-ren_total_spend = 0.0
-ren_premium_total = 0.0
-if ren_enable and ren_rows:
-    base_life = LIFE_MAP[structure]
-    for r in ren_rows:
-        if r["year"] > years_until_sale:
-            continue  # 売却後は未実施として無視
-        years_since = max(0, years_until_sale - r["year"])
-        life_used = base_life if r["mode"] == "法定年数で新規スタート" else max(1, base_life - r["year"])
-        rem_book = remaining_book_straight(r["cost_yen"], life_used, years_since)  # 簿価ベース
-        ren_book_total += rem_book
-        ren_total_spend += r["cost_yen"]
-        ren_premium_total += rem_book * r["prem"]  # 市場プレミアム（簿価に対する上乗せ）
-
-# 建物：簿価と“市場価値”
-building_book_total   = building_book_base + ren_book_total
-building_market_value = building_book_total + ren_premium_total  # ←上乗せ分
-
-# 土地将来価格
-land_future = land_price * ((1 + land_growth) ** years_until_sale)
-land_appreciation = land_future - land_price
-
-# 残債（月ベース）
-am_df = amortization_schedule_annual(loan_principal, loan_rate, loan_years, method=repay_method)
-loan_balance = remaining_balance_monthly(loan_principal, loan_rate, loan_years, years_until_sale, repay_method)
+# ===== 売却年ごとの計算（売却年は配列可：スイープでも同じ式を1回で評価） =====
+def sale_outcome(sale_years) -> Dict[str, np.ndarray]:
+    t = np.asarray(sale_years, dtype=float)
+
+    # 建物簿価（中古は残存年数償却）
+    building_book_base = building_book_value_straight(building_price, structure, t, built_age_at_purchase=built_age)
+
+    # リフォーム簿価＋プレミアム
+    ren_book_total = np.zeros_like(t)
+    ren_total_spend = np.zeros_like(t)
+    ren_premium_total = np.zeros_like(t)
+    if ren_enable and ren_rows:
+        base_life = LIFE_MAP[structure]
+        for r in ren_rows:
+            done = r["year"] <= t  # 売却後は未実施として無視
+            life_used = base_life if r["mode"] == "法定年数で新規スタート" else max(1, base_life - r["year"])
+            event = valuation.RenovationEvent(r["year"], r["cost_yen"], 1.0, life_used)
+            rem_book = valuation.renovation_uplift(t, [event])  # 簿価ベース
+            ren_book_total += rem_book
+            ren_total_spend += np.where(done, r["cost_yen"], 0.0)
+            ren_premium_total += rem_book * r["prem"]  # 市場プレミアム（簿価に対する上乗せ）
+
+    # 建物：簿価と“市場価値”
+    building_book_total   = building_book_base + ren_book_total
+    building_market_value = building_book_total + ren_premium_total  # ←上乗せ分
+
+    # 土地将来価格
+    land_future = land_price * ((1 + land_growth) ** t)
+
+    # 残債（月ベース・閉形式）
+    loan_balance = remaining_balance_monthly(loan_principal, loan_rate, loan_years, t, repay_method)
+
+    # 売却価格（市場価値を採用）
+    sale_price = land_future + building_market_value
+
+    # 仲介手数料（3% + 6万 + 消費税）
+    commission = (sale_price * 0.03 + 60_000) * (1 + vat_comm)
+
+    # 取得費（税務は簿価ベースのみ）
+    acquisition_cost = land_price + building_book_total
+
+    # 譲渡所得
+    gain_base = sale_price - commission - acquisition_cost
+    deduction = 30_000_000 if apply_30m else 0
+    taxable_gain = np.maximum(0.0, gain_base - deduction)
+    capital_gains_tax = taxable_gain * tax_rate_cg
+
+    # 手残り
+    net_proceeds = sale_price - commission - capital_gains_tax - loan_balance
+
+    return {
+        "building_book_base": building_book_base,
+        "ren_book_total": ren_book_total,
+        "ren_total_spend": ren_total_spend,
+        "ren_premium_total": ren_premium_total,
+        "building_book_total": building_book_total,
+        "land_future": land_future,
+        "land_appreciation": land_future - land_price,
+        "loan_balance": loan_balance,
+        "sale_price": sale_price,
+        "commission": commission,
+        "acquisition_cost": acquisition_cost,
+        "gain_base": gain_base,
+        "taxable_gain": taxable_gain,
+        "capital_gains_tax": capital_gains_tax,
+        "net_proceeds": net_proceeds,
+        "cumulative_equity": loan_principal - loan_balance,  # 累計資産（元金累計）
+        "shataku_total": annual_saving * t,                   # 社宅の累計メリット
+    }
+
+res = {k: float(v) for k, v in sale_outcome(years_until_sale).items()}
+building_book_base = res["building_book_base"]
+ren_book_total     = res["ren_book_total"]
+ren_total_spend    = res["ren_total_spend"]
+ren_premium_total  = res["ren_premium_total"]
+building_book_total = res["building_book_total"]
+land_future        = res["land_future"]
+land_appreciation  = res["land_appreciation"]
+loan_balance       = res["loan_balance"]
+sale_price         = res["sale_price"]
+commission         = res["commission"]
+acquisition_cost   = res["acquisition_cost"]
+gain_base          = res["gain_base"]
+taxable_gain       = res["taxable_gain"]
+capital_gains_tax  = res["capital_gains_tax"]
+net_proceeds       = res["net_proceeds"]
+cumulative_equity  = res["cumulative_equity"]
 
 # 月々返済
 if repay_method == "元利均等":
     monthly_payment = annuity_payment_monthly(loan_principal, loan_rate, loan_years)
     monthly_payment_label = f"{man(monthly_payment, 1)} / 月"
 else:
-    r_m = loan_rate / 12.0
-    pr_m = loan_principal / (loan_years * 12)
-    first_month = pr_m + loan_principal * r_m
+    first_month = float(amortization.amortization_schedule(loan_principal, loan_rate, loan_years, "元金均等").payment[0])
     monthly_payment_label = f"{man(first_month, 1)} / 月（初月目安）"
 
-# 売却価格（市場価値を採用）
-sale_price = land_future + building_market_value
-
-# 仲介手数料（3% + 6万 + 消費税）
-commission = (sale_price * 0.03 + 60_000) * (1 + vat_comm)
-
-# 取得費（税務は簿価ベースのみ）
-acquisition_cost = land_price + building_book_total
-
-# 譲渡所得
-gain_base = sale_price - commission - acquisition_cost
-deduction = 30_000_000 if apply_30m else 0
-taxable_gain = max(0.0, gain_base - deduction)
-capital_gains_tax = taxable_gain * tax_rate_cg
-
-# 手残り
-net_proceeds = sale_price - commission - capital_gains_tax - loan_balance
-
-# 累計資産（元金累計）
-cumulative_equity = loan_principal - loan_balance
-
 # ===== サマリー（指定の順） =====
 st.subheader("計算サマリー（購入）")
 a, b, c = st.columns(3)
@@ -327,6 +318,57 @@ if diff >= 0:
 else:
     st.warning(f"■ 名目ベースの優位：**社宅が {man(-diff, 0)} 有利**")
 
+# ===== 売却年スイープ =====
+if sweep_mode:
+    st.markdown("---")
+    st.subheader(f"📈 売却年スイープ（1〜{int(sweep_max)}年・社宅 累計 vs 購入 手残り）")
+    sweep_years = np.arange(1, int(sweep_max) + 1)
+    sw = sale_outcome(sweep_years)
+    sweep_diff = sw["net_proceeds"] - sw["shataku_total"]
+
+    # 損益分岐：差額（購入−社宅）の符号が最初に変わる年
+    flips = np.flatnonzero(np.diff(np.sign(sweep_diff)) != 0)
+    break_even_idx = int(flips[0]) + 1 if flips.size else None
+
+    fig, ax = plt.subplots(figsize=(14, 4))
+    ax.plot(sweep_years, sw["shataku_total"] / 10_000, label="社宅（累計メリット）", marker="o", markersize=3)
+    ax.plot(sweep_years, sw["net_proceeds"] / 10_000, label="購入（売却手残り）", marker="o", markersize=3)
+    if break_even_idx is not None:
+        ax.axvline(sweep_years[break_even_idx], linestyle="--", color="#e53935",
+                   label=f"損益分岐（{sweep_years[break_even_idx]}年）")
+    ax.set_xlabel("売却までの年数")
+    ax.set_ylabel("万円")
+    ax.legend()
+    ax.grid(True)
+    st.pyplot(fig)
+    plt.close(fig)
+
+    if break_even_idx is None:
+        winner = "購入" if sweep_diff[0] >= 0 else "社宅"
+        st.info(f"■ スイープ期間内で有利・不利は逆転しません（常に{winner}が有利）")
+    else:
+        winner = "購入" if sweep_diff[break_even_idx] >= 0 else "社宅"
+        st.success(f"■ 売却 {sweep_years[break_even_idx]} 年目以降は **{winner}が有利** に逆転します")
+
+    sweep_df = pd.DataFrame({
+        "売却年": sweep_years,
+        "社宅累計（万円）": sw["shataku_total"] / 10_000,
+        "売却価格（万円）": sw["sale_price"] / 10_000,
+        "譲渡所得税（万円）": sw["capital_gains_tax"] / 10_000,
+        "仲介手数料（万円）": sw["commission"] / 10_000,
+        "ローン残債（万円）": sw["loan_balance"] / 10_000,
+        "購入手残り（万円）": sw["net_proceeds"] / 10_000,
+        "差額（購入−社宅・万円）": sweep_diff / 10_000,
+    }).round(0)
+
+    def highlight_break_even(row):
+        if break_even_idx is not None and row.name == break_even_idx:
+            return ["background-color: #ffecb3"] * len(row)
+        return [""] * len(row)
+
+    st.dataframe(sweep_df.style.apply(highlight_break_even, axis=1).format(precision=0),
+                 use_container_width=True, hide_index=True)
+
 # ===== 返済表 =====
 st.markdown("---")
 st.subheader("📄 住宅ローン返済表（年次・万円）")
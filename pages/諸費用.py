@@ -19,6 +19,13 @@ import streamlit as st
 import requests
 from fpdf import FPDF  # ← FPDF_FONT_DIR は使いません（動的にTTFを登録）
 
+import pandas as pd
+
+from lib.closing_costs import (
+    BASE_YEARS, DISPLAY_FEE, FIRE_FEE, MOVING_FEE, PROPERTY_TYPES, REGIST_FEE, TAX_CLEAR, TEKIGO_FEE,
+    closing_cost_table, closing_costs, loan_patterns, monthly_payment, round_deposit,
+)
+
 # ============ 表示設定 ============
 st.set_page_config(page_title="資金計画書（諸費用明細）", layout="centered")
 st.title("資金計画書（諸費用明細）")
@@ -94,36 +101,6 @@ def number_input_commas(label, value, step=1):
         v = value
     return v
 
-def round_deposit(price_yen: int) -> int:
-    """手付金＝物件価格の5%を 50万円単位で四捨五入"""
-    base = price_yen * 0.05
-    return int(round(base / 500_000) * 500_000)
-
-def calc_stamp_tax(price_yen: int) -> int:
-    """契約書 印紙税（主要レンジのみ。必要ならレンジ追加可）"""
-    p = price_yen
-    if p <= 5_000_000: return 5_000
-    if p <= 10_000_000: return 10_000
-    if p <= 50_000_000: return 10_000
-    if p <= 100_000_000: return 30_000
-    if p <= 500_000_000: return 60_000
-    if p <= 1_000_000_000: return 160_000
-    if p <= 5_000_000_000: return 320_000
-    return 480_000
-
-def monthly_payment(loan_amount: int, years: int, annual_rate: float) -> int:
-    """元利均等返済の月々返済額（端数は整数・円へ）"""
-    n = years * 12
-    r = annual_rate / 100.0 / 12.0
-    if n <= 0:
-        return 0
-    if r == 0:
-        return int(loan_amount / n)
-    try:
-        return int(loan_amount * r * (1 + r) ** n / ((1 + r) ** n - 1))
-    except ZeroDivisionError:
-        return 0
-
 # ============ 入力（基本情報） ============
 # 顧客名・物件名（PDFで使用）
 st.session_state["customer_name"] = st.text_input("お客様名（例：山田太郎）", st.session_state.get("customer_name", ""))
@@ -132,7 +109,7 @@ st.session_state["property_name"] = st.text_input("物件名", st.session_state.
 # 物件条件
 col_a1, col_a2, col_a3 = st.columns([1, 1, 1])
 with col_a1:
-    prop_type = st.selectbox("物件種別", ["マンション", "戸建て"], index=0)
+    prop_type = st.selectbox("物件種別", list(PROPERTY_TYPES), index=0)
 with col_a2:
     is_new_house = st.checkbox("新築戸建（表示登記あり）", value=(prop_type == "戸建て"))
 with col_a3:
@@ -143,7 +120,7 @@ price_man = st.number_input("物件価格（万円）", min_value=100, max_value
 property_price = int(price_man) * 10_000  # 万円 → 円（整数・切り捨て）
 
 # 手付金（自動初期値：5%を50万円単位で丸め）
-default_deposit = round_deposit(property_price)
+default_deposit = int(round_deposit(property_price))
 deposit = number_input_commas("手付金（円・物件価格5%/50万円単位で四捨五入）", default_deposit, step=500_000)
 
 # 管理費・修繕積立（月額）
@@ -152,50 +129,53 @@ kanri_month = number_input_commas("管理費・修繕積立金（月額円）",
 # ============ 基準金利（①②用：年数は35年固定） ============
 st.markdown("#### 基準金利（①自己資金0／②諸費用のみ自己資金 に適用）")
 base_rate = st.number_input("基準金利（年%）", min_value=0.0, max_value=5.0, value=0.78, step=0.01)
-base_years = 35  # 指定どおり固定
+base_years = BASE_YEARS  # 指定どおり固定
 
 # ============ 登記費用の計算方法：固定 or 比例 ============
 col_r1, col_r2 = st.columns([1, 1])
 with col_r1:
     regist_mode = st.radio("登記費用の計算方法", ["固定額", "物件価格比例（%）"], index=0, horizontal=True)
 
+regist_fee, regist_rate = REGIST_FEE, None
 if regist_mode == "固定額":
-    default_regist = 400_000  # 種別で差が必要なら分岐可
-    regist_fee = number_input_commas("登記費用（円）", default_regist, step=10_000)
+    regist_fee = number_input_commas("登記費用（円）", REGIST_FEE, step=10_000)  # 種別で差が必要なら分岐可
 else:
     col_r2.markdown("（例：0.5% = 0.5 を入力）")
     regist_rate = st.number_input("登記費用（物件価格に対する%）", min_value=0.0, max_value=3.0, value=0.5, step=0.1)
-    regist_fee = int(property_price * (regist_rate / 100.0))
 
 # ============ 税・精算・表示・保険など ============
-tax_rate = 0.10
-brokerage = int((property_price * 0.03 + 60_000) * (1 + tax_rate))  # 仲介手数料（税10%込）
-stamp_fee = calc_stamp_tax(property_price)
-tax_clear = number_input_commas("精算金（固都税・管理費等・日割り精算）", 100_000, step=10_000)
+tax_clear = number_input_commas("精算金（固都税・管理費等・日割り精算）", TAX_CLEAR, step=10_000)
 display_fee = number_input_commas(
     "表示登記（新築戸建のみ／10万円前後）",
-    100_000 if (prop_type == "戸建て" and is_new_house) else 0,
+    DISPLAY_FEE if (prop_type == "戸建て" and is_new_house) else 0,
     step=10_000,
 )
 
 # 事務手数料は「物件価格×2.2%」で見積（①の借入金と一致しやすい／循環参照を避ける）
-loan_fee = int(property_price * 0.022)
 kinko_stamp = number_input_commas("金銭消費貸借 印紙税（通常0円）", 0, step=1_000)
-fire_fee = number_input_commas("火災保険料（円・5年分概算）", 200_000, step=10_000)
-tekigo_fee = number_input_commas("適合証明書（フラット35の場合必須）", 55_000 if use_flat35 else 0, step=5_000)
+fire_fee = number_input_commas("火災保険料（円・5年分概算）", FIRE_FEE, step=10_000)
+tekigo_fee = number_input_commas("適合証明書（フラット35の場合必須）", TEKIGO_FEE if use_flat35 else 0, step=5_000)
 
 # ============ 任意項目 ============
 option_rows = []
 option_fee = number_input_commas("リフォーム・追加工事費（円）", 0, step=10_000)
 if option_fee > 0:
     option_rows.append(["リフォーム費用", fmt_jpy(option_fee), "決済時", "任意工事・追加リフォーム等"])
-moving_fee = number_input_commas("引越し費用（円）", 150_000, step=10_000)
+moving_fee = number_input_commas("引越し費用（円）", MOVING_FEE, step=10_000)
 if moving_fee > 0:
     option_rows.append(["引越し費用", fmt_jpy(moving_fee), "入居時", "距離・荷物量による"])
 kaden_fee = number_input_commas("家具家電代（円）", 0, step=10_000)
 if kaden_fee > 0:
     option_rows.append(["家具家電代", fmt_jpy(kaden_fee), "入居時", "新生活準備費用"])
 
+# ============ 諸費用の計算（lib.closing_costs：数値のまま計算し、表示用の文字列は明細だけで作る） ============
+costs = closing_costs(
+    property_price, prop_type, is_new_house, use_flat35, regist_fee=regist_fee, regist_rate=regist_rate,
+    tax_clear=tax_clear, display_fee=display_fee, kinko_stamp=kinko_stamp, fire_fee=fire_fee,
+    tekigo_fee=tekigo_fee, option_fee=option_fee, moving_fee=moving_fee, kaden_fee=kaden_fee, deposit=deposit,
+)
+stamp_fee, regist_fee, loan_fee, brokerage = (int(v) for v in (costs.stamp, costs.regist, costs.loan_fee, costs.brokerage))
+
 # ============ 明細テーブル構築 ============
 cost_rows = []
 cost_rows.append(["◆ 登記費用・税金・精算金等", "", "", ""])
@@ -223,18 +203,14 @@ if option_rows:
     cost_rows.extend(option_rows)
 
 # 合計（諸費用 → 総合計）
-total_expenses = 0
-for r in cost_rows:
-    if r[1] and ("◆" not in r[0]):
-        total_expenses += int(r[1].replace(" 円", "").replace(",", ""))
-total = int(property_price + total_expenses)
+total_expenses = int(costs.total_expenses)
+total = int(costs.total)
 
 # ============ 借入パターン ============
-# ① 自己資金0：物件＋諸費用フル（基準金利・35年）
-loan_amount_full = property_price + total_expenses
-
-# ② 諸費用のみ自己資金：物件のみ（基準金利・35年）
-loan_amount_only = property_price
+# ① 自己資金0：物件＋諸費用フル／② 諸費用のみ自己資金：物件のみ（基準金利・35年）
+loans = loan_patterns(costs, base_rate, base_years)
+loan_amount_full, monthly_full = int(loans.full_amount), int(loans.full_monthly)
+loan_amount_only, monthly_only = int(loans.only_amount), int(loans.only_monthly)
 
 # ③ 入力A（完全手動：借入額（万円）／金利／年数）
 st.markdown("#### ③ 入力A（自由入力：借入・金利・年数）")
@@ -261,14 +237,11 @@ with col_l4b_3:
     loan_years_B = st.number_input("返済期間（年：④）", min_value=1, max_value=50, value=35, step=1)
 
 # ============ 月々返済（4パターン計算） ============
-monthly_full = monthly_payment(loan_amount_full, base_years, base_rate)   # ①
-monthly_only = monthly_payment(loan_amount_only, base_years, base_rate)   # ②
-monthly_A = monthly_payment(loan_amount_A, loan_years_A, loan_rate_A)     # ③
-monthly_B = monthly_payment(loan_amount_B, loan_years_B, loan_rate_B)     # ④
+monthly_A = int(monthly_payment(loan_amount_A, loan_years_A, loan_rate_A))     # ③
+monthly_B = int(monthly_payment(loan_amount_B, loan_years_B, loan_rate_B))     # ④
 
 # 契約時必要資金（手付金＋印紙代＋仲介半金）
-brokerage_half = int(brokerage / 2)
-need_at_contract = int(deposit + stamp_fee + brokerage_half)
+need_at_contract = int(costs.need_at_contract)
 
 # ============ 備考 ============
 default_bikou = (
@@ -297,6 +270,26 @@ st.write(
     f"③**{fmt_jpy(monthly_A + kanri_month)}**／④**{fmt_jpy(monthly_B + kanri_month)}**"
 )
 
+# ============ 物件一覧の一括計算 ============
+with st.expander("📦 物件一覧の諸費用を一括計算（CSV）", expanded=False):
+    st.caption("列：価格（円）または 価格万円（必須）／種別（マンション・戸建て）, 新築戸建, フラット35（任意）。"
+               "登記・精算金・火災保険・引越し等と基準金利は上の入力を使い、③は基準金利・35年・借入額＝物件価格で計算します。")
+    list_file = st.file_uploader("物件一覧ファイル", type=["csv"], key="closing_list")
+    if list_file is not None:
+        try:
+            listing = closing_cost_table(
+                pd.read_csv(list_file), base_rate, base_years, prop_type=prop_type,
+                regist_fee=regist_fee, regist_rate=regist_rate,
+                tax_clear=tax_clear, kinko_stamp=kinko_stamp, fire_fee=fire_fee,
+                moving_fee=moving_fee, kaden_fee=kaden_fee,
+            )
+            st.caption(f"{len(listing):,} 件を計算しました。")
+            st.dataframe(listing, use_container_width=True, hide_index=True)
+            st.download_button("📥 CSVでダウンロード", data=listing.to_csv(index=False).encode("utf-8-sig"),
+                               file_name="諸費用_一括計算.csv", mime="text/csv")
+        except ValueError as e:
+            st.error(str(e))
+
 # ============ PDF 生成 ============
 MY_NAME = "西山　直樹 / Naoki Nishiyama"
 MY_COMPANY = "TERASS, Inc."
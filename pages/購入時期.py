@@ -6,10 +6,15 @@ import zipfile
 import tempfile
 from pathlib import Path
 
+import matplotlib.pyplot as plt
+import numpy as np
 import requests
 import streamlit as st
 from fpdf import FPDF
 
+from lib.charts import set_matplotlib_japanese_font
+from lib.purchase_timing import loss_per_day, purchase, wait_grid
+
 # =========================
 # フォント（IPAexに全面切替／自動DL＆展開）
 # =========================
@@ -68,51 +73,11 @@ def _register_jp_fonts(pdf: FPDF):
     pdf.add_font("IPAexMincho", "", str(FONT_MINCHO_PATH), uni=True)
     pdf.add_font("IPAexMincho", "B", str(FONT_MINCHO_PATH), uni=True)
 
-# =========================
-# ローン計算ユーティリティ（万円ベース）
-# =========================
-def monthly_payment(principal_man: float, years: int, annual_rate_pct: float) -> float:
-    """元利均等: 万円単位で返す"""
-    n = years * 12
-    if n <= 0:
-        return 0.0
-    r = (annual_rate_pct / 100.0) / 12.0
-    P = principal_man
-    if r == 0:
-        return P / n
-    return P * r * (1 + r) ** n / ((1 + r) ** n - 1)
-
-
-def total_payment(principal_man: float, years: int, annual_rate_pct: float) -> float:
-    m = monthly_payment(principal_man, years, annual_rate_pct)
-    return m * years * 12
-
-
-def remaining_balance_at_k(principal_man: float, years: int, annual_rate_pct: float, k_months: int) -> float:
-    """kヶ月返済後の残高（万円）"""
-    n = years * 12
-    if n <= 0:
-        return 0.0
-    k = max(0, min(k_months, n))
-    r = (annual_rate_pct / 100.0) / 12.0
-    P = principal_man
-    if r == 0:
-        # ゼロ金利は単純按分
-        return P * (1 - k / n)
-    factor = (1 + r) ** n
-    return P * ((factor - (1 + r) ** k) / (factor - 1))
-
-
-# 価格の将来値（複利）
-def future_price_man(price_now_man: float, growth_pct_per_year: float, years_wait: int) -> float:
-    g = growth_pct_per_year / 100.0
-    return price_now_man * ((1 + g) ** years_wait)
-
-
 # =========================
 # Streamlit UI
 # =========================
 st.set_page_config(page_title="購入時期の比較シミュレーション", layout="wide")
+set_matplotlib_japanese_font()
 st.title("🏠 購入時期シミュレーション（今 vs 何年後）")
 
 colL, colR = st.columns(2)
@@ -137,32 +102,17 @@ with colR:
 # =========================
 # 計算（すべて万円単位）
 # =========================
-# 今
-down_now_man = max(0.0, min(cash_now_man, price_now_man))
-loan_now_man = max(0.0, price_now_man - down_now_man)
-loan_total_now_man = total_payment(loan_now_man, int(years_now), float(rate_now))
-rent_now_man = 0.0
-total_cost_now_man = down_now_man + loan_total_now_man + rent_now_man
-
-# 将来
-accum_save_man = monthly_save_man * 12 * wait_years
-down_future_man = cash_now_man + accum_save_man
-price_future_man = future_price_man(price_now_man, growth_pct, int(wait_years))
-loan_future_man = max(0.0, price_future_man - down_future_man)
-loan_total_future_man = total_payment(loan_future_man, int(years_future), float(rate_future))
-rent_total_future_man = rent_until_man * 12 * wait_years
-total_cost_future_man = down_future_man + loan_total_future_man + rent_total_future_man
-
-# 60歳時のローン残債
-months_to_60_now = max(0, int((60 - age_now) * 12))
-months_to_60_future = max(0, int((60 - (age_now + wait_years)) * 12))
-remain_now_man = remaining_balance_at_k(loan_now_man, int(years_now), float(rate_now), months_to_60_now)
-remain_future_man = remaining_balance_at_k(loan_future_man, int(years_future), float(rate_future), months_to_60_future)
+# 今 / 将来（lib.purchase_timing：閉形式・配列可）
+now = purchase(age_now, price_now_man, cash_now_man, int(years_now), float(rate_now), cap_down=True)
+future = purchase(age_now, price_now_man, cash_now_man, int(years_future), float(rate_future), int(wait_years),
+                  monthly_save_man, growth_pct, rent_until_man)
+down_now_man, _, _, loan_now_man, loan_total_now_man, rent_now_man, total_cost_now_man, remain_now_man = map(float, now)
+(down_future_man, accum_save_man, price_future_man, loan_future_man, loan_total_future_man,
+ rent_total_future_man, total_cost_future_man, remain_future_man) = map(float, future)
 
 # 差分・1日あたり
 diff_man = total_cost_future_man - total_cost_now_man
-days = max(1, int(wait_years * 365))
-loss_per_day_yen = diff_man * 10000 / days  # 円/日
+loss_per_day_yen = float(loss_per_day(diff_man, wait_years))  # 円/日
 
 # =========================
 # 表示
@@ -197,6 +147,46 @@ with c3:
 
 st.markdown("---")
 
+# =========================
+# 待機年数 × 価格上昇率 × 将来金利 のリスク面
+# =========================
+with st.expander("🗺 待つリスクの全体像（待機年数 × 価格上昇率 × 将来金利）", expanded=False):
+    st.caption("待機 0〜15 年・価格上昇率・将来金利の全組み合わせを一括計算。そのほかの条件は上の入力を使います。")
+    g1, g2 = st.columns(2)
+    with g1:
+        gx_growth = st.slider("価格上昇率の範囲（年率 %）", -5.0, 10.0, (-2.0, 5.0), step=0.5)
+    with g2:
+        gx_rate = st.slider("将来金利の範囲（年利 %）", 0.1, 6.0, (0.5, 4.0), step=0.25)
+    gx_waits = np.arange(0, 16)
+    gx_growths = np.round(np.arange(gx_growth[0], gx_growth[1] + 1e-9, 0.5), 2)
+    gx_rates = np.round(np.arange(gx_rate[0], gx_rate[1] + 1e-9, 0.25), 2)
+    grid = wait_grid(now, age_now, price_now_man, cash_now_man, int(years_future), rent_until_man,
+                     monthly_save_man, gx_waits, gx_growths, gx_rates)
+    st.caption(f"{grid.diff.size:,} 通りを計算しました。")
+    view_rate = st.select_slider("表示する将来金利（年利 %）", options=list(gx_rates),
+                                 value=min(gx_rates, key=lambda r: abs(r - rate_future)))
+    ri = list(gx_rates).index(view_rate)
+    extent = [gx_growths[0] - 0.25, gx_growths[-1] + 0.25, gx_waits[0] - 0.5, gx_waits[-1] + 0.5]
+    fig_gx, (ax_day, ax_rem) = plt.subplots(1, 2, figsize=(14, 5))
+    per_day = grid.loss_per_day_yen[1:, :, ri]   # 待機 0 年は1日あたりにならないので除く
+    lim = np.nanmax(np.abs(per_day)) or 1
+    im1 = ax_day.imshow(per_day, origin="lower", aspect="auto", cmap="RdYlGn_r", vmin=-lim, vmax=lim,
+                        extent=[extent[0], extent[1], 0.5, gx_waits[-1] + 0.5])
+    ax_day.set_title("待機1日あたりの損失（円/日・プラスは今買う方が有利）")
+    fig_gx.colorbar(im1, ax=ax_day)
+    rem = grid.remain_diff[:, :, ri]
+    lim2 = np.nanmax(np.abs(rem)) or 1
+    im2 = ax_rem.imshow(rem, origin="lower", aspect="auto", cmap="RdYlGn_r", vmin=-lim2, vmax=lim2, extent=extent)
+    ax_rem.set_title("60歳時の残債の差（将来 − 今・万円）")
+    fig_gx.colorbar(im2, ax=ax_rem)
+    for ax in (ax_day, ax_rem):
+        ax.set_xlabel("物件価格上昇率（年率 %）")
+        ax.set_ylabel("待機年数（年）")
+    st.pyplot(fig_gx)
+    st.caption(f"総額で今買う方が有利になる組み合わせ：{int((grid.diff > 0).sum()):,} / {grid.diff.size:,} 通り")
+
+st.markdown("---")
+
 # =========================
 # PDF 出力
 # =========================